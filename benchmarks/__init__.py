@@ -0,0 +1,14 @@
+'''
+MDiocre's benchmark suite.
+
+The bench_*.py scripts each compare one optimization against the code it
+replaced. The suite times MDiocre as a whole on a synthetic site instead, so
+that runs made before and after a change can be compared::
+
+    python -m benchmarks run --pages 200 --output before.json
+    (make the change)
+    python -m benchmarks run --pages 200 --output after.json
+    python -m benchmarks compare before.json after.json --threshold 10
+
+``compare`` exits with status 1 if a benchmark got slower than the threshold.
+'''
@@ -0,0 +1,104 @@
+'''
+Command line interface of the benchmark suite, see __init__.py
+'''
+
+import os
+import sys
+import json
+import tempfile
+from argparse import ArgumentParser
+
+from . import sitegen, runner, compare
+
+def cmd_generate(args):
+	os.makedirs(args.directory, exist_ok=True)
+	site = sitegen.generate_site(args.directory, **site_options(args))
+	print('wrote {} pages and {} assets to {}'.format(
+		sum(len(i) for i in site['pages'].values()), len(site['assets']), site['source_dir']))
+
+def cmd_run(args):
+	options = site_options(args)
+	with tempfile.TemporaryDirectory() as root:
+		site = sitegen.generate_site(root, **options)
+		results = runner.run_suite(
+			site, repeat=args.repeat, jobs=args.jobs,
+			progress=lambda name: print('running {}...'.format(name), file=sys.stderr)
+		)
+
+	config = dict(options, repeat=args.repeat, jobs=args.jobs)
+	report = runner.make_report(results, config)
+
+	for name, result in sorted(results.items()):
+		print('{:<18} min: {:10.2f} ms   median: {:10.2f} ms'.format(
+			name, result['min'] * 1000, result['median'] * 1000))
+
+	if args.output is not None:
+		with open(args.output, 'w') as f:
+			json.dump(report, f, indent='\t')
+		print('results written to {}'.format(args.output))
+
+def cmd_compare(args):
+	base = compare.load(args.base)
+	new = compare.load(args.new)
+
+	if base['meta']['config'] != new['meta']['config']:
+		print('warning: the runs were made with different settings', file=sys.stderr)
+
+	rows = compare.compare(base, new, threshold=args.threshold, stat=args.stat)
+	print(compare.format_rows(rows))
+
+	regressions = [i for i in rows if i[4] == 'regression']
+	if regressions:
+		print('\n{} benchmark(s) got more than {}% slower.'.format(len(regressions), args.threshold))
+		return 1
+	return 0
+
+def site_options(args):
+	return {
+		'pages': args.pages,
+		'mix': sitegen.parse_mix(args.mix) if args.mix else None,
+		'paragraphs': args.paragraphs,
+		'sections': args.sections,
+		'assets': args.assets,
+		'asset_size': args.asset_size,
+		'seed': args.seed,
+	}
+
+def main():
+	ap = ArgumentParser(prog='python -m benchmarks', description='MDiocre benchmark suite')
+	sub = ap.add_subparsers(dest='command')
+	sub.required = True
+
+	def add_site_arguments(p):
+		p.add_argument('--pages', help='Number of pages (default: 100)', type=int, default=100)
+		p.add_argument('--mix', help='Kinds of pages and how many of each, e.g. md=3,rst=1 (default: the same amount of {})'.format(', '.join(sitegen.EXTENSIONS)), metavar='EXT=WEIGHT,...')
+		p.add_argument('--paragraphs', help='Number of sections in every page (default: 8)', type=int, default=8)
+		p.add_argument('--sections', help='Number of directories (default: 4)', type=int, default=4)
+		p.add_argument('--assets', help='Number of static files (default: 10)', type=int, default=10)
+		p.add_argument('--asset-size', help='Size of every static file in bytes (default: 65536)', type=int, default=64 << 10)
+		p.add_argument('--seed', help='Seed of the random text (default: 0)', type=int, default=0)
+
+	p = sub.add_parser('generate', help='Write a synthetic site')
+	p.add_argument('directory', help='Where to write the site')
+	add_site_arguments(p)
+	p.set_defaults(func=cmd_generate)
+
+	p = sub.add_parser('run', help='Run the benchmarks on a synthetic site')
+	add_site_arguments(p)
+	p.add_argument('--repeat', '-r', help='Number of runs of every benchmark (default: 5)', type=int, default=5)
+	p.add_argument('--jobs', '-j', help='Also time a parallel build with N jobs', type=int, default=1, metavar='N')
+	p.add_argument('--output', '-o', help='Write the results to a JSON file', metavar='FILE')
+	p.set_defaults(func=cmd_run)
+
+	p = sub.add_parser('compare', help='Compare two result files')
+	p.add_argument('base', help='Results to compare against')
+	p.add_argument('new', help='New results')
+	p.add_argument('--threshold', '-t', help='How much slower a benchmark can get, in percent (default: 10)', type=float, default=10.0)
+	p.add_argument('--stat', help='Which number to compare (default: min)', choices=('min', 'median'), default='min')
+	p.set_defaults(func=cmd_compare)
+
+	args = ap.parse_args()
+	sys.exit(args.func(args) or 0)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,72 @@
+'''
+Benchmark copying static files (images, fonts...) to the build directory
+
+Compares the old way (shutil.copyfile on every file, one after the other)
+against mdiocre.assets.AssetSync, both for a fresh build directory and for
+one that already has every file, where nothing needs to be copied.
+
+Usage: python bench_assets.py [number of files] [size of each file in KiB]
+'''
+
+import os
+import sys
+# point this to the folder where mdiocre is located
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import filecmp
+import shutil
+import tempfile
+import time
+from mdiocre.assets import AssetSync
+
+def legacy_copy(files):
+	for source_file, built_file in files:
+		shutil.copyfile(source_file, built_file)
+
+def current_copy(files, sync):
+	for source_file, built_file in files:
+		sync.submit(source_file, built_file)
+	methods = {}
+	for source_file, built_file, copied in sync.wait():
+		assert not isinstance(copied, Exception), copied
+		methods[copied] = methods.get(copied, 0) + 1
+	return methods
+
+def timed(function, *args):
+	start = time.perf_counter()
+	result = function(*args)
+	return time.perf_counter() - start, result
+
+if __name__ == '__main__':
+	count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+	size = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+
+	with tempfile.TemporaryDirectory() as root:
+		for name in ('src', 'old', 'new'):
+			os.mkdir(os.path.join(root, name))
+
+		block = os.urandom(1 << 10)
+		for i in range(count):
+			with open(os.path.join(root, 'src', '{}.bin'.format(i)), 'wb') as f:
+				f.write(block * size)
+
+		def files(target):
+			return [
+				(os.path.join(root, 'src', '{}.bin'.format(i)), os.path.join(root, target, '{}.bin'.format(i)))
+				for i in range(count)
+			]
+
+		sync = AssetSync()
+
+		print('{} files of {} KiB\n'.format(count, size))
+		for label in ('fresh', 'unchanged'):
+			legacy, _ = timed(legacy_copy, files('old'))
+			current, methods = timed(current_copy, files('new'), sync)
+			print('{:<10} old: {:8.3f} s   new: {:8.3f} s   old/new: {:6.1f}x   {}'.format(
+				label, legacy, current, legacy / current,
+				', '.join('{}: {}'.format(k or 'skipped', v) for k, v in methods.items())))
+
+		sync.close()
+
+		for _, built_file in files('new'):
+			assert filecmp.cmp(built_file, built_file.replace(os.path.sep + 'new' + os.path.sep, os.path.sep + 'old' + os.path.sep), shallow=False)
@@ -0,0 +1,103 @@
+'''
+Benchmark long assignments, e.g. <!--: nav = "<a>", one, "</a>", two, ... -->
+
+Compares the old way of splitting and evaluating assignments (the RE_CONCAT
+regular expression, then running the escape regex over the whole value after
+every string) against mdiocre.directives.tokenize and VariableManager.evaluate.
+Before timing, both are checked to give the same results on random input.
+
+Usage: python bench_assignment.py [number of pieces]
+'''
+
+import os
+import sys
+# point this to the folder where mdiocre is located
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import random
+import re
+import timeit
+from mdiocre.core import VariableManager
+from mdiocre.utils import remove_inner_outer_quotes
+from mdiocre.directives import split_concat, tokenize, RE_ESCAPE
+
+LEGACY_RE_CONCAT = re.compile(r'("[^"]*"|\'[^\']*\'|\w+|\(.+\)),\s*|("[^"]*"|\'[^\']*\'|\w+|\(.+\))$')
+
+def legacy_split(value):
+	'''
+	Splitting as it was done with RE_CONCAT
+	'''
+	return [(i[0] or i[1]).strip() for i in re.findall(LEGACY_RE_CONCAT, value)]
+
+def legacy_evaluate(v, operands):
+	'''
+	Evaluation as it was done before, escaping the whole value each time
+	'''
+	value = ''
+	for operand in operands:
+		kind = operand[0]
+		if kind == 'string':
+			value += operand[1]
+			def escape(match): return match.groups()[1]
+			value = re.sub(RE_ESCAPE, escape, value)
+		elif kind == 'call':
+			value += v.call(operand[1], operand[2])
+		else:
+			try: value += v.variables[operand[1]]
+			except KeyError: value += ''
+	return value
+
+def legacy_operands(value):
+	operands = []
+	for var in legacy_split(value):
+		if var[0] == '"' or var[0] == "'":
+			operands.append(('string', remove_inner_outer_quotes(var)))
+		elif var[0] == '(':
+			fn_tokens = [x.strip() for x in var[1:-1].split(' ')]
+			operands.append(('call', fn_tokens[0], tuple(fn_tokens[1:])))
+		else:
+			operands.append(('variable', var))
+	return operands
+
+def check(v, runs=20000):
+	alphabet = ['a', 'b', 'x', ' ', '\n', ',', ', ', '"', "'", '\\', '\\\\',
+	            '(', ')', '),', '"s\\,t"', "'q'", 'title', '_']
+	rng = random.Random(0)
+	for _ in range(runs):
+		value = ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 14)))
+		assert split_concat(value) == legacy_split(value), repr(value)
+		try:
+			operands = tokenize(value)
+		except SyntaxError:
+			continue
+		# function calls are left to bench_function_calls.py
+		operands = [i for i in operands if i[0] != 'call']
+		assert v.evaluate(operands) == legacy_evaluate(v, operands), repr(value)
+
+def bench(label, value, v, repeat):
+	legacy = timeit.timeit(lambda: legacy_evaluate(v, legacy_operands(value)), number=repeat) / repeat
+	current = timeit.timeit(lambda: v.evaluate(tokenize(value)), number=repeat) / repeat
+	print('{:<28} old: {:10.2f} us   new: {:10.2f} us   old/new: {:.1f}x'.format(
+		label, legacy * 1e6, current * 1e6, legacy / current))
+
+if __name__ == '__main__':
+	count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+	repeat = 5
+
+	v = VariableManager()
+	v.variables['name'] = 'MDiocre'
+	v.variables['path'] = 'C:\\mdiocre\\site'
+
+	check(v)
+	print('old and new give the same results\n')
+
+	cases = [
+		('{} pieces'.format(count), ', '.join(['"<li>"', 'name', '"</li>"'] * (count // 3))),
+		('{} escaped pieces'.format(count), ', '.join(['"\\"quoted\\""', 'path'] * (count // 2))),
+		('unbalanced "( " * {}'.format(count), '( ' * count),
+		('unclosed quotes * {}'.format(count), '"a, ' * count),
+	]
+	for label, value in cases:
+		v.evaluate(tokenize(value))
+		assert split_concat(value) == legacy_split(value)
+		bench(label, value, v, repeat)
@@ -0,0 +1,88 @@
+'''
+Benchmark function calls in assignments, e.g. <!--: RSSDate = (toRFC822 PubDate) -->
+
+Compares the old way of calling functions (building a Python source string
+and running it through exec) against VariableManager.call, on a page with
+dozens of function-based assignments.
+
+Usage: python bench_function_calls.py [number of assignments]
+'''
+
+import os
+import sys
+# point this to the folder where mdiocre is located
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import tempfile
+import timeit
+from mdiocre.core import MDiocre
+
+SCRIPT = """
+import datetime
+
+def toRFC822(date):
+	return datetime.datetime.strptime(date, '%Y-%m-%d').strftime('%a, %d %b %Y 00:00:00 +0000')
+
+def shout(text, suffix):
+	return text.upper() + suffix
+"""
+
+def legacy_call(v, fn_tokens):
+	'''
+	Function calls as they were done before VariableManager.call
+	'''
+	fn_tokens = list(fn_tokens)
+	for i in range(1, len(fn_tokens)):
+		if fn_tokens[i] in v.variables:
+			escaped_var = v.variables[fn_tokens[i]].replace('"','\\"').replace("'","\\'")
+			fn_tokens[i] = f"'{escaped_var}'"
+	loc = {}
+	exec(f"__retval = {fn_tokens[0]}({','.join(fn_tokens[1:])})", v.script_globals(), loc)
+	return loc['__retval']
+
+def make_page(script_path, count):
+	lines = [
+		'<!--: Using: {} -->'.format(script_path),
+		'<!--: PubDate = "2020-09-09" -->',
+		'<!--: Title = "My First Blog Post" -->',
+	]
+	for i in range(count):
+		if i % 2:
+			lines.append('<!--: date{} = (toRFC822 PubDate) -->'.format(i))
+		else:
+			lines.append('<!--: title{} = (shout Title "!") -->'.format(i))
+	return '\n'.join(lines)
+
+if __name__ == '__main__':
+	count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+	repeat = 200
+	
+	with tempfile.TemporaryDirectory() as tmp:
+		script_path = os.path.join(tmp, '_functions.py')
+		with open(script_path, 'w') as sf:
+			sf.write(SCRIPT)
+		
+		m = MDiocre(parser_name='html')
+		page = make_page(script_path, count)
+		v = m.process(page)
+		
+		calls = [
+			['toRFC822', 'PubDate'],
+			['shout', 'Title', '"!"'],
+		]
+		for fn_tokens in calls:
+			assert legacy_call(v, fn_tokens) == v.call(fn_tokens[0], fn_tokens[1:])
+		
+		# quoted arguments keep their spaces
+		spaced = m.process('<!--: Using: {} -->\n<!--: Title = "a" -->\n<!--: t = (shout Title " b  c") -->'.format(script_path))
+		assert spaced.get('t') == 'A b  c'
+		
+		n = repeat * count
+		legacy = timeit.timeit(lambda: [legacy_call(v, i) for i in calls], number=n // 2) / n
+		direct = timeit.timeit(lambda: [v.call(i[0], i[1:]) for i in calls], number=n // 2) / n
+		page_time = timeit.timeit(lambda: m.process(page), number=repeat) / repeat
+	
+	print('{} function-based assignments per page'.format(count))
+	print('per call, exec:          {:8.2f} us'.format(legacy * 1e6))
+	print('per call, direct:        {:8.2f} us ({:.1f}x faster)'.format(direct * 1e6, legacy / direct))
+	print('per page, whole page:    {:8.2f} us'.format(page_time * 1e6))
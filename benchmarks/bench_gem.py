@@ -0,0 +1,181 @@
+'''
+Benchmark converting large Gemtext documents.
+
+Compares the old GemParser (several regular expressions run over every
+line, random placeholders for the alt text of preformatted blocks, and an
+ElementTree round trip to escape the text) against the current single-pass
+converter, which only does the round trip for lines with HTML in them.
+Before timing, both are checked to give the same output.
+
+Usage: python bench_gem.py [number of lines]
+'''
+
+import os
+import sys
+# point this to the folder where mdiocre is located
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import re
+import random
+import timeit
+import xml.etree.ElementTree as ET
+from mdiocre.parsers.gem import GemParser
+
+def legacy_convert_markup(markup):
+	'''
+	GemParser.convert_markup as it was
+	'''
+	# read line by line
+	MARKUP = markup.split('\n')
+	P_ADD_RE         = re.compile(r'^(?!#|\*|>|```|=>)(.+)$')
+	HEADINGS_RE      = re.compile(r'^(#{1,6})\s+(.+)$') # spec says mandatory space chara
+	LINKS_RE         = re.compile(r'^=>\s*(\w+:?/?/?[^\s]+)(\s+(.+$))?')
+	PREFORMATTED_RE  = re.compile(r'^```(.+)$')
+	ULIST_RE         = re.compile(r'^\*\s+(.+)$')
+	LINKS_INSIDE     = re.compile(r'\(=>\s*(\w+:?/?/?[^\s]+)(\s+(.+?))?\)') 
+	BLOCKQUOTE_RE    = re.compile(r'^>\s+(.+)$')
+	
+	output_markup = []
+	lists_mode = {
+		'ul': False,
+		'ol': False
+	}
+	pre_mode = False
+	cur_code_hash = ''
+	code_alts = {}
+	
+	def make_code_hash():
+		new_key = '__code__'
+		for i in random.randbytes(32):
+			new_key += hex(i)[2:]
+		return new_key
+	
+	for i in range(len(MARKUP)):
+		line = MARKUP[i]
+		
+		if not pre_mode: # standard text
+			# add paragraph tags
+			if re.search(P_ADD_RE, line):
+				line = '<p>' + line + '</p>'
+			
+			# add header tags
+			line = re.sub(HEADINGS_RE,
+				lambda a: "<h%d>%s</h%d>" % (len(a.group(1)), a.group(2), len(a.group(1))),
+				line
+			)
+			
+			# add blockquotes
+			line = re.sub(BLOCKQUOTE_RE,
+				lambda a: "<blockquote>%s</blockquote>" % (a.group(1)),
+				line
+			)
+			
+			is_list_or_link_set = (bool(re.match(ULIST_RE, line)) or bool(re.match(LINKS_RE, line)))
+			
+			# lists
+			if re.match(ULIST_RE, line):
+				if not lists_mode['ul']:
+					lists_mode['ul'] = True
+					output_markup.append('<ul>')
+				line = re.sub(ULIST_RE,
+					lambda a: "<li>%s</li>" % (a.group(1)),
+					line
+				)
+			
+			if not is_list_or_link_set:
+				if lists_mode['ul']:
+					lists_mode['ul'] = False
+					output_markup.append('</ul>')
+			
+			# links
+			def gen_link(result):
+				link_str = '<a href="%s">%s</a>'
+				if result.group(3):
+					return link_str % (result.group(1), result.group(3))
+				# no unique txt
+				return link_str % (result.group(1), result.group(1))
+			
+			# links on its own is treated like lists
+			if re.match(LINKS_RE, line):
+				if not lists_mode['ul']:
+					lists_mode['ul'] = True
+					output_markup.append('<ul class="gemtext-links">')
+				line = "<li>%s</li>" % (re.sub(LINKS_RE, gen_link, line))
+			
+			line = re.sub(LINKS_INSIDE, gen_link, line)
+			
+			if re.match(PREFORMATTED_RE, line):
+				cur_code_hash = make_code_hash()
+				line = '<pre alt="%s"><code>' % (cur_code_hash)
+				pre_mode = True
+			
+			if False: # comment out this line to literally render blank lines as <br>
+				if len(line.strip()) == 0:
+					line = '<br>'
+		else: # preformatted text
+			code_end = re.match(PREFORMATTED_RE, line)
+			if code_end:
+				line = '</code></pre>'
+				pre_mode = False
+				if code_end.group(1):
+					code_alts[cur_code_hash] = code_end.group(1)
+		
+		output_markup.append(line)
+	output_str = '\n'.join(output_markup)
+	
+	# resolve code alt text
+	for key, value in code_alts.items():
+		output_str = output_str.replace(key, value)
+	
+	return output_str
+
+def legacy_to_html(markup):
+	'''
+	What GemParser.to_variables did after the MDiocre commands
+	'''
+	html = legacy_convert_markup(markup)
+	etr = ET.fromstring("<_doc_>%s</_doc_>" % html)
+	return '\n'.join(
+		ET.tostring(etr, encoding='unicode', method='html')\
+		.split('\n')[1:-1]
+	)
+
+SAMPLE_BLOCKS = [
+	['# A capsule page'],
+	['## A section'],
+	['Just a plain line of text, which is what most lines are like.'],
+	['A line with an inline link (=> gemini://example.com/page some text) in it.'],
+	['* a list item', '* another list item', ''],
+	['=> gemini://example.com/ Example', '=> https://example.org', ''],
+	['> a quote > with more to it'],
+	['A line with <em>inline HTML</em> &amp; an entity in it.'],
+	['* a list item with <b>markup</b>'],
+	['```py', 'def main():', '    return 1', '```a Python snippet'],
+	[''],
+]
+
+def make_capsule(lines):
+	rng = random.Random(0)
+	out = ['']
+	while len(out) < lines:
+		out += rng.choice(SAMPLE_BLOCKS)
+	return '\n'.join(out + [''])
+
+if __name__ == '__main__':
+	lines = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+	repeat = 5
+	
+	parser = GemParser()
+	capsule = make_capsule(lines)
+	
+	def current(markup):
+		return '\n'.join(parser.content_lines(markup.split('\n')))
+	
+	assert legacy_to_html(capsule) == current(capsule)
+	
+	legacy = timeit.timeit(lambda: legacy_to_html(capsule), number=repeat) / repeat
+	new = timeit.timeit(lambda: current(capsule), number=repeat) / repeat
+	
+	print('{} lines ({:.1f} MB)'.format(lines, len(capsule.encode('utf-8')) / 1e6))
+	print('old:  {:8.2f} ms ({:8.0f} lines/s)'.format(legacy * 1e3, lines / legacy))
+	print('new:  {:8.2f} ms ({:8.0f} lines/s, {:.1f}x faster)'.format(new * 1e3, lines / new, legacy / new))
@@ -0,0 +1,96 @@
+'''
+Benchmark reading the variables of a blog's posts, the way the scripts in
+samples/ do to make index pages, tag pages and feeds
+
+Compares the old way (every post read and converted again) against looking
+them up in the mdiocre.index.SiteIndex kept by the build, and shows how much
+keeping the index adds to a full build.
+
+Usage: python bench_index.py [number of posts] [number of paragraphs in each]
+'''
+
+import os
+import sys
+# point this to the folder where mdiocre is located
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import logging
+import shutil
+import tempfile
+import time
+from mdiocre.core import MDiocre
+from mdiocre.wizard import Wizard
+from mdiocre.index import SiteIndex
+
+TEMPLATE = '<html><title><!--: title --></title><body><!--: content --></body></html>\n'
+
+PARAGRAPH = 'Lorem ipsum *dolor* sit amet, [consectetur](http://example.com) adipiscing elit.\n\n'
+
+def make_posts(blog_dir, count, paragraphs):
+	os.makedirs(blog_dir)
+	for i in range(count):
+		with open(os.path.join(blog_dir, 'post{}.md'.format(i)), 'w') as f:
+			f.write('<!--:mdiocre-template="../template.html"-->\n')
+			f.write('<!--: title = "Post {}" -->\n'.format(i))
+			f.write('<!--: date = "20{:02}-{:02}-{:02}" -->\n'.format(i % 20, i % 12 + 1, i % 28 + 1))
+			f.write('<!--: tags = "tag{} tag{}" -->\n'.format(i % 5, i % 7))
+			f.write('# Post {}\n\n'.format(i) + PARAGRAPH * paragraphs)
+
+def legacy_posts(blog_dir, wizard):
+	m = MDiocre()
+	posts = []
+	for f in os.listdir(blog_dir):
+		with open(os.path.join(blog_dir, f), 'r') as content:
+			v = m.process(content.read(), parser=wizard.get_parser('md'))
+		posts.append((v.get('date'), v.get('title'), v.get('tags'), v.get('content')))
+	posts.sort(reverse=True)
+	return posts
+
+def current_posts(build_dir):
+	with SiteIndex(build_dir, readonly=True) as index:
+		return [
+			(p['variables']['date'], p['variables']['title'], p['variables']['tags'], p['variables']['content'])
+			for p in index.sort_by('date', reverse=True, prefix='blog/')
+		]
+
+def timed(function, *args):
+	start = time.perf_counter()
+	result = function(*args)
+	return time.perf_counter() - start, result
+
+def build(wizard, source_dir, build_dir):
+	shutil.rmtree(build_dir, ignore_errors=True)
+	return timed(wizard.generate_from_directory, {'source_dir': source_dir, 'build_dir': build_dir})[0]
+
+if __name__ == '__main__':
+	count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+	paragraphs = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+	logging.getLogger('mdiocre').setLevel(logging.CRITICAL + 1)
+
+	with tempfile.TemporaryDirectory() as root:
+		source_dir = os.path.join(root, 'src')
+		build_dir = os.path.join(root, 'build')
+		blog_dir = os.path.join(source_dir, 'blog')
+		make_posts(blog_dir, count, paragraphs)
+		with open(os.path.join(root, 'template.html'), 'w') as f:
+			f.write(TEMPLATE)
+
+		print('{} posts, {} paragraphs each\n'.format(count, paragraphs))
+
+		without_index = Wizard(site_index=False)
+		without_index.register_converters()
+		with_index = Wizard()
+		with_index.register_converters()
+
+		build(without_index, source_dir, build_dir)
+		plain = build(without_index, source_dir, build_dir)
+		indexed = build(with_index, source_dir, build_dir)
+		print('build     without index: {:8.3f} s   with index: {:8.3f} s   ({:+.1f}%)'.format(
+			plain, indexed, (indexed / plain - 1) * 100))
+
+		legacy, legacy_found = timed(legacy_posts, blog_dir, with_index)
+		current, current_found = timed(current_posts, build_dir)
+		print('posts     old: {:8.3f} s   new: {:8.3f} s   old/new: {:6.1f}x'.format(legacy, current, legacy / current))
+
+		assert current_found == legacy_found
@@ -0,0 +1,103 @@
+'''
+Benchmark the CLI's logging
+
+Compares the old handler (a terminal check and up to three print() calls for
+every record, with messages formatted before logging) against the current
+MDiocreHandler (records queued, then written in batches from a thread, with
+lazy %-style messages), both when printing and with --quiet.
+
+Usage: python bench_logging.py [number of records]
+'''
+
+import os
+import sys
+# point this to the folder where mdiocre is located
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import io
+import time
+import logging
+from mdiocre.interface.cli import MDiocreHandler, has_color
+
+class LegacyHandler(logging.Handler):
+	quiet = False
+
+	def set_quiet(self, quiet):
+		self.quiet = quiet
+		return self
+
+	def emit(self, record):
+		if not self.quiet:
+			color_enable = has_color()
+			if color_enable:
+				if record.levelno >= 35: # SERIOUS, ERROR, CRITICAL
+					print('\033[31m', end='')
+				elif record.levelno >= 30: # WARNING
+					print('\033[33m', end='')
+				elif record.levelno >= 25: # INFO + 5, a.k.a. OK
+					print('\033[32m', end='')
+				else:
+					print('\033[0m', end='')
+
+			sep = '... '
+
+			if not color_enable:
+				sep = '\n[{}] '.format(record.levelname.split(':')[0])
+
+			print(''.join(['    '*int(record.levelno % 5), sep, record.msg]), end='')
+
+			if color_enable:
+				print('\033[0m')
+
+def legacy_log(logger, count):
+	for i in range(count):
+		logger.log(logging.INFO + 2, '{}\'s base dir: {}'.format('page{}.md'.format(i), '/site/src'))
+		logger.log(logging.INFO + 7, '{} is a MDiocre file, writing {}.'.format('page{}.md'.format(i), 'page{}.html'.format(i)))
+
+def current_log(logger, count):
+	for i in range(count):
+		logger.log(logging.INFO + 2, '%s\'s base dir: %s', 'page%d.md' % i, '/site/src')
+		logger.log(logging.INFO + 7, '%s is a MDiocre file, writing %s.', 'page%d.md' % i, 'page%d.html' % i)
+
+def timed(logger, handler, log, count, quiet):
+	logger.handlers = []
+	if quiet and not isinstance(handler, LegacyHandler):
+		logger.setLevel(logging.CRITICAL + 1)
+	else:
+		logger.setLevel(logging.DEBUG)
+		logger.addHandler(handler.set_quiet(quiet))
+
+	start = time.perf_counter()
+	log(logger, count)
+	if isinstance(handler, MDiocreHandler):
+		handler.close()
+	return time.perf_counter() - start
+
+if __name__ == '__main__':
+	count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+
+	logging.addLevelName(logging.INFO + 5, '-OK-')
+	logger = logging.getLogger('mdiocre.bench')
+	logger.propagate = False
+
+	print('{} pages, 2 records each\n'.format(count))
+
+	real_stdout = sys.stdout
+	for quiet in (False, True):
+		legacy_out, current_out = io.StringIO(), io.StringIO()
+
+		sys.stdout = legacy_out
+		try:
+			legacy = timed(logger, LegacyHandler(), legacy_log, count, quiet)
+		finally:
+			sys.stdout = real_stdout
+
+		# neither is writing to a terminal
+		handler = MDiocreHandler(stream=current_out)
+		handler.color = False
+		current = timed(logger, handler, current_log, count, quiet)
+
+		assert legacy_out.getvalue() == current_out.getvalue()
+
+		print('{:<8} old: {:8.3f} s   new: {:8.3f} s   old/new: {:6.1f}x'.format(
+			'quiet' if quiet else 'printed', legacy, current, legacy / current))
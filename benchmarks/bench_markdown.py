@@ -0,0 +1,64 @@
+'''
+Benchmark converting a corpus of small Markdown posts.
+
+Compares the old way (making a new Markdown object with its extensions for
+every page) against MarkdownParser, which keeps one Markdown object per
+thread and resets it between pages.
+
+Usage: python bench_markdown.py [number of posts]
+'''
+
+import os
+import sys
+# point this to the folder where mdiocre is located
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import timeit
+from markdown import Markdown
+from mdx_gfm import GithubFlavoredMarkdownExtension
+from mdiocre.core import MDiocre
+from mdiocre.parsers.markdown import MarkdownParser
+
+POST = '''<!--: title = "Post {0}" -->
+<!--: date = "2020-09-{1:02d}" -->
+
+# <!--: title -->
+
+Some *text* with a [link][home] and `code`, posted on <!--: date -->.
+
+* one
+* two
+
+[home]: https://example.com/{0}
+'''
+
+def legacy_convert(markdown):
+	'''
+	Conversion as it was done before MarkdownParser kept its engine
+	'''
+	return Markdown(extensions=[GithubFlavoredMarkdownExtension()]).convert(markdown)
+
+if __name__ == '__main__':
+	count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+	repeat = 3
+	
+	m = MDiocre(parser=MarkdownParser)
+	parser = m.parser
+	posts = [POST.format(i, i % 28 + 1) for i in range(count)]
+	
+	for post in posts[:50]:
+		assert legacy_convert(post) == parser.engine().convert(post)
+	
+	def per_page(fn):
+		return timeit.timeit(lambda: [fn(post) for post in posts], number=repeat) / repeat / count
+	
+	setup = per_page(lambda post: Markdown(extensions=[GithubFlavoredMarkdownExtension()]))
+	legacy = per_page(legacy_convert)
+	reused = per_page(lambda post: parser.engine().convert(post))
+	page = per_page(m.process)
+	
+	print('{} small posts'.format(count))
+	print('per post, setting up Markdown:  {:8.2f} us'.format(setup * 1e6))
+	print('per post, new Markdown object:  {:8.2f} us'.format(legacy * 1e6))
+	print('per post, reused and reset:     {:8.2f} us ({:.1f}x faster)'.format(reused * 1e6, legacy / reused))
+	print('per post, whole page:           {:8.2f} us'.format(page * 1e6))
@@ -0,0 +1,73 @@
+'''
+Benchmark getting a parser for every file on a site with many small files.
+
+Compares the old way (making a new parser object through switch_parser
+for every file, and looking the parser up by name through find_spec and
+import_module) against handing out the same parser objects through
+mdiocre.core.PARSERS.
+
+Usage: python bench_parsers.py [number of files]
+'''
+
+import os
+import sys
+# point this to the folder where mdiocre is located
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import timeit
+from importlib import import_module
+from importlib.util import find_spec
+from mdiocre.core import MDiocre
+from mdiocre.wizard import Wizard
+
+PAGE = '<!--: title = "Page {}" -->\n<p><!--: title --></p>\n'
+
+def legacy_switch_parser(m, name):
+	'''
+	switch_parser as it was, for names and for classes
+	'''
+	if isinstance(name, type):
+		m.parser = name()
+		return
+	module_name = '.parsers.{}'.format(name.lower())
+	class_name  = '{}Parser'.format(name.capitalize())
+	if find_spec(module_name, 'mdiocre'):
+		module = import_module(module_name, 'mdiocre')
+	module = import_module(module_name, 'mdiocre')
+	m.parser = getattr(module, class_name)()
+
+if __name__ == '__main__':
+	count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+	repeat = 5
+	
+	w = Wizard()
+	w.register_converters()
+	m = MDiocre(parser_name='html')
+	
+	pages = [(('html', 'zim', 'gem')[i % 3], PAGE.format(i)) for i in range(count)]
+	names = {ext: w.converters[ext].__name__[:-len('Parser')] for ext in w.converters}
+	
+	def legacy_by_class():
+		for ext, page in pages:
+			legacy_switch_parser(m, w.converters[ext])
+	
+	def legacy_by_name():
+		for ext, page in pages:
+			legacy_switch_parser(m, names[ext])
+	
+	def registry():
+		for ext, page in pages:
+			w.get_parser(ext)
+	
+	def build():
+		for ext, page in pages:
+			m.process(page, parser=w.get_parser(ext))
+	
+	def per_file(fn):
+		return timeit.timeit(fn, number=repeat) / repeat / count
+	
+	print('{} small files'.format(count))
+	print('getting a parser, new object:       {:8.2f} us per file'.format(per_file(legacy_by_class) * 1e6))
+	print('getting a parser, lookup by name:   {:8.2f} us per file'.format(per_file(legacy_by_name) * 1e6))
+	print('getting a parser, registry:         {:8.2f} us per file'.format(per_file(registry) * 1e6))
+	print('converting a file, for comparison:  {:8.2f} us per file'.format(per_file(build) * 1e6))
@@ -0,0 +1,106 @@
+'''
+Benchmark converting a corpus of small reStructuredText posts.
+
+Compares the old way (registering the mdiocre role and running
+publish_parts, which works out the docutils settings again, for every
+page) against RstParser, both for new sources and for sources it has seen
+before (e.g. when only the template changed). Markdown is given for
+comparison.
+
+Usage: python bench_rst.py [number of posts]
+'''
+
+import os
+import sys
+# point this to the folder where mdiocre is located
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import re
+import timeit
+import docutils.core
+import docutils.nodes as nodes
+import docutils.parsers.rst as rst
+from mdiocre.core import MDiocre, VariableManager
+from mdiocre.directives import compile_command, Get
+from mdiocre.parsers.rst import RstParser, CustomHTMLWriter, mdiocre_role
+from mdiocre.parsers.markdown import MarkdownParser
+
+RST_POST = '''Post {0}
+=========
+
+:mdiocre:`title = "Post {0}"`
+:mdiocre:`date = "2020-09-{1:02d}"`
+
+Some *text* with a `link <https://example.com/{0}>`_ and ``code``,
+posted on :mdiocre:`date`.
+
+* one
+* two
+'''
+
+MD_POST = '''# Post {0}
+
+<!--: title = "Post {0}" -->
+<!--: date = "2020-09-{1:02d}" -->
+
+Some *text* with a [link](https://example.com/{0}) and `code`,
+posted on <!--: date -->.
+
+* one
+* two
+'''
+
+def legacy_to_variables(markup, v):
+	'''
+	RstParser.to_variables as it was
+	'''
+	def legacy_role(role, rawtext, text, lineno, inliner, options={}, content=[]):
+		command = compile_command(text.strip())
+		var_txt = command.run(v)
+		if not isinstance(command, Get):
+			var_txt = ''
+		return [nodes.Text(var_txt)],[]
+	
+	rst.roles.register_local_role('mdiocre', legacy_role)
+	html = docutils.core.publish_parts(markup, writer=CustomHTMLWriter())['html_body']
+	end_tag = '</div>'
+	html = re.sub(r'<.+?>', '', html, count=1)
+	html = html[:len(end_tag)*-1-1]
+	v.variables["content"] = html.strip()
+	return v
+
+if __name__ == '__main__':
+	count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+	repeat = 3
+	
+	rst_posts = [RST_POST.format(i, i % 28 + 1) for i in range(count)]
+	md_posts = [MD_POST.format(i, i % 28 + 1) for i in range(count)]
+	
+	m = MDiocre(parser=RstParser)
+	markdown = MDiocre(parser=MarkdownParser)
+	
+	for post in rst_posts[:20]:
+		legacy = legacy_to_variables(post, VariableManager()).variables['content']
+		rst.roles.register_local_role('mdiocre', mdiocre_role)
+		assert legacy == RstParser().to_variables(post, VariableManager()).variables['content']
+	
+	def per_page(fn, posts):
+		return timeit.timeit(lambda: [fn(post) for post in posts], number=repeat) / repeat / count
+	
+	legacy = per_page(lambda post: legacy_to_variables(post, VariableManager()), rst_posts)
+	rst.roles.register_local_role('mdiocre', mdiocre_role)
+	
+	m.parser.cache_size = 0
+	fresh = per_page(m.process, rst_posts)
+	m.parser.cache_size = count
+	m.parser.cache.clear()
+	for post in rst_posts:
+		m.process(post)
+	cached = per_page(m.process, rst_posts)
+	md = per_page(markdown.process, md_posts)
+	
+	print('{} small posts'.format(count))
+	print('per post, old RST:            {:8.2f} us'.format(legacy * 1e6))
+	print('per post, RST:                {:8.2f} us ({:.1f}x faster)'.format(fresh * 1e6, legacy / fresh))
+	print('per post, RST seen before:    {:8.2f} us ({:.1f}x faster)'.format(cached * 1e6, legacy / cached))
+	print('per post, Markdown:           {:8.2f} us'.format(md * 1e6))
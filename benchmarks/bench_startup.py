@@ -0,0 +1,97 @@
+'''
+Benchmark how long MDiocre takes to start up
+
+Times, each in a fresh Python process: `import mdiocre`, `mdiocre --help`,
+and making a Wizard and registering its parsers. The last one is compared
+against the old way (every mdiocre_* module on sys.path looked for, and
+every parser imported, Markdown being loaded by MDiocre() too), and checked
+not to import Markdown or docutils anymore.
+
+Usage: python bench_startup.py [number of runs]
+'''
+
+import os
+import sys
+# point this to the folder where mdiocre is located
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(ROOT)
+
+import json
+import tempfile
+import subprocess
+import time
+
+HEAVY = ('markdown', 'mdx_gfm', 'docutils', 'xml.etree.ElementTree')
+
+REPORT = '''
+import sys, json
+print(json.dumps([m for m in {!r} if m in sys.modules]))
+'''.format(HEAVY)
+
+LEGACY_REGISTER = '''
+import os, pkgutil, importlib, importlib.util
+import mdiocre
+from mdiocre.core import MDiocre
+from mdiocre.parsers import BaseParser
+MDiocre().switch_parser("markdown")
+converters = {}
+def find_parsers(search_locations, module_name):
+	for finder_, parser_file, ispkg in pkgutil.iter_modules(search_locations):
+		module = importlib.import_module(".parsers.{}".format(parser_file), module_name)
+		parser_class = getattr(module, "{}Parser".format(parser_file.capitalize()))
+		if issubclass(parser_class, BaseParser):
+			for filetype in parser_class.FILETYPES:
+				converters[filetype] = parser_class
+find_parsers([os.path.join(os.path.dirname(mdiocre.__file__), "parsers")], "mdiocre")
+for finder, name, ispkg in pkgutil.iter_modules():
+	if name.startswith("mdiocre_"):
+		spec = importlib.util.find_spec("{}.parsers".format(name))
+		if spec:
+			find_parsers(spec.submodule_search_locations, name)
+'''
+
+CURRENT_REGISTER = '''
+from mdiocre.wizard import Wizard
+Wizard().register_converters()
+'''
+
+def run(args, env):
+	'''
+	Runs Python with some arguments, giving the time it took and the
+	last line it printed.
+	'''
+	start = time.perf_counter()
+	output = subprocess.check_output([sys.executable] + args, env=env, cwd=ROOT)
+	elapsed = time.perf_counter() - start
+	lines = output.decode('utf-8').strip().split('\n')
+	return elapsed, lines[-1]
+
+def best(args, env, runs):
+	return min(run(args, env)[0] for _ in range(runs))
+
+if __name__ == '__main__':
+	runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+	with tempfile.TemporaryDirectory() as cache_dir:
+		env = dict(os.environ, PYTHONPATH=ROOT, XDG_CACHE_HOME=cache_dir)
+
+		# fill the parser cache first, the way it would be after the
+		# first run
+		run(['-c', CURRENT_REGISTER], env)
+
+		python = best(['-c', 'pass'], env, runs)
+		print('{} runs each, the best one counted, python alone takes {:.1f} ms\n'.format(runs, python * 1000))
+
+		for label, args in (
+			('import mdiocre', ['-c', 'import mdiocre']),
+			('mdiocre --help', ['-m', 'mdiocre.interface.cli', '--help']),
+		):
+			print('{:<16} {:8.1f} ms'.format(label, best(args, env, runs) * 1000))
+
+		legacy = best(['-c', LEGACY_REGISTER], env, runs)
+		current = best(['-c', CURRENT_REGISTER], env, runs)
+		print('{:<16} old: {:8.1f} ms   new: {:8.1f} ms   old/new: {:6.1f}x'.format(
+			'register', legacy * 1000, current * 1000, legacy / current))
+
+		_, loaded = run(['-c', CURRENT_REGISTER + REPORT], env)
+		assert json.loads(loaded) == [], 'imported at startup: {}'.format(loaded)
@@ -0,0 +1,96 @@
+'''
+Benchmark the peak memory used to build one big page, with and without
+streaming (see Wizard.process_page_stream).
+
+A page of the given size is made for each streaming parser, then built by
+a fresh process for each mode, which reports its own peak resident set size.
+Before measuring, both modes are checked to write the same page.
+
+Usage: python bench_streaming.py [size in MiB]
+'''
+
+import os
+import sys
+# point this to the folder where mdiocre is located
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import filecmp
+import resource
+import subprocess
+import tempfile
+import time
+
+TEMPLATE = '<html><head><title><!--: title --></title></head>\n<body><!--: content --></body></html>\n'
+
+HEADERS = {
+	'html': '<!--: mdiocre-template = "template.html" -->\n<!--: title = "Big page" -->\n',
+	'zim': 'Content-Type: text/x-zim-wiki\n[mdiocre: mdiocre-template = "template.html"]\n[mdiocre: title = "Big page"]\n',
+	'gmi': '# Big page\n[mdiocre: mdiocre-template = "template.html"]\n[mdiocre: title = "Big page"]\n',
+}
+
+BODIES = {
+	'html': '<p>Some <b>text</b> for <!--: title -->, line {}.</p>\n',
+	'zim': '====== Heading {} ======\n* some **bold** and //italic// text\n* a [[link|link]]\n\n',
+	'gmi': '## Heading {}\n* some text for [mdiocre: title]\n=> https://example.com a link\n\n',
+}
+
+def make_page(path, extension, size):
+	with open(path, 'w') as page:
+		page.write(HEADERS[extension])
+		written = 0
+		i = 0
+		while written < size:
+			line = BODIES[extension].format(i)
+			page.write(line)
+			written += len(line)
+			i += 1
+
+def child(source_file, built_file, root, stream_threshold):
+	'''
+	Builds a single page, then prints the time taken and the peak RSS
+	in KiB.
+	'''
+	from mdiocre.wizard import Wizard
+	w = Wizard(stream_threshold=stream_threshold)
+	w.register_converters()
+	start = time.perf_counter()
+	result = w.generate_from_path(source_file, built_file, root=root, to_html=True)
+	assert not result['error']
+	print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+def measure(source_file, built_file, root, stream_threshold):
+	output = subprocess.check_output([
+		sys.executable, __file__, '--child',
+		source_file, built_file, root, str(stream_threshold)
+	])
+	seconds, rss = output.split()
+	return float(seconds), int(rss)
+
+if __name__ == '__main__':
+	if len(sys.argv) > 1 and sys.argv[1] == '--child':
+		threshold = sys.argv[5]
+		child(sys.argv[2], sys.argv[3], sys.argv[4], None if threshold == 'None' else int(threshold))
+		sys.exit(0)
+
+	size = int(float(sys.argv[1]) * (1 << 20)) if len(sys.argv) > 1 else 64 << 20
+
+	with tempfile.TemporaryDirectory() as root:
+		with open(os.path.join(root, 'template.html'), 'w') as template:
+			template.write(TEMPLATE)
+
+		print('{} MiB pages\n'.format(size >> 20))
+		for extension in HEADERS:
+			source_file = os.path.join(root, 'page.' + extension)
+			make_page(source_file, extension, size)
+
+			whole_file = os.path.join(root, 'whole.' + extension)
+			stream_file = os.path.join(root, 'stream.' + extension)
+			whole_time, whole_rss = measure(source_file, whole_file, root, None)
+			stream_time, stream_rss = measure(source_file, stream_file, root, 0)
+
+			# without reading them whole, which would show up in the
+			# peak RSS of the next process
+			assert filecmp.cmp(os.path.join(root, 'whole.html'), os.path.join(root, 'stream.html'), shallow=False)
+
+			print('{:<6} whole: {:8.1f} MiB {:6.2f} s   streamed: {:8.1f} MiB {:6.2f} s'.format(
+				extension, whole_rss / 1024, whole_time, stream_rss / 1024, stream_time))
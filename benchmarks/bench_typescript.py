@@ -0,0 +1,78 @@
+'''
+Benchmark compiling TypeScript files
+
+Compares the old way (one blocking tsc process per file, one after the other)
+against mdiocre.typescript.TypeScriptPool. If tsc isn't installed, a stand-in
+script that takes as long as node takes to start up is used instead.
+
+Usage: python bench_typescript.py [number of files] [jobs]
+'''
+
+import os
+import sys
+# point this to the folder where mdiocre is located
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import shutil
+import subprocess
+import tempfile
+import time
+from mdiocre.typescript import TypeScriptPool
+
+FAKE_TSC = '''#!/bin/sh
+# tsc --strict --outFile OUT SRC, taking as long as node starts up
+sleep 1
+cp "$4" "$3"
+'''
+
+def legacy_compile(files):
+	for source_file, built_file in files:
+		subprocess.check_output(
+			['tsc', '--strict', '--outFile', built_file, source_file],
+			stderr = subprocess.STDOUT
+		)
+
+def current_compile(files, pool):
+	for source_file, built_file in files:
+		pool.submit(source_file, built_file)
+	for source_file, built_file, error in pool.wait():
+		assert error is None, error
+
+def timed(function, *args):
+	start = time.perf_counter()
+	function(*args)
+	return time.perf_counter() - start
+
+if __name__ == '__main__':
+	count = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+	jobs = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+	with tempfile.TemporaryDirectory() as root:
+		if shutil.which('tsc') is None:
+			print('tsc not found, using a stand-in that sleeps for 1s')
+			with open(os.path.join(root, 'tsc'), 'w') as f:
+				f.write(FAKE_TSC)
+			os.chmod(os.path.join(root, 'tsc'), 0o755)
+			os.environ['PATH'] = os.pathsep.join([root, os.environ['PATH']])
+
+		for name in ('src', 'old', 'new'):
+			os.mkdir(os.path.join(root, name))
+		for i in range(count):
+			with open(os.path.join(root, 'src', '{}.ts'.format(i)), 'w') as f:
+				f.write('let a{0}: number = {0};\n'.format(i))
+
+		def files(target):
+			return [
+				(os.path.join(root, 'src', '{}.ts'.format(i)), os.path.join(root, target, '{}.js'.format(i)))
+				for i in range(count)
+			]
+
+		legacy = timed(legacy_compile, files('old'))
+		current = timed(current_compile, files('new'), TypeScriptPool(jobs=jobs))
+
+		for i in range(count):
+			with open(os.path.join(root, 'old', '{}.js'.format(i))) as a, open(os.path.join(root, 'new', '{}.js'.format(i))) as b:
+				assert a.read() == b.read()
+
+		print('{} files, {} jobs   old: {:6.2f} s   new: {:6.2f} s   old/new: {:.1f}x'.format(
+			count, jobs, legacy, current, legacy / current))
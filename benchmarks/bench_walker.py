@@ -0,0 +1,78 @@
+'''
+Benchmark walking a source directory
+
+Compares the old way (os.walk following links, then a stat of every file to
+check it against the build manifest) against mdiocre.walker.SourceTree, on a
+source tree that has a .git directory and node_modules in it, the way a site
+kept in a repository with some JavaScript tooling would. Before timing, the
+files editors leave next to the pages (swap, backup and autosave files) are
+checked to be left out.
+
+Usage: python bench_walker.py [number of pages] [number of files in .git and node_modules]
+'''
+
+import os
+import sys
+# point this to the folder where mdiocre is located
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import tempfile
+import time
+from mdiocre.walker import SourceTree
+
+def legacy_walk(source_dir):
+	found = []
+	for path, folders, files in os.walk(source_dir, followlinks=True):
+		for f in files:
+			original_file = os.path.sep.join([path, f])
+			st = os.stat(original_file)
+			found.append((original_file, st.st_mtime_ns))
+	return found
+
+def current_walk(source_dir):
+	found = []
+	for path, folders, files in SourceTree(source_dir).walk():
+		for entry in files:
+			st = entry.stat()
+			found.append((entry.path, st.st_mtime_ns))
+	return found
+
+def make_files(folder, count, per_folder, name):
+	for i in range(count):
+		path = os.path.join(folder, 'd{}'.format(i // per_folder))
+		os.makedirs(path, exist_ok=True)
+		with open(os.path.join(path, name.format(i)), 'w') as f:
+			f.write('x')
+
+# what Vim, Emacs and others leave next to a file being edited
+EDITOR_FILES = ('.{}.swp', '{}~', '.#{}', '#{}#')
+
+def timed(function, *args):
+	start = time.perf_counter()
+	result = function(*args)
+	return time.perf_counter() - start, result
+
+if __name__ == '__main__':
+	pages = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+	junk = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+
+	with tempfile.TemporaryDirectory() as source_dir:
+		make_files(source_dir, pages, 50, 'page{}.md')
+		make_files(os.path.join(source_dir, '.git', 'objects'), junk // 2, 200, '{:038x}')
+		make_files(os.path.join(source_dir, 'node_modules'), junk // 2, 20, 'index{}.js')
+
+		leftovers = [os.path.join(source_dir, 'd0', i.format('page0.md')) for i in EDITOR_FILES]
+		for path in leftovers:
+			with open(path, 'w') as f:
+				f.write('x')
+		found = set(i[0] for i in current_walk(source_dir))
+		assert not found.intersection(leftovers), 'not left out: {}'.format(sorted(found.intersection(leftovers)))
+
+		print('{} pages, {} files in .git and node_modules\n'.format(pages, junk))
+
+		legacy, legacy_found = timed(legacy_walk, source_dir)
+		current, current_found = timed(current_walk, source_dir)
+		print('old: {:8.3f} s   new: {:8.3f} s   old/new: {:6.1f}x'.format(legacy, current, legacy / current))
+
+		ignored = (os.path.join(source_dir, '.git') + os.path.sep, os.path.join(source_dir, 'node_modules') + os.path.sep)
+		assert sorted(current_found) == sorted(i for i in legacy_found if not i[0].startswith(ignored) and i[0] not in leftovers)
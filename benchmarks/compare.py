@@ -0,0 +1,67 @@
+'''
+Compares two result files written by ``python -m benchmarks run``
+'''
+
+import json
+
+def load(path):
+	with open(path, 'r') as f:
+		report = json.load(f)
+	if report.get('format') != 1:
+		raise ValueError('{} is not a benchmark result file'.format(path))
+	return report
+
+def compare(base, new, threshold=10.0, stat='min'):
+	'''
+	Compares the results of two runs.
+
+	Args:
+	    base (dict): The report to compare against.
+	    new (dict): The report of the new run.
+	    threshold (float, Optional): How much slower than `base` a
+	        benchmark can get before it counts as a regression, in percent.
+	    stat (string, Optional): Which number to compare, "min" or
+	        "median".
+
+	Returns:
+	    A list of (name, base time, new time, change in percent, status)
+	    tuples, status being "regression", "improvement", "ok", "new"
+	    or "missing".
+	'''
+	rows = []
+	base_results = base['results']
+	new_results = new['results']
+	for name in sorted(set(base_results) | set(new_results)):
+		if name not in new_results:
+			rows.append((name, base_results[name][stat], None, None, 'missing'))
+			continue
+		if name not in base_results:
+			rows.append((name, None, new_results[name][stat], None, 'new'))
+			continue
+		old_time = base_results[name][stat]
+		new_time = new_results[name][stat]
+		change = (new_time / old_time - 1) * 100 if old_time else 0.0
+		if change > threshold:
+			status = 'regression'
+		elif change < -threshold:
+			status = 'improvement'
+		else:
+			status = 'ok'
+		rows.append((name, old_time, new_time, change, status))
+	return rows
+
+def format_rows(rows):
+	'''
+	Formats what :func:`compare` returned as a table.
+	'''
+	def ms(seconds):
+		return '-' if seconds is None else '{:.2f} ms'.format(seconds * 1000)
+
+	lines = ['{:<18} {:>14} {:>14} {:>9}  {}'.format('benchmark', 'base', 'new', 'change', '')]
+	for name, old_time, new_time, change, status in rows:
+		lines.append('{:<18} {:>14} {:>14} {:>9}  {}'.format(
+			name, ms(old_time), ms(new_time),
+			'-' if change is None else '{:+.1f}%'.format(change),
+			'' if status == 'ok' else status.upper()
+		))
+	return '\n'.join(lines)
@@ -0,0 +1,212 @@
+'''
+Runs the benchmarks of the suite on a synthetic site (see sitegen.py)
+
+Every benchmark is run a number of times with MDiocre's caches emptied
+beforehand, so that each run costs what a fresh build would:
+
+    process.<ext>   MDiocre.process on every page of one kind
+    render          MDiocre.render of the template, for every page
+    build.full      Wizard.generate_from_directory into an empty directory
+    build.noop      the same again, when nothing has changed
+    build.parallel  build.full with a number of jobs (if asked to)
+    startup.import  `import mdiocre` in a new Python process
+    startup.help    `mdiocre --help` in a new Python process
+'''
+
+import os
+import sys
+import time
+import shutil
+import logging
+import datetime
+import platform
+import subprocess
+import statistics
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# point this to the folder where mdiocre is located
+sys.path.append(ROOT)
+
+from mdiocre import core, directives
+from mdiocre.core import MDiocre
+from mdiocre.wizard import Wizard
+from mdiocre.__meta__ import __version__
+
+FORMAT = 1
+
+def clear_caches(wizard=None):
+	'''
+	Empties the caches MDiocre keeps between pages.
+	'''
+	for cache in (getattr(core, 'INCLUDE_CACHE', None), getattr(core, 'SCRIPT_CACHE', None)):
+		if cache is not None:
+			cache.clear()
+	source_cache = getattr(directives, '_source_cache', None)
+	if source_cache is not None:
+		source_cache.clear()
+	compile_command = getattr(directives, 'compile_command', None)
+	if hasattr(compile_command, 'cache_clear'):
+		compile_command.cache_clear()
+	if wizard is not None:
+		wizard.templates.clear()
+		for parser in getattr(wizard.parsers, 'instances', {}).values():
+			if hasattr(parser, 'cache'):
+				parser.cache.clear()
+
+def git_commit():
+	'''
+	Gets the commit MDiocre is at, if it is in a git repository.
+	'''
+	try:
+		return subprocess.check_output(
+			['git', 'rev-parse', 'HEAD'], cwd=ROOT, stderr=subprocess.DEVNULL
+		).decode('utf-8').strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+def measure(function, repeat, setup=None):
+	'''
+	Times a function.
+
+	Args:
+	    function (func): What to time.
+	    repeat (int): Number of runs.
+	    setup (func, Optional): Called before every run, not timed.
+
+	Returns:
+	    A dictionary with the keys "runs" (time of every run, in
+	    seconds), "min" and "median".
+	'''
+	runs = []
+	for _ in range(repeat):
+		if setup is not None:
+			setup()
+		start = time.perf_counter()
+		function()
+		runs.append(time.perf_counter() - start)
+	return {'runs': runs, 'min': min(runs), 'median': statistics.median(runs)}
+
+def run_python(args):
+	'''
+	Runs a new Python process using this copy of MDiocre.
+	'''
+	env = dict(os.environ)
+	env['PYTHONPATH'] = os.pathsep.join([ROOT] + ([env['PYTHONPATH']] if env.get('PYTHONPATH') else []))
+	subprocess.check_call([sys.executable] + args, env=env, stdout=subprocess.DEVNULL)
+
+def run_suite(site, repeat=5, jobs=1, progress=None):
+	'''
+	Runs every benchmark on a site.
+
+	Args:
+	    site (dict): What :func:`sitegen.generate_site` returned.
+	    repeat (int, Optional): Number of runs of every benchmark.
+	    jobs (int, Optional): If more than 1, build.parallel is run
+	        with this many jobs.
+	    progress (func, Optional): Called with the name of every
+	        benchmark before it runs.
+
+	Returns:
+	    A dictionary of benchmark names to what :func:`measure` returned.
+	'''
+	# keep the build quiet
+	mdiocre_logger = logging.getLogger('mdiocre')
+	mdiocre_logger.addHandler(logging.NullHandler())
+	mdiocre_logger.propagate = False
+
+	old_cwd = os.getcwd()
+	# included files and scripts are found from the site's root
+	os.chdir(site['root'])
+	try:
+		return _run_suite(site, repeat, jobs, progress or (lambda name: None))
+	finally:
+		os.chdir(old_cwd)
+
+def _run_suite(site, repeat, jobs, progress):
+	results = {}
+
+	wizard = Wizard()
+	wizard.register_converters()
+	m = MDiocre()
+
+	sources = {}
+	for ext, paths in sorted(site['pages'].items()):
+		sources[ext] = []
+		for path in paths:
+			with open(path, 'r') as f:
+				sources[ext].append(f.read())
+
+	for ext, texts in sorted(sources.items()):
+		if not texts:
+			continue
+		parser = wizard.get_parser(ext)
+		def process():
+			for text in texts:
+				m.process(text, parser=parser)
+		name = 'process.{}'.format(ext)
+		progress(name)
+		results[name] = measure(process, repeat, setup=lambda: clear_caches(wizard))
+
+	with open(os.path.join(site['root'], 'template.html'), 'r') as f:
+		template = f.read()
+	variables = [
+		m.process(text, parser=wizard.get_parser(ext))
+		for ext, texts in sorted(sources.items()) for text in texts
+	]
+	def render():
+		for v in variables:
+			m.render(template, v)
+	progress('render')
+	results['render'] = measure(render, repeat, setup=lambda: clear_caches(wizard))
+
+	build_dir = os.path.join(site['root'], 'build')
+	args = {'source_dir': site['source_dir'], 'build_dir': build_dir}
+
+	def fresh():
+		shutil.rmtree(build_dir, ignore_errors=True)
+		clear_caches(wizard)
+
+	progress('build.full')
+	results['build.full'] = measure(lambda: wizard.generate_from_directory(dict(args)), repeat, setup=fresh)
+
+	progress('build.noop')
+	results['build.noop'] = measure(lambda: wizard.generate_from_directory(dict(args)), repeat, setup=lambda: clear_caches(wizard))
+
+	if jobs > 1:
+		progress('build.parallel')
+		results['build.parallel'] = measure(lambda: wizard.generate_from_directory(dict(args, jobs=jobs)), repeat, setup=fresh)
+
+	shutil.rmtree(build_dir, ignore_errors=True)
+
+	progress('startup.import')
+	results['startup.import'] = measure(lambda: run_python(['-c', 'import mdiocre']), repeat)
+
+	progress('startup.help')
+	results['startup.help'] = measure(lambda: run_python(['-m', 'mdiocre.interface.cli', '--help']), repeat)
+
+	return results
+
+def make_report(results, config):
+	'''
+	Puts the results together with what is needed to tell runs apart.
+
+	Args:
+	    results (dict): What :func:`run_suite` returned.
+	    config (dict): The settings of the site and the suite.
+
+	Returns:
+	    A dictionary, to be saved as JSON.
+	'''
+	return {
+		'format': FORMAT,
+		'meta': {
+			'mdiocre': __version__,
+			'commit': git_commit(),
+			'python': platform.python_version(),
+			'platform': platform.platform(),
+			'date': datetime.datetime.now().isoformat(),
+			'config': config,
+		},
+		'results': results,
+	}
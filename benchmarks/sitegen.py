@@ -0,0 +1,267 @@
+'''
+Synthetic site generator
+
+Makes a site that uses everything MDiocre has: pages in every format, a
+template that includes other files, pages that call functions from a script
+loaded with ``Using:``, and static assets. The same arguments always give the
+same site.
+
+The site looks like this, with ``src`` being the source directory. Includes
+and scripts are read relative to the working directory, so builds have to be
+run from the site's root::
+
+    root/
+        template.html   (includes header.html)
+        header.html     (includes nav.html)
+        nav.html
+        _functions.py
+        src/
+            section0/page0.md, page1.rst, ...
+            assets/asset0.bin, ...
+'''
+
+import os
+import random
+
+# parsers and the extensions their pages are written with
+EXTENSIONS = ('md', 'rst', 'zim', 'gmi', 'html')
+
+DEFAULT_MIX = {ext: 1 for ext in EXTENSIONS}
+
+TEMPLATE = '''<!DOCTYPE html>
+<!--: sitename = "Synthetic site" -->
+<html><head><title><!--: title --> - <!--: sitename --></title></head>
+<!--: Include: header.html -->
+<body>
+<h1><!--: title --></h1>
+<!--: content -->
+<footer><!--: date --> <!--: mdiocre-gen-timestamp --></footer>
+</body></html>
+'''
+
+HEADER = '<header><!--: sitename --> / <!--: Include: nav.html --></header>\n'
+
+NAV = '<nav><a href="/">home</a> <!--: title --></nav>\n'
+
+FUNCTIONS = '''def upper(s):
+	return s.upper()
+
+def byline(a, b):
+	return a + " on " + b
+'''
+
+WORDS = (
+	'lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod '
+	'tempor incididunt ut labore et dolore magna aliqua enim ad minim veniam '
+	'quis nostrud exercitation ullamco laboris nisi aliquip ex ea commodo'
+).split()
+
+def sentence(rng, words=12):
+	return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+def page_md(rng, title, date, paragraphs):
+	lines = [
+		'<!--: mdiocre-template = "../template.html" -->',
+		'<!--: Using: _functions.py -->',
+		'<!--: title = "{}" -->'.format(title),
+		'<!--: date = "{}" -->'.format(date),
+		'<!--: shout = (upper title) -->',
+		'<!--: by = (byline title date) -->',
+		'',
+	]
+	for i in range(paragraphs):
+		lines += [
+			'## Section {}'.format(i),
+			'',
+			'Some *{}* with **{}** and `{}`, by <!--: by -->.'.format(sentence(rng, 3), sentence(rng, 2), rng.choice(WORDS)),
+			'{} [a link](https://example.com/{}).'.format(sentence(rng), i),
+			'',
+			'* {}'.format(sentence(rng, 4)),
+			'* {} <!--: shout -->'.format(sentence(rng, 4)),
+			'',
+			'| a | b |',
+			'|---|---|',
+			'| {} | {} |'.format(rng.choice(WORDS), rng.choice(WORDS)),
+			'',
+		]
+	return '\n'.join(lines)
+
+def page_rst(rng, title, date, paragraphs):
+	lines = [
+		':mdiocre:`mdiocre-template = "../template.html"`',
+		':mdiocre:`title = "{}"`'.format(title),
+		':mdiocre:`date = "{}"`'.format(date),
+		'',
+		title,
+		'=' * len(title),
+		'',
+	]
+	for i in range(paragraphs):
+		heading = 'Section {}'.format(i)
+		lines += [
+			heading,
+			'-' * len(heading),
+			'',
+			'Some *{}* with **{}** in :mdiocre:`title`.'.format(sentence(rng, 3), sentence(rng, 2)),
+			'{} `a link <https://example.com/{}>`_.'.format(sentence(rng), i),
+			'',
+			'* {}'.format(sentence(rng, 4)),
+			'* {}'.format(sentence(rng, 4)),
+			'',
+		]
+	return '\n'.join(lines)
+
+def page_zim(rng, title, date, paragraphs):
+	lines = [
+		'Content-Type: text/x-zim-wiki',
+		'Wiki-Format: zim 0.4',
+		'Creation-Date: {}'.format(date),
+		'',
+		'[mdiocre: mdiocre-template = "../template.html"]',
+		'[mdiocre: title = "{}"]'.format(title),
+		'[mdiocre: date = "{}"]'.format(date),
+		'====== [mdiocre: title] ======',
+	]
+	for i in range(paragraphs):
+		lines += [
+			'===== Section {} ====='.format(i),
+			'Some **{}** and //{}// and \'\'{}\'\'.'.format(sentence(rng, 3), sentence(rng, 2), rng.choice(WORDS)),
+			'{} [[https://example.com/{}|a link]] {{{{img{}.png}}}}'.format(sentence(rng), i, i),
+			'',
+			'* {}'.format(sentence(rng, 4)),
+			'* {}'.format(sentence(rng, 4)),
+			'\'\'\'',
+			'<pre> {}'.format(sentence(rng, 5)),
+			'\'\'\'',
+		]
+	return '\n'.join(lines)
+
+def page_gmi(rng, title, date, paragraphs):
+	lines = [
+		'# {}'.format(title),
+		'[mdiocre: mdiocre-template = "../template.html"]',
+		'[mdiocre: title = "{}"]'.format(title),
+		'[mdiocre: date = "{}"]'.format(date),
+	]
+	for i in range(paragraphs):
+		lines += [
+			'## Section {}'.format(i),
+			'{} (=> https://example.com/{} inline link)'.format(sentence(rng), i),
+			'* {}'.format(sentence(rng, 4)),
+			'* {} [mdiocre: title]'.format(sentence(rng, 4)),
+			'=> gemini://example.com/{} {}'.format(i, sentence(rng, 2)),
+			'> {}'.format(sentence(rng, 6)),
+			# the alt text goes on the closing line here
+			'```sh',
+			sentence(rng, 5),
+			'```code',
+		]
+	return '\n'.join(lines) + '\n'
+
+def page_html(rng, title, date, paragraphs):
+	lines = [
+		'<!--: mdiocre-template = "../template.html" -->',
+		'<!--: title = "{}" -->'.format(title),
+		'<!--: date = "{}" -->'.format(date),
+	]
+	for i in range(paragraphs):
+		lines += [
+			'<h2>Section {}</h2>'.format(i),
+			'<p>{} <!--: title --> <a href="https://example.com/{}">link</a></p>'.format(sentence(rng), i),
+			'<ul><li>{}</li><li>{}</li></ul>'.format(sentence(rng, 4), sentence(rng, 4)),
+		]
+	return '\n'.join(lines) + '\n'
+
+PAGE_MAKERS = {
+	'md': page_md,
+	'rst': page_rst,
+	'zim': page_zim,
+	'gmi': page_gmi,
+	'html': page_html,
+}
+
+def parse_mix(text):
+	'''
+	Reads a page mix written as ``md=3,rst=1,...``.
+
+	Args:
+	    text (string): The mix.
+
+	Returns:
+	    A dictionary of extensions to weights.
+	'''
+	mix = {}
+	for item in text.split(','):
+		if not item.strip():
+			continue
+		ext, _, weight = item.partition('=')
+		ext = ext.strip()
+		if ext not in PAGE_MAKERS:
+			raise ValueError('unknown page type "{}", should be one of {}'.format(ext, ', '.join(EXTENSIONS)))
+		mix[ext] = float(weight) if weight else 1.0
+	return mix
+
+def generate_site(root, pages=100, mix=None, paragraphs=8, sections=4, assets=10, asset_size=64 << 10, seed=0):
+	'''
+	Writes a synthetic site.
+
+	Args:
+	    root (string): Directory to write the site to. The source
+	        directory is ``src`` inside of it.
+	    pages (int, Optional): Number of pages.
+	    mix (dict, Optional): Page extension -> weight, e.g.
+	        ``{'md': 3, 'rst': 1}``. Defaults to every kind of page, in
+	        the same amounts.
+	    paragraphs (int, Optional): Number of sections in every page.
+	    sections (int, Optional): Number of directories the pages are
+	        spread into.
+	    assets (int, Optional): Number of static files.
+	    asset_size (int, Optional): Size of every static file, in bytes.
+	    seed (int, Optional): Seed of the random text.
+
+	Returns:
+	    A dictionary describing the site: "root", "source_dir",
+	    "pages" (extension -> list of absolute paths) and "assets"
+	    (list of absolute paths).
+	'''
+	mix = dict(mix or DEFAULT_MIX)
+	rng = random.Random(seed)
+	root = os.path.abspath(root)
+	source_dir = os.path.join(root, 'src')
+
+	for name, text in (('template.html', TEMPLATE), ('header.html', HEADER),
+	                   ('nav.html', NAV), ('_functions.py', FUNCTIONS)):
+		with open(os.path.join(root, name), 'w') as f:
+			f.write(text)
+
+	# spread the pages according to the mix, the same way every time
+	kinds = sorted(mix)
+	total = sum(mix[k] for k in kinds)
+	counts = {k: int(pages * mix[k] / total) for k in kinds}
+	for k in kinds[:pages - sum(counts.values())]:
+		counts[k] += 1
+
+	site = {'root': root, 'source_dir': source_dir, 'pages': {k: [] for k in kinds}, 'assets': []}
+
+	n = 0
+	for ext in kinds:
+		for _ in range(counts[ext]):
+			folder = os.path.join(source_dir, 'section{}'.format(n % max(sections, 1)))
+			os.makedirs(folder, exist_ok=True)
+			path = os.path.join(folder, 'page{}.{}'.format(n, ext))
+			title = '{} {}'.format(sentence(rng, 2).capitalize(), n)
+			date = '2020-{:02d}-{:02d}'.format(n % 12 + 1, n % 28 + 1)
+			with open(path, 'w') as f:
+				f.write(PAGE_MAKERS[ext](rng, title, date, paragraphs))
+			site['pages'][ext].append(path)
+			n += 1
+
+	asset_dir = os.path.join(source_dir, 'assets')
+	os.makedirs(asset_dir, exist_ok=True)
+	for i in range(assets):
+		path = os.path.join(asset_dir, 'asset{}.bin'.format(i))
+		with open(path, 'wb') as f:
+			f.write(bytes(rng.getrandbits(8) for _ in range(min(asset_size, 4096))) * (asset_size // 4096 or 1))
+		site['assets'].append(path)
+
+	return site
@@ -0,0 +1,237 @@
+import os
+import shutil
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from .utils import declare
+from .hooks import phase
+
+'''
+Copies files that aren't converted (images, fonts...) to the build directory
+'''
+
+logger = logging.getLogger('mdiocre.assets')
+
+try:
+	import fcntl
+except ImportError:
+	fcntl = None
+
+# ioctl(2) that makes a file share the contents of another, on file systems
+# that support it (Btrfs, XFS...). _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+def is_synced(source_file, built_file):
+	'''
+	Tells whether a built file is already a copy of its source, going by
+	the size and modification time (see :func:`sync_file`).
+
+	Args:
+	    source_file (string): Path to the source file.
+	    built_file (string): Path to the built file.
+
+	Returns:
+	    True if the built file doesn't need to be copied again.
+	'''
+	try:
+		source = os.stat(source_file)
+		built = os.stat(built_file)
+	except OSError:
+		return False
+	if (source.st_dev, source.st_ino) == (built.st_dev, built.st_ino):
+		return True
+	return source.st_size == built.st_size and source.st_mtime_ns == built.st_mtime_ns
+
+def clone_file(source_fd, built_fd):
+	'''
+	Makes a file share the contents of another without copying them,
+	if the file system can do it.
+
+	Returns:
+	    True if the file was cloned.
+	'''
+	if fcntl is None:
+		return False
+	try:
+		fcntl.ioctl(built_fd, FICLONE, source_fd)
+	except OSError:
+		return False
+	return True
+
+def copy_range(source_fd, built_fd, size):
+	'''
+	Copies a file inside the kernel with ``copy_file_range``, if it is
+	available.
+
+	Returns:
+	    True if the file was copied. If False, the built file is left
+	    empty, so that it can be copied some other way.
+	'''
+	if not hasattr(os, 'copy_file_range'):
+		return False
+	copied = 0
+	try:
+		while copied < size:
+			n = os.copy_file_range(source_fd, built_fd, size - copied)
+			if n == 0:
+				# some file systems (overlayfs, FUSE...) give up early
+				# instead of failing
+				break
+			copied += n
+	except OSError:
+		pass
+	if copied == size:
+		return True
+	if copied:
+		# can't tell what state the file is in, start over
+		os.lseek(source_fd, 0, os.SEEK_SET)
+		os.lseek(built_fd, 0, os.SEEK_SET)
+		os.ftruncate(built_fd, 0)
+	return False
+
+def copy_file(source_file, built_file, hardlink=False):
+	'''
+	Copies a file as cheaply as possible: with a hard link if allowed,
+	then by cloning it, then with ``copy_file_range``, then by reading
+	and writing it.
+
+	A built file that has other links to it (e.g. one hard linked to
+	its source by an earlier build) is never written to: the copy is
+	written next to it, then moved over it.
+
+	Args:
+	    source_file (string): Path to the source file.
+	    built_file (string): Path to the built file.
+	    hardlink (bool, Optional): If True, the built file can be a hard
+	        link to the source file. Changing one then changes the other.
+
+	Returns:
+	    How the file was copied: "hardlink", "reflink",
+	    "copy_file_range" or "copy".
+	'''
+	built_dir, built_filename = os.path.split(os.path.abspath(built_file))
+	tmp_file = os.path.join(built_dir, '.{}.mdiocre-tmp'.format(built_filename))
+
+	if hardlink:
+		try:
+			if os.path.lexists(tmp_file):
+				os.remove(tmp_file)
+			os.link(source_file, tmp_file)
+		except OSError:
+			pass
+		else:
+			os.replace(tmp_file, built_file)
+			return 'hardlink'
+
+	try:
+		linked = os.stat(built_file).st_nlink > 1
+	except FileNotFoundError:
+		linked = False
+	write_file = tmp_file if linked else built_file
+
+	try:
+		with open(source_file, 'rb') as source, open(write_file, 'wb') as built:
+			st = os.fstat(source.fileno())
+			if clone_file(source.fileno(), built.fileno()):
+				method = 'reflink'
+			elif copy_range(source.fileno(), built.fileno(), st.st_size):
+				method = 'copy_file_range'
+			else:
+				shutil.copyfileobj(source, built, 1 << 20)
+				method = 'copy'
+		# the modification time is what tells that it's a copy next time
+		os.utime(write_file, ns=(st.st_atime_ns, st.st_mtime_ns))
+		if linked:
+			os.replace(tmp_file, built_file)
+	except BaseException:
+		if linked and os.path.lexists(tmp_file):
+			os.remove(tmp_file)
+		raise
+	return method
+
+def sync_file(source_file, built_file, hardlink=False):
+	'''
+	Copies a file with :func:`copy_file`, unless the built file already
+	is a copy of it (see :func:`is_synced`).
+
+	Args:
+	    source_file (string): Path to the source file.
+	    built_file (string): Path to the built file.
+	    hardlink (bool, Optional): See :func:`copy_file`.
+
+	Returns:
+	    How the file was copied (see :func:`copy_file`), or None if it
+	    didn't need to be.
+	'''
+	if is_synced(source_file, built_file):
+		return None
+	return copy_file(source_file, built_file, hardlink=hardlink)
+
+class AssetSync():
+	'''
+	Copies files with :func:`sync_file` on a pool of threads, so that
+	whatever comes next doesn't wait for the disk.
+
+	Args:
+	    threads (int, Optional): Number of files copied at once.
+	    hardlink (bool, Optional): See :func:`copy_file`.
+	'''
+	def __init__(self, threads=4, hardlink=False):
+		# type checking
+		declare(threads, int)
+		declare(hardlink, bool)
+
+		self.threads = max(threads, 1)
+		self.hardlink = hardlink
+		self.executor = None
+		self.pending = []
+
+	def submit(self, source_file, built_file):
+		'''
+		Starts copying a file.
+
+		Args:
+		    source_file (string): Path to the source file.
+		    built_file (string): Path to the built file.
+
+		Returns:
+		    None.
+		'''
+		if self.executor is None:
+			self.executor = ThreadPoolExecutor(max_workers=self.threads)
+		future = self.executor.submit(self.sync, source_file, built_file)
+		self.pending.append((source_file, built_file, future))
+
+	def sync(self, source_file, built_file):
+		'''
+		Copies a file, from one of the threads.
+		'''
+		with phase('copy', os.path.abspath(source_file)):
+			return sync_file(source_file, built_file, hardlink=self.hardlink)
+
+	def wait(self):
+		'''
+		Waits for every file to be copied.
+
+		Returns:
+		    A list of (source file, built file, result) tuples, in
+		    the order the files were submitted, where result is what
+		    :func:`sync_file` returned, or the exception it raised.
+		'''
+		pending, self.pending = self.pending, []
+		results = []
+		for source_file, built_file, future in pending:
+			try:
+				result = future.result()
+			except Exception as e:
+				result = e
+			results.append((source_file, built_file, result))
+		return results
+
+	def close(self):
+		'''
+		Waits for every file to be copied, then stops the threads.
+		'''
+		self.wait()
+		if self.executor is not None:
+			self.executor.shutdown()
+			self.executor = None
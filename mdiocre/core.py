@@ -1,65 +1,227 @@
-from .utils import declare, remove_inner_outer_quotes
+from .utils import declare, FileCache
+from .hooks import phase
 import logging
-from .parsers import BaseParser, sub_func
-import re
+from .parsers import BaseParser
+from . import directives
+from .directives import Template, compile_source, unescape
 import os
 import datetime
+import types
+import builtins
+import ast
+from functools import lru_cache
 from importlib import import_module
-from importlib.util import find_spec
 '''
 Core MDiocre conversion class
 '''
 
 logger = logging.getLogger('mdiocre.core')
 
-RE_HTML_COMMENTS = re.compile(r'<!--:(.+?)-->')
-RE_ASSIGNMENT = re.compile(r'.+=.+')
-RE_KEYWORD = re.compile(r'.+:.+')
-RE_ESCAPE = re.compile(r'(\\)(.{1})')
+# these used to live here
+RE_HTML_COMMENTS = directives.RE_HTML_COMMENTS
+RE_ASSIGNMENT = directives.RE_ASSIGNMENT
+RE_KEYWORD = directives.RE_KEYWORD
+RE_ESCAPE = directives.RE_ESCAPE
 
-# This stupid complicated RE is necessary to enable reading commas in variables
-RE_CONCAT = re.compile(
-# Case 1
-	r'('+	# Start capture group
-		r'\"[^\"]*\"'+ # double-quoted strings
-		r'|'+          # or
-		r'\'[^\']*\''+ # single quoted strings
-		r'|'+          # or
-		r'\w+'+        # word
-		r'|'+          # or
-		r'\(.+\)'+     # function
-	r')'+	# End capture group
-	r',\s*'+       # Concat operator
-	r'|'+          # Or
-# Case 2
-	r'('+	# Start capture group
-		r'\"[^\"]*\"'+ # double-quoted strings
-		r'|'+          # or
-		r'\'[^\']*\''+ # single quoted strings
-		r'|'           # or
-		r'\w+'+        # word
-		r'|'+          # or
-		r'\(.+\)'+     # function
-	r')'+	# End capture group
-	r'$'	# EOL
-)
+# Files read with the Include keyword, shared by every page. Its hits
+# and misses attributes can be inspected to see how well it's doing.
+INCLUDE_CACHE = FileCache(Template.from_file, maxsize=256)
+
+def load_script(path):
+	'''
+	Loads a script for the Using keyword. The script is compiled and run
+	once in a module object of its own, instead of in MDiocre's globals.
+	
+	Args:
+	    path (string): Path to the script.
+	
+	Returns:
+	    A module object containing whatever the script defined.
+	'''
+	with open(path, 'r') as f_:
+		code = compile(f_.read(), path, 'exec')
+	
+	script = types.ModuleType(os.path.splitext(os.path.basename(path))[0])
+	script.__file__ = path
+	exec(code, script.__dict__)
+	return script
+
+# Scripts loaded with the Using keyword, shared by every page.
+SCRIPT_CACHE = FileCache(load_script, maxsize=64)
+
+@lru_cache(maxsize=1024)
+def compile_argument(token):
+	'''
+	Works out what a function call argument that isn't a variable name
+	stands for. Literals (strings, numbers...) are evaluated right away,
+	anything else is compiled so that it can be evaluated later.
+	
+	Args:
+	    token (string): The argument, as written in the assignment.
+	
+	Returns:
+	    A tuple of (True, value) for literals, or (False, code object)
+	    otherwise. Raises `SyntaxError` if it's not a valid expression.
+	'''
+	try:
+		return True, ast.literal_eval(token)
+	except (ValueError, SyntaxError):
+		pass
+	return False, compile(token, '<argument>', 'eval')
+
+def find_parser(name):
+	'''
+	Finds a built-in parser class from its name.
+	
+	Parser names and file names must match, e.g. a parser with the `html`
+	name must be in `html.py` and have the class name of `HtmlParser`.
+	
+	Args:
+	    name (string): Parser name, e.g. `markdown`, `html`, `rst`, `zim`
+	        or `gem`.
+	
+	Returns:
+	    The parser class, or None if the class found is not derived from
+	    :class:`BaseParser`. Raises `ModuleNotFoundError` if there is no
+	    such parser.
+	'''
+	# specifications for names
+	# e.g. "markdown" -> MarkdownParser in parsers/markdown.py
+	#   or "rst"      -> RstParser      in parsers/rst.py
+	module_name = '.parsers.{}'.format(name.lower())
+	class_name  = '{}Parser'.format(name.capitalize())
+	
+	try:
+		# internal-only
+		module = import_module(module_name, 'mdiocre')
+	except ModuleNotFoundError as e:
+		logger.error("{}: error occured: {}".format(name, e))
+		raise e
+	
+	module_class = getattr(module, class_name)
+	if not (isinstance(module_class, type) and issubclass(module_class, BaseParser)):
+		logger.error("{}: class {} must be a subclass of {}, not using.".format(name, class_name, BaseParser.__name__))
+		return None
+	
+	return module_class
+
+def parser_name(parser_class):
+	'''
+	Gets the name of a parser class, e.g. `markdown` for `MarkdownParser`.
+	
+	Args:
+	    parser_class (type): A class derived from :class:`BaseParser`.
+	
+	Returns:
+	    The parser name, in lowercase.
+	'''
+	name = parser_class.__name__
+	if name.endswith('Parser'):
+		name = name[:-len('Parser')]
+	return name.lower()
+
+class ParserRegistry():
+	'''
+	Hands out parser objects, making only one object for each parser
+	class. Parsers don't keep anything between conversions, so the same
+	object can be used for any number of files.
+	
+	Args:
+	    options (dict, Optional): Keyword arguments to make each parser
+	        with, keyed by parser name, e.g.
+	        ``{"markdown": {"extensions": ["toc", "tables"]}}``.
+	
+	Attributes:
+	    instances (dict): Parser objects, keyed by their class.
+	    options (dict): See `options` above.
+	'''
+	def __init__(self, options=None):
+		self.instances = {}
+		self.options = {}
+		for name, parser_options in (options or {}).items():
+			self.configure(name, **parser_options)
+	
+	def configure(self, parser, **options):
+		'''
+		Sets the keyword arguments a parser is made with. The parser
+		object is made again the next time it is asked for.
+		
+		Args:
+		    parser (string | :class:`BaseParser`): Parser name or type.
+		    **options: Arguments for the parser class.
+		
+		Returns:
+		    None.
+		'''
+		if isinstance(parser, type):
+			self.instances.pop(parser, None)
+			parser = parser_name(parser)
+		else:
+			declare(parser, str)
+			parser = parser.lower()
+			for parser_class in list(self.instances):
+				if parser_name(parser_class) == parser:
+					del self.instances[parser_class]
+		
+		self.options[parser] = options
+	
+	def get(self, parser):
+		'''
+		Gets the parser object for a parser class, making it if needed.
+		
+		Args:
+		    parser (string | :class:`BaseParser`): Parser name or type,
+		        see :func:`find_parser`.
+		
+		Returns:
+		    A :class:`BaseParser` object, or None if `parser` is a name
+		    that doesn't lead to a proper parser class.
+		'''
+		if isinstance(parser, str):
+			parser = find_parser(parser)
+			if parser is None:
+				return None
+		
+		instance = self.instances.get(parser)
+		if instance is None:
+			if not (isinstance(parser, type) and issubclass(parser, BaseParser)):
+				raise TypeError("{} must be a subclass of {}".format(parser, BaseParser.__name__))
+			instance = parser(**self.options.get(parser_name(parser), {}))
+			self.instances[parser] = instance
+		return instance
+	
+	def clear(self):
+		'''
+		Forgets every parser object made so far.
+		
+		Returns:
+		    None.
+		'''
+		self.instances.clear()
+
+# Parser objects shared by everything in this process.
+PARSERS = ParserRegistry()
 
 class MDiocre():
 	'''
 	Main class to process source files and render HTML files.
 	
 	Args:
-	    parser (Optional): a BaseParser-derived object. If both
+	    parser (Optional): a BaseParser-derived class. If both
 	        `parser_name` and `parser` are defined, `parser` takes the
 	        priority.
 	    parser_name (str, Optional): The parser name. See :meth:`switch_parser`
 	        for which ones are currently implemented.
 	'''
 	def __init__(self, parser=None, parser_name=None):
+		self._parser = None
+		self._parser_name = None
+		
 		if parser is None:
 			if parser_name is None:
-				# use markdown by default
-				self.switch_parser("markdown")
+				# use markdown by default, but don't load it until
+				# it's actually used
+				self._parser_name = "markdown"
 			else:
 				# type checking
 				declare(parser_name, str)
@@ -68,7 +230,23 @@ class MDiocre():
 		else:
 			if not issubclass(parser, BaseParser):
 				raise ImportError("class {} must be a subclass of {}".format(parser.__name__, BaseParser.__name__)) from None
-			self.parser = parser
+			self.parser = PARSERS.get(parser)
+	
+	@property
+	def parser(self):
+		'''
+		The parser object used when :meth:`process` isn't given one.
+		The default parser is only made the first time it is needed.
+		'''
+		if self._parser_name is not None:
+			self._parser = PARSERS.get(self._parser_name)
+			self._parser_name = None
+		return self._parser
+	
+	@parser.setter
+	def parser(self, parser):
+		self._parser = parser
+		self._parser_name = None
 	
 	def switch_parser(self, name):
 		'''
@@ -80,6 +258,9 @@ class MDiocre():
 		match, e.g. a parser with the `html` identifier must
 		be in `html.py` and have the class name of `HtmlParser`.
 		
+		Parser objects are shared through :data:`PARSERS`, so switching
+		back and forth between parsers doesn't make new ones.
+		
 		Args:
 		    name (string | :class:`BaseParser` ): Parser name or type.
 		        If passed as a string, it will only take the following
@@ -99,34 +280,12 @@ class MDiocre():
 		
 		if isinstance(name, type):
 			if issubclass(name, BaseParser):
-				self.parser = name()
+				self.parser = PARSERS.get(name)
 				return
 		
-		# specifications for names
-		# e.g. "markdown" -> MarkdownParser in parsers/markdown.py
-		#   or "rst"      -> RstParser      in parsers/rst.py
-		module_name = '.parsers.{}'.format(name.lower())
-		class_name  = '{}Parser'.format(name.capitalize())
-		# Switch parser
-		
-		if find_spec(module_name, 'mdiocre'):
-			module = import_module(module_name, 'mdiocre')
-		else:
-			logger.error("{}: error occured: {}".format(name, e))
-			raise Exception("Can't find any suitable modules")
-		
-		try:
-			# internal-only
-			module = import_module(module_name, 'mdiocre')
-		except ModuleNotFoundError as e:
-			logger.error("{}: error occured: {}".format(name, e))
-			raise e
-		else:
-			module_class = getattr(module,class_name)
-			if not issubclass(module_class, BaseParser):
-				logger.error("{}: class {} must be a subclass of {}, not using.".format(name, class_name, BaseParser.__name__))
-			else:
-				self.parser = module_class()
+		parser = PARSERS.get(name)
+		if parser is not None:
+			self.parser = parser
 	
 	def render(self, template, variables):
 		'''
@@ -138,7 +297,8 @@ class MDiocre():
 		the documents.
 		
 		Args:
-		    template (string): A string containing formatted comments.
+		    template (string | :class:`Template`): A string containing
+		        formatted comments, or a template made out of one.
 		    variables (VariableManager): Variable object to use with
 		        the template.
 		
@@ -146,19 +306,17 @@ class MDiocre():
 		    The processed string.
 		'''
 		# type checking
-		declare(template, str)
+		if not isinstance(template, Template):
+			declare(template, str)
+			template = compile_source(template)
 		declare(variables, VariableManager)
 		
-		def render_sub_func(match):
-			return sub_func(match, variables)
-		
 		# template variables are processed separately since
 		# the content is already proecessed
-		converted = re.sub(RE_HTML_COMMENTS, render_sub_func, template)
+		with phase('render'):
+			return template.render(variables)
 		
-		return converted
-		
-	def process(self, string, ignore_content=False):
+	def process(self, string, ignore_content=False, parser=None):
 		'''
 		Process a string into a variable dictionary to use
 		e.g. with :meth:`render`.
@@ -177,6 +335,9 @@ class MDiocre():
 		    string (string): A string containing MDiocre commands.
 		    ignore_content (bool, Optional): If True, it will not convert
 		        the string to the `content` variable.
+		    parser (:class:`BaseParser`, Optional): The parser object to
+		        use instead of the current one, e.g. one given by
+		        :meth:`ParserRegistry.get`.
 		
 		Returns:
 		    A VariableManager object containing the processed variables,
@@ -186,10 +347,15 @@ class MDiocre():
 		# type checking
 		declare(string, str)
 		declare(ignore_content, bool)
+		if parser is None:
+			parser = self.parser
+		else:
+			declare(parser, BaseParser)
 		
 		v = VariableManager()
 		
-		return self.parser.to_variables(string, v, ignore_content=ignore_content)
+		with phase('process'):
+			return parser.to_variables(string, v, ignore_content=ignore_content)
 	
 class VariableManager():
 	'''
@@ -210,7 +376,14 @@ class VariableManager():
 	
 	def __init__(self):
 		self.variables = {}
-		self.reserved_variable_names = ['content', 'mdiocre-gen-timestamp']
+		self.reserved_variable_names = list(directives.RESERVED_VARIABLE_NAMES)
+		
+		# absolute paths of every file read through Include or Using,
+		# in the order they were first read
+		self.dependencies = []
+		
+		# modules loaded through Using, in the order they were loaded
+		self.scripts = []
 		
 		# system variables
 		self.variables['mdiocre-gen-timestamp'] = datetime.datetime.now().isoformat()
@@ -236,6 +409,20 @@ class VariableManager():
 		except KeyError:
 			return ''
 	
+	def add_dependency(self, path):
+		'''
+		Records that the variables depend on a file, even if the file
+		doesn't exist (yet).
+		
+		Args:
+		    path (string): Absolute path of the file.
+		
+		Returns:
+		    None.
+		'''
+		if path not in self.dependencies:
+			self.dependencies.append(path)
+	
 	def parse_keyword(self, query):
 		'''
 		Currently called from :meth:`function`, this implements a few commands,
@@ -245,6 +432,14 @@ class VariableManager():
 		Operands are separated by the colon `:`, on the left hand side is the
 		keyword, on the right hand is the argument, assumed to be a string.
 		
+		Included files are kept as :class:`Template` objects in
+		``mdiocre.core.INCLUDE_CACHE``, so that a file included by every
+		page is only read once, unless it is modified. Likewise, scripts
+		are only compiled and run once (see :func:`load_script`) and
+		kept in ``mdiocre.core.SCRIPT_CACHE``. Every page that uses a
+		script shares the same module object, but the script's functions
+		are only visible to the pages that use it.
+		
 		The keyword is case-insensitive.
 		
 		They can be one of the following:
@@ -266,38 +461,52 @@ class VariableManager():
 		'''
 		# type checking
 		declare(query, str)
-		if not (re.match(RE_KEYWORD, query)):
-			raise SyntaxError(f'<{query}> is neither a keyword nor an assign statement')
-		
-		keyword, value = query.split(':', 1)
-		keyword = keyword.strip().lower()
-		value = value.strip()
-		
-		# value quote
-		if value[0] == '"' or value[0] == "'":
-			value = remove_inner_outer_quotes(value)
-		
-		if keyword == "include":
-			# include a raw file
-			file_ = os.path.abspath(value)
-			if os.path.isfile(file_):
-				with open(file_, "r") as f_:
-					# using MDiocre to render the include, calling this
-					# in itself. epic
-					m = MDiocre(parser_name='html')
-					return m.render(f_.read(), self)
-			return ''
-		elif keyword == "using":
-			file_ = os.path.abspath(value)
-			# TODO: -----YIKES------------------------
-			if os.path.isfile(file_):
-				with open(file_, "r") as f_:
-					exec(f_.read(), globals())
-			# ----------------------------------------
+		
+		return directives.parse_keyword(query).apply(self)
+	
+	def include(self, path):
+		'''
+		Renders a file with this object, as done by the ``include``
+		keyword.
+		
+		Args:
+		    path (string): Path to the file, relative to the working
+		        directory.
+		
+		Returns:
+		    The rendered file, or an empty string if it doesn't exist.
+		'''
+		file_ = os.path.abspath(path)
+		self.add_dependency(file_)
+		try:
+			include = INCLUDE_CACHE.get(file_)
+		except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
 			return ''
-		else:
-			raise SyntaxError(f'Supported keywords: include; using.')
+		# render the include with this object, which may include
+		# some more files itself. epic
+		return include.render(self)
+	
+	def use(self, path):
+		'''
+		Loads a script, as done by the ``using`` keyword.
 		
+		Args:
+		    path (string): Path to the script, relative to the working
+		        directory.
+		
+		Returns:
+		    An empty string.
+		'''
+		file_ = os.path.abspath(path)
+		self.add_dependency(file_)
+		try:
+			script = SCRIPT_CACHE.get(file_)
+		except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+			return ''
+		if script not in self.scripts:
+			self.scripts.append(script)
+		return ''
+	
 	def assign(self, query):
 		'''
 		Assigns a variable to a value.
@@ -317,8 +526,8 @@ class VariableManager():
 		    * **Function calls** : if a function is defined using the ``using``
 		      keyword, it may be used for dynamic data conversion and processing. Surrounded by parentheses,
 		      the word directly after it is the function name, followed by its arguments, surrounded by spaces.
-		      Like regular Python, strings need to be in quotes. Arguments may be names of variables that are
-		      already defined up to that point, they will be automatically substituted.
+		      Like regular Python, strings need to be in quotes, and may have spaces in them. Arguments may be
+		      names of variables that are already defined up to that point, they will be automatically substituted.
 		          Example query: ``RSSDate = (toRFC822 PubDate)``
 		
 		..warning::
@@ -335,62 +544,135 @@ class VariableManager():
 		'''
 		# type checking
 		declare(query, str)
-		if not (re.match(RE_ASSIGNMENT, query)):
-			# if string matches " Something : Something else " do that instead
-			return self.parse_keyword(query)
-		
-		# query expected to be "variable = value"
-		ident, value = query.split('=', 1)
-		ident = ident.strip()
-		value = value.strip()
-		
-		# check valid identifier
-		if ident in self.reserved_variable_names:
-			raise SyntaxError(f'assignment <{query}>: variable name "{ident}" cannot be used!')
-		
-		concat_tokens = re.findall(RE_CONCAT, value)
-		concat_tokens = list(map(lambda tok: tok[0] or tok[1], concat_tokens))
-		concat_tokens = [x.strip() for x in concat_tokens]
-		
-		# start with a blank value
-		value = ''
-		for var in concat_tokens:
+		
+		return directives.parse_assignment(query).apply(self)
+	
+	def run(self, statement):
+		'''
+		Runs a MDiocre command: if it's an assignment or a keyword, it
+		is run through :meth:`assign`, otherwise the variable is looked
+		up through :meth:`get`. Commands are compiled once, see
+		:func:`mdiocre.directives.compile_command`.
+		
+		Args:
+		    statement (string): The command, without the surrounding markup.
+		
+		Returns:
+		    The text to replace the command with.
+		'''
+		return directives.compile_command(statement).run(self)
+	
+	def evaluate(self, operands):
+		'''
+		Works out the value of an assignment.
+		
+		Args:
+		    operands (tuple): The value's operands, see
+		        :func:`mdiocre.directives.tokenize`.
+		
+		Returns:
+		    The value as a string.
+		'''
+		# every string appended to the value has its escaped characters
+		# rendered, along with everything appended before it. only the
+		# part starting from the first backslash that's left can change,
+		# so that is the only part that goes through unescape again
+		done = []
+		pending = ''
+		for operand in operands:
 			# append each token according to the order
 			# they appear
-			if var[0] == '"' or var[0] == "'":
-				# token is a string
-				value += remove_inner_outer_quotes(var)
-				
-				# render all escaped characters
-				def escape(match):
-					return match.groups()[1]
-				
-				value = re.sub(RE_ESCAPE, escape, value)
-			elif var[0] == "(":
-				# token is a function call
-				if var[-1] != ")":
-					raise SyntaxError(f'Unmatched ( in assignment of {ident}')
-				fn_tokens = [x.strip() for x in var[1:-1].split(" ")]
-				
-				for i in range(1, len(fn_tokens)):
-					# transform arguments into variable contents
-					if fn_tokens[i] in self.variables:
-						escaped_var = self.variables[fn_tokens[i]].replace('"','\\"').replace("'","\\'")
-						fn_tokens[i] = f"'{escaped_var}'"
-				
-				# TODO: -----YIKES------------------------
-				loc = {}
-				exec(f"__retval = {fn_tokens[0]}({','.join(fn_tokens[1:])})", globals(), loc)
-				value += (loc['__retval'])
-				# ----------------------------------------
+			kind = operand[0]
+			if kind == 'string':
+				pending = unescape(pending + operand[1])
+			elif kind == 'call':
+				pending += self.call(operand[1], operand[2])
+			else:
+				pending += self.variables.get(operand[1], '')
+			
+			backslash = pending.find('\\')
+			if backslash == -1:
+				done.append(pending)
+				pending = ''
+			elif backslash > 0:
+				done.append(pending[:backslash])
+				pending = pending[backslash:]
+		
+		done.append(pending)
+		return ''.join(done)
+	
+	def call(self, name, args):
+		'''
+		Calls a function defined by one of the scripts loaded with the
+		``using`` keyword (or a Python builtin), as done by function
+		calls in :meth:`assign`.
+		
+		Args:
+		    name (string): The function name. Functions from scripts
+		        loaded later take priority.
+		    args (list): The arguments, as written in the assignment.
+		        Arguments that are variable names are replaced with the
+		        variable's contents, the rest are evaluated as Python
+		        expressions (e.g. string literals).
+		
+		Returns:
+		    Whatever the function returns.
+		'''
+		function = self.resolve(name)
+		
+		values = []
+		for arg in args:
+			if arg in self.variables:
+				values.append(self.variables[arg])
 			else:
 				try:
-					value += self.variables[var]
-				except KeyError:
-					value += ''
+					is_literal, arg_value = compile_argument(arg)
+				except SyntaxError as e:
+					logger.warning("function call to {}: argument {} is not valid: {}".format(name, arg, e))
+					raise
+				if not is_literal:
+					arg_value = eval(arg_value, self.script_globals())
+				values.append(arg_value)
+		
+		return function(*values)
+	
+	def resolve(self, name):
+		'''
+		Finds an object by name in the scripts loaded with the ``using``
+		keyword, falling back to Python builtins.
 		
-		self.variables[ident] = value
+		Args:
+		    name (string): The name, or a Python expression for
+		        anything more complicated (e.g. ``module.function``).
 		
-		return ''
-
-
+		Returns:
+		    The object. Raises `NameError` if it doesn't exist.
+		'''
+		if name.isidentifier():
+			for script in reversed(self.scripts):
+				try:
+					return script.__dict__[name]
+				except KeyError:
+					pass
+			try:
+				return getattr(builtins, name)
+			except AttributeError:
+				raise NameError(f"name '{name}' is not defined") from None
+		
+		is_literal, value = compile_argument(name)
+		if is_literal:
+			return value
+		return eval(value, self.script_globals())
+	
+	def script_globals(self):
+		'''
+		Merges the namespaces of every script loaded with the ``using``
+		keyword.
+		
+		Returns:
+		    A dictionary usable as globals for `eval`.
+		'''
+		fn_globals = {}
+		for script in self.scripts:
+			fn_globals.update(vars(script))
+		return fn_globals
@@ -0,0 +1,541 @@
+from .utils import declare, remove_inner_outer_quotes
+from collections import OrderedDict
+from functools import lru_cache
+import hashlib
+import logging
+import re
+'''
+Compiles MDiocre commands into small objects that can be run any number
+of times without parsing them again.
+'''
+
+logger = logging.getLogger('mdiocre.directives')
+
+RE_HTML_COMMENTS = re.compile(r'<!--:(.+?)-->')
+RE_ASSIGNMENT = re.compile(r'.+=.+')
+RE_KEYWORD = re.compile(r'.+:.+')
+RE_ESCAPE = re.compile(r'(\\)(.{1})')
+# an argument of a function call: anything up to a space, where quoted
+# strings can have spaces in them
+RE_ARGUMENT = re.compile(r'''(?:'(?:\\.|[^'\\])*'|"(?:\\.|[^"\\])*"|[^\s'"])+''')
+
+RESERVED_VARIABLE_NAMES = ('content', 'mdiocre-gen-timestamp')
+
+# sources longer than this are not kept by compile_source
+SOURCE_CACHE_LIMIT = 1 << 20
+SOURCE_CACHE_SIZE = 256
+
+class Command():
+	'''
+	Base class of compiled commands.
+
+	Args:
+	    statement (string): The command as it was written.
+	'''
+	__slots__ = ('statement',)
+
+	def __init__(self, statement):
+		self.statement = statement
+
+	def apply(self, v):
+		'''
+		Runs the command, the same way :meth:`VariableManager.assign`
+		would.
+
+		Args:
+		    v (VariableManager): target variable manager object
+
+		Returns:
+		    The text to replace the command with.
+		'''
+		raise NotImplementedError
+
+	def run(self, v):
+		'''
+		Runs the command, the same way :func:`mdiocre.parsers.sub_func`
+		would: if it fails with a `SyntaxError`, the whole statement is
+		looked up as a variable name instead.
+
+		Args:
+		    v (VariableManager): target variable manager object
+
+		Returns:
+		    The text to replace the command with.
+		'''
+		try:
+			return self.apply(v)
+		except SyntaxError:
+			return v.get(self.statement)
+
+class Get(Command):
+	'''
+	Gets a variable, e.g. ``<!--: title -->``.
+	'''
+	__slots__ = ()
+
+	def apply(self, v):
+		return v.get(self.statement)
+
+	run = apply
+
+class Assign(Command):
+	'''
+	Assigns a variable, e.g. ``<!--: title = "Hello", name -->``.
+
+	Args:
+	    statement (string): The command as it was written.
+	    ident (string): The name of the variable.
+	    operands (tuple): Tokens making up the value, see :func:`tokenize`.
+	'''
+	__slots__ = ('ident', 'operands')
+
+	def __init__(self, statement, ident, operands):
+		Command.__init__(self, statement)
+		self.ident = ident
+		self.operands = operands
+
+	def apply(self, v):
+		v.variables[self.ident] = v.evaluate(self.operands)
+		return ''
+
+class Include(Command):
+	'''
+	Includes a file, e.g. ``<!--: Include: ../variables.html -->``.
+
+	Args:
+	    statement (string): The command as it was written.
+	    path (string): The file to include.
+	'''
+	__slots__ = ('path',)
+
+	def __init__(self, statement, path):
+		Command.__init__(self, statement)
+		self.path = path
+
+	def apply(self, v):
+		return v.include(self.path)
+
+class Using(Command):
+	'''
+	Loads a script, e.g. ``<!--: Using: ../_functions.py -->``.
+
+	Args:
+	    statement (string): The command as it was written.
+	    path (string): The script to load.
+	'''
+	__slots__ = ('path',)
+
+	def __init__(self, statement, path):
+		Command.__init__(self, statement)
+		self.path = path
+
+	def apply(self, v):
+		return v.use(self.path)
+
+def split_concat(value):
+	'''
+	Splits the value of an assignment at the concatenation operator (the
+	comma). This is a single left-to-right pass that gives the same
+	tokens that were given by the regular expression MDiocre used to
+	have, i.e. the values matched by::
+
+	    ("[^"]*"|'[^']*'|\\w+|\\(.+\\)),\\s*  |  ("[^"]*"|'[^']*'|\\w+|\\(.+\\))$
+
+	Anything that doesn't make up a token is skipped, just like
+	`re.findall` would. It runs in linear time, where the regular
+	expression could backtrack a lot on unbalanced parentheses.
+
+	Args:
+	    value (string): Everything to the right of the `=`.
+
+	Returns:
+	    A list of tokens, with the whitespace around them removed.
+	'''
+	n = len(value)
+	tokens = []
+
+	# like $, the end of the value is also right before a final newline
+	tail = n - 1 if value.endswith('\n') else n
+
+	# a function call ends on the last ")," of its line, or on a ")"
+	# at the very end of the value; lines are looked at only once
+	line_end = -1
+	line_last_call_end = -1
+
+	def skip_spaces(i):
+		while i < n and value[i].isspace():
+			i += 1
+		return i
+
+	i = 0
+	while i < n:
+		char = value[i]
+
+		if char == '"' or char == "'":
+			end = value.find(char, i + 1)
+			if end != -1:
+				if end + 1 < n and value[end + 1] == ',':
+					tokens.append(value[i:end + 1])
+					i = skip_spaces(end + 2)
+					continue
+				if end + 1 == n or end + 1 == tail:
+					tokens.append(value[i:end + 1])
+					break
+			i += 1
+
+		elif char.isalnum() or char == '_':
+			end = i + 1
+			while end < n and (value[end].isalnum() or value[end] == '_'):
+				end += 1
+			if end < n and value[end] == ',':
+				tokens.append(value[i:end])
+				i = skip_spaces(end + 1)
+			elif end == n or end == tail:
+				tokens.append(value[i:end])
+				break
+			else:
+				# every word starting inside this one fails the same way
+				i = end
+
+		elif char == '(':
+			if i > line_end:
+				line_end = value.find('\n', i)
+				if line_end == -1:
+					line_end = n
+				line_start = value.rfind('\n', 0, i) + 1
+				line_last_call_end = value.rfind('),', line_start, line_end)
+
+			if line_last_call_end >= i + 2:
+				tokens.append(value[i:line_last_call_end + 1])
+				i = skip_spaces(line_last_call_end + 2)
+			elif (line_end == n or line_end == tail) and value[line_end - 1] == ')' and line_end - 1 >= i + 2:
+				tokens.append(value[i:line_end])
+				break
+			else:
+				i += 1
+
+		else:
+			i += 1
+
+	return [x.strip() for x in tokens]
+
+def split_call(call):
+	'''
+	Splits a function call into the function name and its arguments,
+	at the spaces that aren't inside quoted strings.
+
+	Args:
+	    call (string): What is inside the parentheses, e.g.
+	        ``toRFC822 PubDate 'a b'``.
+
+	Returns:
+	    A tuple of the function name and a tuple of the arguments, as
+	    they were written (quotes included).
+	'''
+	tokens = RE_ARGUMENT.findall(call)
+	if RE_ARGUMENT.sub('', call).strip():
+		raise SyntaxError('Unmatched quote in function call')
+	if not tokens:
+		raise SyntaxError('Missing function name in function call')
+	return tokens[0], tuple(tokens[1:])
+
+def tokenize(value):
+	'''
+	Splits the value of an assignment into its operands.
+
+	Args:
+	    value (string): Everything to the right of the `=`.
+
+	Returns:
+	    A tuple of operands, each of them being one of:
+	        * ``('string', text)``, with the quotes removed but the
+	          escape characters left as is.
+	        * ``('call', function name, arguments)``
+	        * ``('variable', name)``
+	'''
+	operands = []
+	for var in split_concat(value):
+		if var[0] == '"' or var[0] == "'":
+			# token is a string
+			operands.append(('string', remove_inner_outer_quotes(var)))
+		elif var[0] == "(":
+			# token is a function call
+			if var[-1] != ")":
+				raise SyntaxError('Unmatched ( in assignment')
+			try:
+				name, args = split_call(var[1:-1])
+			except SyntaxError as e:
+				logger.warning("function call {}: {}".format(var, e))
+				raise
+			operands.append(('call', name, args))
+		else:
+			operands.append(('variable', var))
+
+	return tuple(operands)
+
+def unescape(string):
+	'''
+	Renders the escaped characters of a string, i.e. a backslash followed
+	by any character other than a newline becomes that character.
+
+	Args:
+	    string (string): The string to unescape.
+
+	Returns:
+	    The unescaped string.
+	'''
+	i = string.find('\\')
+	if i == -1:
+		return string
+
+	n = len(string)
+	out = []
+	start = 0
+	while i != -1:
+		if i + 1 < n and string[i + 1] != '\n':
+			out.append(string[start:i])
+			out.append(string[i + 1])
+			start = i + 2
+			i = string.find('\\', start)
+		else:
+			i = string.find('\\', i + 1)
+	out.append(string[start:])
+	return ''.join(out)
+
+def parse_keyword(query):
+	'''
+	Compiles a keyword statement, see :meth:`VariableManager.parse_keyword`.
+
+	Args:
+	    query (string): Expects a string in the form of ``keyword : argument``.
+
+	Returns:
+	    A :class:`Command` object. Raises `SyntaxError` if the statement
+	    is not a keyword.
+	'''
+	if not (re.match(RE_KEYWORD, query)):
+		raise SyntaxError(f'<{query}> is neither a keyword nor an assign statement')
+
+	keyword, value = query.split(':', 1)
+	keyword = keyword.strip().lower()
+	value = value.strip()
+
+	# value quote
+	if value[0] == '"' or value[0] == "'":
+		value = remove_inner_outer_quotes(value)
+
+	if keyword == "include":
+		return Include(query, value)
+	elif keyword == "using":
+		return Using(query, value)
+	else:
+		raise SyntaxError('Supported keywords: include; using.')
+
+def parse_assignment(query):
+	'''
+	Compiles an assignment or keyword statement, see
+	:meth:`VariableManager.assign`.
+
+	Args:
+	    query (string): Expects a string in the form of ``variable = value``
+	        or ``keyword : argument``.
+
+	Returns:
+	    A :class:`Command` object. Raises `SyntaxError` if the statement
+	    is neither.
+	'''
+	if not (re.match(RE_ASSIGNMENT, query)):
+		# if string matches " Something : Something else " do that instead
+		return parse_keyword(query)
+
+	# query expected to be "variable = value"
+	ident, value = query.split('=', 1)
+	ident = ident.strip()
+	value = value.strip()
+
+	# check valid identifier
+	if ident in RESERVED_VARIABLE_NAMES:
+		raise SyntaxError(f'assignment <{query}>: variable name "{ident}" cannot be used!')
+
+	return Assign(query, ident, tokenize(value))
+
+@lru_cache(maxsize=4096)
+def compile_command(statement):
+	'''
+	Compiles a MDiocre command. Each distinct statement is only compiled
+	once.
+
+	Args:
+	    statement (string): The command, without the surrounding markup.
+
+	Returns:
+	    A :class:`Command` object. Statements that are neither assignments
+	    nor keywords become :class:`Get` commands.
+	'''
+	try:
+		return parse_assignment(statement)
+	except SyntaxError:
+		return Get(statement)
+
+def is_content_slot(command):
+	'''
+	Tells whether a command puts the content of the page in a template,
+	i.e. ``<!--: content -->``.
+	
+	Args:
+	    command (Command): A compiled command.
+	
+	Returns:
+	    True if the command only gets the ``content`` variable.
+	'''
+	return isinstance(command, Get) and command.statement.strip() == 'content'
+
+class Template():
+	'''
+	A template that is split into literal text and MDiocre commands
+	once, so that it can be rendered any number of times without
+	scanning it again.
+
+	Args:
+	    string (string): A string containing formatted comments.
+	    pattern (re.Pattern, Optional): Regular expression matching the
+	        commands, whose first group is the command itself. Defaults
+	        to HTML comments prefixed with ``<!--:``.
+	'''
+	def __init__(self, string, pattern=RE_HTML_COMMENTS):
+		# type checking
+		declare(string, str)
+
+		# splitting on a pattern with one group gives
+		# [literal, command, literal, command, ..., literal]
+		parts = re.split(pattern, string)
+		self.literals = parts[0::2]
+		self.commands = [compile_command(i) for i in parts[1::2]]
+
+	@classmethod
+	def from_file(cls, path):
+		'''
+		Makes a template out of a file.
+
+		Args:
+		    path (string): Path to the template file.
+
+		Returns:
+		    A :class:`Template` object.
+		'''
+		with open(path, 'r') as tf:
+			return cls(tf.read())
+
+	def render(self, variables):
+		'''
+		Renders the template with the specified variables. See
+		:meth:`mdiocre.core.MDiocre.render`.
+
+		Args:
+		    variables (VariableManager): Variable object to use with
+		        the template.
+
+		Returns:
+		    The processed string.
+		'''
+		literals = self.literals
+		out = [literals[0]]
+		for i, command in enumerate(self.commands, 1):
+			out.append(command.run(variables))
+			out.append(literals[i])
+		return ''.join(out)
+
+	def write(self, variables, write, content=None):
+		'''
+		Renders the template piece by piece, instead of making the whole
+		string at once.
+		
+		Args:
+		    variables (VariableManager): Variable object to use with
+		        the template.
+		    write (func): Called with every piece of the rendered
+		        template, e.g. the `write` method of a file.
+		    content (func, Optional): If set, every ``<!--: content -->``
+		        is left to this function, which is called with `write`.
+		        See :meth:`streams_content`.
+		
+		Returns:
+		    None.
+		'''
+		literals = self.literals
+		write(literals[0])
+		for i, command in enumerate(self.commands, 1):
+			if content is not None and is_content_slot(command):
+				content(write)
+			else:
+				write(command.run(variables))
+			write(literals[i])
+	
+	def streams_content(self):
+		'''
+		Tells whether the page's content is only ever put in the template
+		as is, with ``<!--: content -->``. If so, :meth:`write` can
+		write the content of a page as it is converted, without it
+		being stored anywhere.
+		
+		Included files could use the content in any way, so templates
+		including files can't stream the content.
+		
+		Returns:
+		    True if the template can stream the content.
+		'''
+		for command in self.commands:
+			if isinstance(command, Include):
+				return False
+			if isinstance(command, Assign):
+				for operand in command.operands:
+					if operand[0] == 'variable' and operand[1] == 'content':
+						return False
+					if operand[0] == 'call' and 'content' in operand[2]:
+						return False
+		return True
+	
+	def run(self, variables):
+		'''
+		Runs the template's commands without rendering anything.
+
+		Args:
+		    variables (VariableManager): Variable object to use with
+		        the template.
+
+		Returns:
+		    None.
+		'''
+		for command in self.commands:
+			command.run(variables)
+
+_source_cache = OrderedDict()
+
+def compile_source(string, pattern=RE_HTML_COMMENTS):
+	'''
+	Makes a :class:`Template` out of a source string. Templates are
+	cached by the hash of the source, so seeing the same source again
+	doesn't scan it again.
+
+	Args:
+	    string (string): A string containing MDiocre commands.
+	    pattern (re.Pattern, Optional): See :class:`Template`.
+
+	Returns:
+	    A :class:`Template` object.
+	'''
+	if len(string) > SOURCE_CACHE_LIMIT:
+		return Template(string, pattern)
+
+	key = (pattern.pattern, hashlib.sha1(string.encode('utf-8', 'surrogatepass')).digest())
+
+	template = _source_cache.get(key)
+	if template is None:
+		template = Template(string, pattern)
+		_source_cache[key] = template
+		while len(_source_cache) > SOURCE_CACHE_SIZE:
+			_source_cache.popitem(last=False)
+	else:
+		_source_cache.move_to_end(key)
+
+	return template
@@ -0,0 +1,262 @@
+import time
+import threading
+from .utils import declare
+
+'''
+Instrumentation hooks, to find out where the time of a build goes
+'''
+
+# functions called with every event, see add_hook
+HOOKS = []
+
+# the phases running in each thread, innermost last
+_state = threading.local()
+
+def add_hook(hook):
+	'''
+	Registers a function to call with every event. An event is a
+	dictionary telling how long a phase took, with the keys:
+	"phase" (the name of the phase, e.g. "convert"),
+	"file" (absolute path to the source file being built, or None),
+	"parent" (the name of the phase it happened in, or None),
+	"time" (time taken in seconds, including the phases inside it) and
+	"self" (time taken in seconds, not including the phases inside it).
+	Some phases have more keys, e.g. "bytes" for "write".
+
+	As long as no hook is registered, phases aren't timed at all.
+
+	Args:
+	    hook (func): Function taking an event.
+
+	Returns:
+	    None.
+	'''
+	HOOKS.append(hook)
+
+def remove_hook(hook):
+	'''
+	Unregisters a function registered with :func:`add_hook`.
+
+	Args:
+	    hook (func): The function.
+
+	Returns:
+	    None.
+	'''
+	HOOKS.remove(hook)
+
+def emit(event):
+	'''
+	Hands an event to every hook, e.g. one that happened in a worker
+	process.
+
+	Args:
+	    event (dict): The event.
+
+	Returns:
+	    None.
+	'''
+	for hook in HOOKS:
+		hook(event)
+
+class NullPhase():
+	'''
+	What :func:`phase` gives when no hook is registered. It does nothing,
+	and is false, so that anything done only to be noted can be skipped.
+	'''
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		return False
+
+	def __bool__(self):
+		return False
+
+	def note(self, **info):
+		pass
+
+NULL_PHASE = NullPhase()
+
+class Phase():
+	'''
+	Times a phase of the build, then hands it to the hooks as an event
+	(see :func:`add_hook`). Phases started inside of it are counted as
+	part of it, but not in its "self" time.
+
+	Args:
+	    name (string): The name of the phase.
+	    file (string, Optional): Absolute path to the source file being
+	        built. Defaults to the one of the phase this one is in.
+	'''
+	def __init__(self, name, file=None):
+		self.name = name
+		self.file = file
+		self.info = {}
+		self.parent = None
+		self.children = 0.0
+
+	def __enter__(self):
+		stack = getattr(_state, 'stack', None)
+		if stack is None:
+			stack = _state.stack = []
+		if stack:
+			self.parent = stack[-1].name
+			if self.file is None:
+				self.file = stack[-1].file
+		stack.append(self)
+		self.start = time.perf_counter()
+		return self
+
+	def __exit__(self, *exc):
+		elapsed = time.perf_counter() - self.start
+		stack = _state.stack
+		stack.pop()
+		if stack:
+			stack[-1].children += elapsed
+
+		event = {
+			'phase': self.name,
+			'file': self.file,
+			'parent': self.parent,
+			'time': elapsed,
+			'self': elapsed - self.children,
+		}
+		event.update(self.info)
+		emit(event)
+		return False
+
+	def note(self, **info):
+		'''
+		Adds information to the event, e.g. ``note(bytes=1024)``.
+		'''
+		self.info.update(info)
+
+def phase(name, file=None):
+	'''
+	Times a phase of the build, to be used as a context manager::
+
+	    with phase('convert'):
+	        html = convert(markup)
+
+	Args:
+	    name (string): The name of the phase.
+	    file (string, Optional): See :class:`Phase`.
+
+	Returns:
+	    A :class:`Phase`, or :data:`NULL_PHASE` if no hook is registered.
+	'''
+	if not HOOKS:
+		return NULL_PHASE
+	return Phase(name, file)
+
+class EventCollector():
+	'''
+	A hook that keeps the events around, e.g. to send them back from
+	worker processes.
+	'''
+	def __init__(self):
+		self.events = []
+
+	def __call__(self, event):
+		self.events.append(event)
+
+class ProfileReport():
+	'''
+	A hook that adds up the events of a build: the time taken by each
+	phase, by each file and the size of each page written.
+
+	Attributes:
+	    phases (dict): Phase name -> [count, self time, time].
+	    files (dict): Source file -> time taken to build it, going by
+	        the phases that didn't happen inside another one.
+	    outputs (dict): Source file -> bytes written.
+	'''
+	def __init__(self):
+		self.phases = {}
+		self.files = {}
+		self.outputs = {}
+		self.lock = threading.Lock()
+
+	def __call__(self, event):
+		name = event['phase']
+		with self.lock:
+			totals = self.phases.get(name)
+			if totals is None:
+				totals = self.phases[name] = [0, 0.0, 0.0]
+			totals[0] += 1
+			totals[1] += event['self']
+			totals[2] += event['time']
+
+			if event['parent'] is None and event['file'] is not None:
+				self.files[event['file']] = self.files.get(event['file'], 0.0) + event['time']
+			if 'bytes' in event:
+				self.outputs[event['file']] = self.outputs.get(event['file'], 0) + event['bytes']
+
+	def summary(self, top=10):
+		'''
+		Makes a summary of the build.
+
+		Args:
+		    top (int, Optional): Number of files to list, slowest first.
+
+		Returns:
+		    A dictionary with the keys "phases" (list of dictionaries
+		    with the keys "phase", "count", "self" and "time", most time
+		    consuming first), "slowest" (list of dictionaries with the
+		    keys "file" and "time") and "outputs" (list of dictionaries
+		    with the keys "file" and "bytes").
+		'''
+		declare(top, int)
+		with self.lock:
+			phases = [
+				{'phase': name, 'count': count, 'self': self_time, 'time': total}
+				for name, (count, self_time, total) in self.phases.items()
+			]
+			slowest = sorted(self.files.items(), key=lambda i: i[1], reverse=True)[:top]
+			outputs = sorted(self.outputs.items())
+
+		phases.sort(key=lambda i: i['self'], reverse=True)
+		return {
+			'phases': phases,
+			'slowest': [{'file': f, 'time': t} for f, t in slowest],
+			'outputs': [{'file': f, 'bytes': b} for f, b in outputs],
+		}
+
+	def write(self, path, top=10):
+		'''
+		Writes the summary (see :meth:`summary`) to a file: as CSV if
+		the file name ends in ``.csv``, otherwise as JSON.
+
+		The CSV file has one row per phase, slow file and page written,
+		with the columns "kind" ("phase", "slowest" or "output"),
+		"name", "count", "self", "time" and "bytes".
+
+		Args:
+		    path (string): Path to the file.
+		    top (int, Optional): See :meth:`summary`.
+
+		Returns:
+		    None.
+		'''
+		declare(path, str)
+		summary = self.summary(top=top)
+
+		# only needed when a report is asked for
+		import csv
+		import json
+
+		if not path.lower().endswith('.csv'):
+			with open(path, 'w') as report:
+				json.dump(summary, report, indent='\t')
+			return
+
+		with open(path, 'w', newline='') as report:
+			writer = csv.writer(report)
+			writer.writerow(['kind', 'name', 'count', 'self', 'time', 'bytes'])
+			for i in summary['phases']:
+				writer.writerow(['phase', i['phase'], i['count'], i['self'], i['time'], ''])
+			for i in summary['slowest']:
+				writer.writerow(['slowest', i['file'], '', '', i['time'], ''])
+			for i in summary['outputs']:
+				writer.writerow(['output', i['file'], '', '', '', i['bytes']])
@@ -0,0 +1,328 @@
+import os
+import sqlite3
+import logging
+import pathlib
+from .utils import declare
+
+'''
+Index of the variables of every page built, to make index pages, tag pages
+and feeds out of without processing the pages again
+'''
+
+logger = logging.getLogger('mdiocre.index')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS pages (
+	id INTEGER PRIMARY KEY,
+	source TEXT NOT NULL UNIQUE,
+	path TEXT NOT NULL,
+	output TEXT
+);
+CREATE INDEX IF NOT EXISTS pages_by_path ON pages (path);
+CREATE TABLE IF NOT EXISTS variables (
+	page INTEGER NOT NULL,
+	name TEXT NOT NULL,
+	value,
+	PRIMARY KEY (page, name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS variables_by_value ON variables (name, value);
+CREATE TABLE IF NOT EXISTS sources (
+	source TEXT PRIMARY KEY,
+	hash TEXT
+) WITHOUT ROWID;
+'''
+
+def index_value(value):
+	'''
+	Turns the value of a variable into something that can be stored in
+	the index. Strings and numbers are kept as they are, anything else
+	is turned into a string the same way
+	:meth:`mdiocre.core.VariableManager.get` does.
+	'''
+	if value is None or isinstance(value, (str, int, float)):
+		return value
+	return str(value)
+
+class SiteIndex():
+	'''
+	Keeps the variables of every page built into a directory, e.g. its
+	``title``, ``date`` and ``content``, in an SQLite database inside
+	of it. :meth:`mdiocre.wizard.Wizard.generate_from_directory` keeps
+	it up to date, along with the build manifest, so that only pages
+	that were rebuilt are written again.
+
+	Pages are looked up by their path relative to the source directory,
+	with forward slashes, e.g. ``blog/first-post.md``. Every method that
+	finds pages gives a list of dictionaries with the keys: "path",
+	"source" (absolute path to the source file), "output" (path to the
+	page written, relative to the build directory) and "variables"
+	(variable name -> value).
+
+	For every page converted, whether or not it was written, the hash of
+	its source is kept as well, so that pages built while the index
+	wasn't being kept (e.g. with ``--no-index``) are found out, see
+	:meth:`is_up_to_date`.
+
+	Changes are only saved by :meth:`save`.
+
+	Args:
+	    build_dir (string): The build directory.
+	    readonly (bool, Optional): If True, the index is only read, and
+	        it has to exist already.
+
+	Raises:
+	    FileNotFoundError: if `readonly` is set and there is no index,
+	        e.g. if the site hasn't been built yet.
+	    ValueError: if `readonly` is set and the index was made by
+	        another version of MDiocre.
+	'''
+	FILE_NAME = '.mdiocre-index.sqlite'
+	FORMAT = 1
+
+	def __init__(self, build_dir, readonly=False):
+		# type checking
+		declare(build_dir, str)
+		declare(readonly, bool)
+
+		self.build_dir = os.path.abspath(build_dir)
+		self.path = os.path.join(self.build_dir, self.FILE_NAME)
+
+		if readonly:
+			if not os.path.isfile(self.path):
+				raise FileNotFoundError('no site index in {}'.format(self.build_dir))
+			self.is_new = False
+			self.db = sqlite3.connect(pathlib.Path(self.path).as_uri() + '?mode=ro', uri=True)
+			if self.db.execute('PRAGMA user_version').fetchone()[0] != self.FORMAT:
+				self.db.close()
+				raise ValueError('the site index in {} is from another MDiocre version'.format(self.build_dir))
+		else:
+			os.makedirs(self.build_dir, exist_ok=True)
+			self.is_new = not os.path.isfile(self.path)
+			self.db = sqlite3.connect(self.path)
+
+			if self.db.execute('PRAGMA user_version').fetchone()[0] != self.FORMAT:
+				# made by an older version, or not at all
+				self.db.executescript('DROP TABLE IF EXISTS pages; DROP TABLE IF EXISTS variables; DROP TABLE IF EXISTS sources;')
+				self.db.execute('PRAGMA user_version = {}'.format(self.FORMAT))
+				self.is_new = True
+			self.db.executescript(SCHEMA)
+
+		# source file -> hash of the source it was indexed at, loaded
+		# when it is first needed
+		self.hashes = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+		return False
+
+	def is_up_to_date(self, source_file, source_hash):
+		'''
+		Tells whether a page is in the index as it is now.
+
+		Args:
+		    source_file (string): Absolute path to the source file.
+		    source_hash (string): The hash of the source, as kept in the
+		        build manifest.
+
+		Returns:
+		    True if the page was recorded with the same hash.
+		'''
+		if self.hashes is None:
+			self.hashes = dict(self.db.execute('SELECT source, hash FROM sources'))
+		return source_file in self.hashes and self.hashes[source_file] == source_hash
+
+	def record(self, source_file, path, output, variables, source_hash=None):
+		'''
+		Records the variables of a page, replacing what was there.
+
+		Args:
+		    source_file (string): Absolute path to the source file.
+		    path (string): Its path relative to the source directory.
+		    output (string): Absolute path to the page written.
+		    variables (dict): The variables, e.g.
+		        :attr:`mdiocre.core.VariableManager.variables`. If None,
+		        e.g. if the source wasn't written to a page, only its
+		        hash is kept.
+		    source_hash (string, Optional): The hash of the source, see
+		        :meth:`is_up_to_date`.
+
+		Returns:
+		    None.
+		'''
+		self.forget(source_file)
+		self.db.execute('INSERT INTO sources (source, hash) VALUES (?, ?)', (source_file, source_hash))
+		if self.hashes is not None:
+			self.hashes[source_file] = source_hash
+		if variables is None:
+			return
+
+		output = os.path.relpath(output, self.build_dir).replace(os.path.sep, '/')
+		page = self.db.execute(
+			'INSERT INTO pages (source, path, output) VALUES (?, ?, ?)',
+			(source_file, path.replace(os.path.sep, '/'), output)
+		).lastrowid
+		self.db.executemany(
+			'INSERT INTO variables (page, name, value) VALUES (?, ?, ?)',
+			((page, name, index_value(value)) for name, value in variables.items())
+		)
+
+	def forget(self, source_file):
+		'''
+		Removes a page from the index.
+
+		Args:
+		    source_file (string): Absolute path to the source file.
+
+		Returns:
+		    None.
+		'''
+		self.db.execute('DELETE FROM sources WHERE source = ?', (source_file,))
+		if self.hashes is not None:
+			self.hashes.pop(source_file, None)
+		row = self.db.execute('SELECT id FROM pages WHERE source = ?', (source_file,)).fetchone()
+		if row is not None:
+			self.db.execute('DELETE FROM variables WHERE page = ?', row)
+			self.db.execute('DELETE FROM pages WHERE id = ?', row)
+
+	def clear(self):
+		'''
+		Removes every page from the index.
+		'''
+		self.db.execute('DELETE FROM variables')
+		self.db.execute('DELETE FROM pages')
+		self.db.execute('DELETE FROM sources')
+		self.hashes = {}
+
+	def sources(self):
+		'''
+		Lists the source files of every page in the index.
+
+		Returns:
+		    A set of absolute paths.
+		'''
+		return set(i[0] for i in self.db.execute('SELECT source FROM pages'))
+
+	def save(self):
+		'''
+		Saves the changes made since the last save.
+		'''
+		self.db.commit()
+
+	def close(self):
+		'''
+		Saves the changes, then closes the database.
+		'''
+		if self.db is not None:
+			self.db.commit()
+			self.db.close()
+			self.db = None
+
+	def _pages(self, query, args):
+		# pages first, in the order asked for, then all of their variables
+		# with one more query
+		pages = []
+		by_id = {}
+		for page_id, source, path, output in self.db.execute(query, args):
+			page = {'path': path, 'source': source, 'output': output, 'variables': {}}
+			pages.append(page)
+			by_id[page_id] = page
+
+		ids = list(by_id)
+		for i in range(0, len(ids), 500):
+			chunk = ids[i:i + 500]
+			for page_id, name, value in self.db.execute(
+				'SELECT page, name, value FROM variables WHERE page IN ({})'.format(','.join('?' * len(chunk))),
+				chunk
+			):
+				by_id[page_id]['variables'][name] = value
+		return pages
+
+	def get(self, path):
+		'''
+		Gets a page.
+
+		Args:
+		    path (string): Path of its source file, relative to the
+		        source directory.
+
+		Returns:
+		    A dictionary describing the page (see :class:`SiteIndex`),
+		    or None if it isn't in the index.
+		'''
+		declare(path, str)
+		pages = self._pages(
+			'SELECT id, source, path, output FROM pages WHERE path = ?',
+			(path.replace(os.path.sep, '/'),)
+		)
+		return pages[0] if pages else None
+
+	def pages(self, prefix=''):
+		'''
+		Gets every page, in no particular order.
+
+		Args:
+		    prefix (string, Optional): Only get the pages whose path
+		        starts with this, e.g. ``blog/``.
+
+		Returns:
+		    A list of dictionaries describing the pages.
+		'''
+		declare(prefix, str)
+		return self._pages(
+			'SELECT id, source, path, output FROM pages WHERE substr(path, 1, ?) = ?',
+			(len(prefix), prefix)
+		)
+
+	def find(self, name, value, prefix=''):
+		'''
+		Gets the pages where a variable has some value, e.g. every page
+		with ``author = "Joe"``.
+
+		Args:
+		    name (string): The variable.
+		    value: Its value.
+		    prefix (string, Optional): See :meth:`pages`.
+
+		Returns:
+		    A list of dictionaries describing the pages, in the order of
+		    their paths.
+		'''
+		declare(name, str)
+		declare(prefix, str)
+		return self._pages(
+			'SELECT p.id, p.source, p.path, p.output FROM variables v '
+			'JOIN pages p ON p.id = v.page '
+			'WHERE v.name = ? AND v.value = ? AND substr(p.path, 1, ?) = ? '
+			'ORDER BY p.path',
+			(name, index_value(value), len(prefix), prefix)
+		)
+
+	def sort_by(self, name, reverse=False, prefix=''):
+		'''
+		Gets the pages that have a variable, sorted by its value, e.g.
+		``sort_by('date', reverse=True)`` for the newest pages first.
+		Numbers come before strings, which are compared as text.
+
+		Args:
+		    name (string): The variable.
+		    reverse (bool, Optional): If True, sort from the largest
+		        value to the smallest.
+		    prefix (string, Optional): See :meth:`pages`.
+
+		Returns:
+		    A list of dictionaries describing the pages.
+		'''
+		declare(name, str)
+		declare(reverse, bool)
+		declare(prefix, str)
+		order = 'DESC' if reverse else 'ASC'
+		return self._pages(
+			'SELECT p.id, p.source, p.path, p.output FROM variables v '
+			'JOIN pages p ON p.id = v.page '
+			'WHERE v.name = ? AND substr(p.path, 1, ?) = ? '
+			'ORDER BY v.value {0}, p.path {0}'.format(order),
+			(name, len(prefix), prefix)
+		)
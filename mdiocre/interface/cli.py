@@ -5,8 +5,11 @@ CLI_VERSION = '1.0.1'
 from argparse import ArgumentParser
 from mdiocre.__meta__ import __version__ as MD_VERSION
 from mdiocre.wizard import Wizard
+from mdiocre.hooks import ProfileReport, add_hook
 
 import logging
+import threading
+import queue
 import sys
 
 def has_color():
@@ -21,34 +24,97 @@ def has_color():
 	return is_a_tty
 
 class MDiocreHandler(logging.Handler):
+	'''
+	Prints log records from a thread of its own, so that logging costs
+	the build no more than putting the record on a queue. Records that
+	pile up while the terminal is busy are written all at once.
+	
+	Whether the terminal supports color is only checked once, when the
+	handler is made. Call :meth:`close` to print what's left.
+	
+	Args:
+	    stream (file, Optional): Where to write. Defaults to stdout.
+	'''
 	quiet = False
 	
+	def __init__(self, stream=None):
+		logging.Handler.__init__(self)
+		self.stream = stream if stream is not None else sys.stdout
+		self.color = has_color()
+		self.queue = queue.SimpleQueue()
+		self.writer = threading.Thread(target=self.write_records, daemon=True)
+		self.writer.start()
+	
 	def set_quiet(self, quiet):
 		self.quiet = quiet
 		return self
 	
 	def emit(self, record):
 		if not self.quiet:
-			color_enable = has_color()
-			if color_enable:
-				if record.levelno >= 35: # SERIOUS, ERROR, CRITICAL
-					print('\033[31m', end='')
-				elif record.levelno >= 30: # WARNING
-					print('\033[33m', end='')
-				elif record.levelno >= 25: # INFO + 5, a.k.a. OK
-					print('\033[32m', end='')
-				else:
-					print('\033[0m', end='')
-			
-			sep = '... '
+			self.queue.put(record)
+	
+	def format_record(self, record):
+		'''
+		Formats a record the way it's printed.
+		
+		Args:
+		    record (logging.LogRecord): The record.
+		
+		Returns:
+		    A string.
+		'''
+		indent = '    '*int(record.levelno % 5)
+		
+		if not self.color:
+			return ''.join([indent, '\n[', record.levelname.split(':')[0], '] ', record.getMessage()])
+		
+		if record.levelno >= 35: # SERIOUS, ERROR, CRITICAL
+			color = '\033[31m'
+		elif record.levelno >= 30: # WARNING
+			color = '\033[33m'
+		elif record.levelno >= 25: # INFO + 5, a.k.a. OK
+			color = '\033[32m'
+		else:
+			color = '\033[0m'
+		
+		return ''.join([color, indent, '... ', record.getMessage(), '\033[0m\n'])
+	
+	def write_records(self):
+		'''
+		Writes records as they come, until None is put on the queue.
+		'''
+		while True:
+			records = [self.queue.get()]
+			while True:
+				try:
+					records.append(self.queue.get_nowait())
+				except queue.Empty:
+					break
 			
-			if not color_enable:
-				sep = '\n[{}] '.format(record.levelname.split(':')[0])
+			done = records[-1] is None
+			lines = []
+			for record in records:
+				if record is None:
+					break
+				try:
+					lines.append(self.format_record(record))
+				except Exception:
+					self.handleError(record)
 			
-			print(''.join(['    '*int(record.levelno % 5), sep, record.msg]), end='')
+			self.stream.write(''.join(lines))
+			self.stream.flush()
 			
-			if color_enable:
-				print('\033[0m')
+			if done:
+				return
+	
+	def close(self):
+		'''
+		Writes the records still waiting, then stops the writer thread.
+		'''
+		if self.writer.is_alive():
+			self.queue.put(None)
+			self.writer.join()
+		logging.Handler.close(self)
 
 def cli():
 	ap = ArgumentParser(
@@ -58,14 +124,38 @@ def cli():
 	ap.add_argument('source_dir', help='Webpages source directory')
 	ap.add_argument('build_dir', help='Output directory')
 	ap.add_argument('--quiet', '-q', help='No output', action='store_true')
+	ap.add_argument('--rebuild', '-r', help='Rebuild every file, even if it is up to date', action='store_true')
+	ap.add_argument('--jobs', '-j', help='Number of files to build in parallel', type=int, default=1, metavar='N')
+	ap.add_argument('--markdown-extensions', help='Comma-separated list of Markdown extensions to use instead of GitHub-Flavored Markdown', metavar='EXT,...')
+	ap.add_argument('--watch', '-w', help='Keep running, rebuilding the pages affected by every change', action='store_true')
+	ap.add_argument('--poll', help='With --watch, look for changes every second instead of asking the system', action='store_true')
+	ap.add_argument('--tsc-jobs', help='Number of TypeScript files compiled at once (default: 4)', type=int, default=4, metavar='N')
+	ap.add_argument('--hardlink-assets', help='Hard link the files that are only copied, instead of copying them. Changing a built file then changes its source', action='store_true')
+	ap.add_argument('--profile-report', help='Write how long each phase of the build took, the slowest files and the size of every page to FILE (CSV if it ends in .csv, JSON otherwise)', metavar='FILE')
+	ap.add_argument('--profile-top', help='Number of slowest files in the profile report (default: 10)', type=int, default=10, metavar='N')
+	ap.add_argument('--scan-plugins', help='Also look for parsers in every mdiocre_* module, the way older versions did (slow)', action='store_true')
+	ap.add_argument('--no-index', help="Don't keep the variables of every page in a site index inside the build directory", action='store_true')
+	ap.add_argument('--stream-threshold', help='Size from which HTML, Zim and Gemtext files are converted a piece at a time, to save memory (default: 32 MiB)', type=int, default=32 << 20, metavar='BYTES')
 
 	args = ap.parse_args()
 
-	w = Wizard()
+	parser_options = {}
+	if args.markdown_extensions is not None:
+		parser_options['markdown'] = {
+			'extensions': [i.strip() for i in args.markdown_extensions.split(',') if i.strip()]
+		}
+	
+	w = Wizard(jobs=args.jobs, parser_options=parser_options, stream_threshold=args.stream_threshold, hardlink_assets=args.hardlink_assets, tsc_jobs=args.tsc_jobs, scan_plugins=args.scan_plugins, site_index=not args.no_index)
 	
 	logger = logging.getLogger('mdiocre')
-	logger.addHandler(MDiocreHandler().set_quiet(args.quiet))
-	logger.setLevel(logging.DEBUG)
+	handler = None
+	if args.quiet:
+		# don't even make the records
+		logger.setLevel(logging.CRITICAL + 1)
+	else:
+		handler = MDiocreHandler()
+		logger.addHandler(handler)
+		logger.setLevel(logging.DEBUG)
 	
 	# display header
 	if not args.quiet:
@@ -78,9 +168,27 @@ def cli():
 
 	# run the wizard
 	w.register_converters()
-	w.generate_from_directory(vars(args))
 	
-	print()
+	report = None
+	if args.profile_report is not None:
+		report = ProfileReport()
+		add_hook(report)
+	
+	if args.watch:
+		from mdiocre.watcher import make_watcher
+		try:
+			w.watch(vars(args), watcher=make_watcher(polling=args.poll))
+		except KeyboardInterrupt:
+			pass
+	else:
+		w.generate_from_directory(vars(args))
+	
+	if report is not None:
+		report.write(args.profile_report, top=args.profile_top)
+	
+	if handler is not None:
+		handler.close()
+		print()
 
 if __name__ == '__main__':
 	cli()
@@ -0,0 +1,304 @@
+import os
+import json
+import hashlib
+import logging
+from .utils import declare
+from .__meta__ import __version__
+
+'''
+Build manifest used by the Wizard to perform incremental builds
+'''
+
+logger = logging.getLogger('mdiocre.manifest')
+
+def file_hash(path):
+	'''
+	Hashes a file's contents.
+
+	Args:
+	    path (string): Path to the file.
+
+	Returns:
+	    The hex digest of the file, or None if the file doesn't exist.
+	'''
+	h = hashlib.sha1()
+	try:
+		with open(path, 'rb') as f_:
+			for chunk in iter(lambda: f_.read(1 << 16), b''):
+				h.update(chunk)
+	except (FileNotFoundError, IsADirectoryError):
+		return None
+	return h.hexdigest()
+
+def options_hash(options):
+	'''
+	Hashes the settings given to the parsers.
+
+	Args:
+	    options (dict): The settings, see
+	        :class:`mdiocre.wizard.Wizard`'s `parser_options`.
+
+	Returns:
+	    The hex digest of the settings.
+	'''
+	encoded = json.dumps(options or {}, sort_keys=True, default=repr)
+	return hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+
+class BuildManifest():
+	'''
+	Records what went into every file produced by a build, so that the
+	next build can skip the files whose inputs didn't change.
+
+	The manifest is stored as JSON inside the build directory. For every
+	source file, it records:
+	    * the source's content hash
+	    * the template it resolved via ``mdiocre-template``, if any
+	    * every file it depends on (the template, ``Include:`` and
+	      ``Using:`` files), along with their content hashes
+	    * every output file it produced
+
+	Content hashes are cached alongside each file's modification time
+	and size, so unchanged files are never re-read. The settings of the
+	parsers are hashed too: if they change, every file is rebuilt.
+
+	Args:
+	    build_dir (string): The build directory.
+	    options (dict, Optional): The settings of the parsers, see
+	        :class:`mdiocre.wizard.Wizard`'s `parser_options`.
+	'''
+	FILE_NAME = '.mdiocre-manifest.json'
+	FORMAT = 1
+
+	def __init__(self, build_dir, options=None):
+		# type checking
+		declare(build_dir, str)
+
+		self.path = os.path.join(os.path.abspath(build_dir), self.FILE_NAME)
+		self.options = options_hash(options)
+
+		# source path -> entry
+		self.sources = {}
+		# file path -> (mtime_ns, size, hash), loaded from disk
+		self.files = {}
+		# hashes computed during this run
+		self.current_hashes = {}
+
+	def load(self):
+		'''
+		Loads the manifest from the build directory. A missing, unreadable
+		or outdated manifest results in an empty one.
+
+		Returns:
+		    True if a usable manifest was loaded, False otherwise.
+		'''
+		try:
+			with open(self.path, 'r') as mf:
+				data = json.load(mf)
+		except FileNotFoundError:
+			return False
+		except (OSError, ValueError) as e:
+			logger.warning('cannot read build manifest, rebuilding everything: {}'.format(e))
+			return False
+
+		if data.get('format') != self.FORMAT or data.get('mdiocre') != __version__:
+			logger.warning('build manifest is from another MDiocre version, rebuilding everything.')
+			return False
+
+		self.sources = data.get('sources', {})
+		self.files = {k: tuple(v) for k, v in data.get('files', {}).items()}
+
+		if data.get('options') != self.options:
+			logger.info('parser settings changed, rebuilding everything.')
+			self.mark_stale()
+		return True
+
+	def save(self):
+		'''
+		Writes the manifest to the build directory. Only files referenced
+		by the current entries are kept in the hash cache.
+
+		Returns:
+		    None.
+		'''
+		referenced = set()
+		for entry in self.sources.values():
+			referenced.add(entry['source'])
+			referenced.update(entry['dependencies'].keys())
+
+		files = {}
+		for path in referenced:
+			try:
+				st = os.stat(path)
+			except OSError:
+				continue
+			digest = self.hash(path)
+			if digest is not None:
+				files[path] = (st.st_mtime_ns, st.st_size, digest)
+
+		self.files = files
+
+		data = {
+			'format': self.FORMAT,
+			'mdiocre': __version__,
+			'options': self.options,
+			'sources': self.sources,
+			'files': files,
+		}
+
+		tmp_path = self.path + '.tmp'
+		with open(tmp_path, 'w') as mf:
+			json.dump(data, mf, indent='\t', sort_keys=True)
+		os.replace(tmp_path, self.path)
+
+	def hash(self, path, dir_entry=None):
+		'''
+		Gets the content hash of a file, only reading it when its
+		modification time or size differs from what the manifest knows.
+
+		Args:
+		    path (string): Absolute path to the file.
+		    dir_entry (os.DirEntry, Optional): The file's directory entry,
+		        whose cached stat() is used instead of looking at the
+		        file again.
+
+		Returns:
+		    The hex digest of the file, or None if it doesn't exist.
+		'''
+		if path in self.current_hashes:
+			return self.current_hashes[path]
+
+		try:
+			st = dir_entry.stat() if dir_entry is not None else os.stat(path)
+		except OSError:
+			digest = None
+		else:
+			known = self.files.get(path)
+			if known and known[0] == st.st_mtime_ns and known[1] == st.st_size:
+				digest = known[2]
+			else:
+				digest = file_hash(path)
+
+		self.current_hashes[path] = digest
+		return digest
+
+	def invalidate(self, paths):
+		'''
+		Forgets the hashes computed for some files during this run, so
+		that they are looked at again, e.g. after they were changed.
+
+		Args:
+		    paths (iterable): Absolute paths to the files.
+
+		Returns:
+		    None.
+		'''
+		for path in paths:
+			self.current_hashes.pop(path, None)
+
+	def mark_stale(self):
+		'''
+		Makes every source file out of date, so that it is built again,
+		while still knowing what it produced before (e.g. to clean up
+		after source files that were removed).
+
+		Returns:
+		    None.
+		'''
+		for entry in self.sources.values():
+			entry['hash'] = None
+
+	def dependents(self, path):
+		'''
+		Finds the source files that depend on a file.
+
+		Args:
+		    path (string): Absolute path to the file, or to a directory,
+		        in which case every file inside it counts.
+
+		Returns:
+		    A set of the source files' absolute paths.
+		'''
+		prefix = path.rstrip(os.path.sep) + os.path.sep
+		found = set()
+		for source_file, entry in self.sources.items():
+			for dep in entry['dependencies']:
+				if dep == path or dep.startswith(prefix):
+					found.add(source_file)
+					break
+		return found
+
+	def is_up_to_date(self, source_file, dir_entry=None):
+		'''
+		Checks whether the outputs of a source file can be reused.
+
+		Args:
+		    source_file (string): Absolute path to the source file.
+		    dir_entry (os.DirEntry, Optional): See :meth:`hash`.
+
+		Returns:
+		    True if the source, all of its dependencies and all of its
+		    outputs are unchanged since the last build.
+		'''
+		entry = self.sources.get(source_file)
+		if entry is None:
+			return False
+
+		if self.hash(source_file, dir_entry) != entry['hash']:
+			return False
+
+		for dep, dep_hash in entry['dependencies'].items():
+			if self.hash(dep) != dep_hash:
+				return False
+
+		for output in entry['outputs']:
+			if not os.path.isfile(output):
+				return False
+
+		return True
+
+	def record(self, source_file, outputs, dependencies=(), template=None, failed=False):
+		'''
+		Records the results of building a source file.
+
+		Args:
+		    source_file (string): Absolute path to the source file.
+		    outputs (list): Absolute paths of the files written.
+		    dependencies (list, Optional): Absolute paths of the files that
+		        were read to produce the outputs.
+		    template (string, Optional): Absolute path to the template.
+		    failed (bool, Optional): If True, the source file will not
+		        be considered up to date in the next build.
+
+		Returns:
+		    A list of outputs that the source file produced in the
+		    previous build, but not in this one.
+		'''
+		old_entry = self.sources.get(source_file)
+
+		self.sources[source_file] = {
+			'source': source_file,
+			'hash': None if failed else self.hash(source_file),
+			'template': template,
+			'dependencies': {dep: self.hash(dep) for dep in dependencies},
+			'outputs': list(outputs),
+		}
+
+		if old_entry is None:
+			return []
+		return [i for i in old_entry['outputs'] if i not in outputs]
+
+	def forget(self, source_file):
+		'''
+		Removes a source file from the manifest.
+
+		Args:
+		    source_file (string): Absolute path to the source file.
+
+		Returns:
+		    A list of outputs that the source file produced in the
+		    previous build.
+		'''
+		entry = self.sources.pop(source_file, None)
+		if entry is None:
+			return []
+		return entry['outputs']
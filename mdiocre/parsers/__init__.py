@@ -1,3 +1,6 @@
+from ..directives import compile_source, Template
+from ..hooks import phase
+
 def sub_func(match, v):
 	'''
 	Substitution function for use with `re.sub`.
@@ -12,16 +15,48 @@ def sub_func(match, v):
 	    Otherwise, it attempts to display the value of the variable
 	    described, by running it through :meth:`VariableManager.get`.
 	'''
-	statement = match.groups()[0]
+	return v.run(match.groups()[0])
 
-	try:
-		# variable = value
-		return v.assign(statement)
-	except SyntaxError as e:
-		# if it isn't an assign statement,
-		# get the variable name instead
-		#print(e)
-		return v.get(statement)
+def split_lines(chunks):
+	'''
+	Splits text given in pieces into lines, without joining the whole
+	text first.
+	
+	Args:
+	    chunks (iterable): Strings that make up the text, e.g. a file
+	        object or a list of lines.
+	
+	Returns:
+	    A generator of lines, without their line endings. It gives
+	    the same lines as ``"".join(chunks).split("\\n")``.
+	'''
+	rest = ''
+	for chunk in chunks:
+		if '\n' not in chunk:
+			rest += chunk
+			continue
+		lines = (rest + chunk).split('\n')
+		rest = lines.pop()
+		yield from lines
+	yield rest
+
+def join_lines(lines):
+	'''
+	Puts lines back together, one piece at a time.
+	
+	Args:
+	    lines (iterable): Lines without their line endings.
+	
+	Returns:
+	    A generator of strings, which give the same text as
+	    ``"\\n".join(lines)`` when joined.
+	'''
+	lines = iter(lines)
+	for line in lines:
+		yield line
+		break
+	for line in lines:
+		yield '\n' + line
 
 class BaseParser():
 	'''
@@ -29,18 +64,141 @@ class BaseParser():
 	be inheriting from. Even though this doesn't do much at the
 	moment...
 	'''
+	
+	# compiled regular expression whose first group is a MDiocre
+	# command, used by to_metadata. Parsers should set this.
+	RE_COMMENTS = None
+	
+	# whether stream_content converts a source line by line, so that
+	# it doesn't have to be in memory all at once.
+	STREAMING = False
+	
 	def to_variables(self, text, v, ignore_content=False):
 		'''
 		Converts a string to a :class:`VariableManager`
 		object. This should be reimplemented.
 		
+		Implementations should hand the work off to :meth:`to_metadata`
+		if `ignore_content` is True, instead of converting the text.
+		
 		Args:
 		    text (string): The source file from which to
 		        process and extract MDiocre commands from.
 		    v (VariableManager): The object to which the
 		        variables is processed and stored to.
+		    ignore_content (bool, Optional): If True, the ``content``
+		        variable is not set.
+		
+		Returns:
+		    A :class:`VariableManager` object.
+		'''
+		return v
+	
+	def to_metadata(self, text, v):
+		'''
+		Evaluates the MDiocre commands in a string in the order they
+		appear, without converting the markup. This is what
+		:meth:`to_variables` does when `ignore_content` is True.
+		
+		Commands are found with :attr:`RE_COMMENTS`. Parsers without it
+		fall back to ``to_variables(text, v, ignore_content=True)``.
+		
+		Args:
+		    text (string): The source file from which to
+		        process and extract MDiocre commands from.
+		    v (VariableManager): The object to which the
+		        variables is processed and stored to.
+		
+		Returns:
+		    A :class:`VariableManager` object.
+		'''
+		if self.RE_COMMENTS is None:
+			return self.to_variables(text, v, ignore_content=True)
+		
+		with phase('directives'):
+			compile_source(text, self.RE_COMMENTS).run(v)
+		
+		return v
+	
+	def render_lines(self, lines, v):
+		'''
+		Runs the MDiocre commands of a source in the order they appear,
+		a block of whole lines at a time. Commands can't span more than
+		one line, so this gives the same result as rendering the whole
+		source.
+		
+		Args:
+		    lines (iterable): Strings that make up the source, e.g. a
+		        file object.
+		    v (VariableManager): The object to which the
+		        variables is processed and stored to.
+		
+		Returns:
+		    A generator of strings that make up the source with its
+		    commands replaced.
+		'''
+		pattern = self.RE_COMMENTS
+		rest = ''
+		for chunk in lines:
+			block = rest + chunk
+			end = block.rfind('\n') + 1
+			if not end:
+				rest = block
+				continue
+			rest = block[end:]
+			block = block[:end]
+			if pattern.search(block) is not None:
+				block = Template(block, pattern).render(v)
+			yield block
+		if pattern.search(rest) is not None:
+			rest = Template(rest, pattern).render(v)
+		yield rest
+	
+	def stream_content(self, lines, v):
+		'''
+		Converts a source given in pieces, giving the converted content
+		in pieces as well. The MDiocre commands are run as they are met.
+		This should be reimplemented by parsers that can convert a source
+		line by line, which should also set :attr:`STREAMING`.
+		
+		By default, the whole source is converted at once with
+		:meth:`to_variables`.
+		
+		Args:
+		    lines (iterable): Strings that make up the source, e.g. a
+		        file object.
+		    v (VariableManager): The object to which the
+		        variables is processed and stored to.
+		
+		Returns:
+		    A generator of strings, which make up the ``content``
+		    variable when joined.
+		'''
+		self.to_variables(''.join(lines), v)
+		yield v.variables['content']
+	
+	def to_variables_stream(self, lines, v, ignore_content=False):
+		'''
+		Does the same as :meth:`to_variables`, for a source given in
+		pieces, e.g. a file object.
+		
+		Args:
+		    lines (iterable): Strings that make up the source.
+		    v (VariableManager): The object to which the
+		        variables is processed and stored to.
+		    ignore_content (bool, Optional): If True, the ``content``
+		        variable is not set, and the source is never held in
+		        memory all at once.
 		
 		Returns:
 		    A :class:`VariableManager` object.
 		'''
+		if ignore_content:
+			if self.RE_COMMENTS is None:
+				return self.to_variables(''.join(lines), v, ignore_content=True)
+			for line in self.render_lines(lines, v):
+				pass
+			return v
+		
+		v.variables['content'] = ''.join(self.stream_content(lines, v))
 		return v
@@ -1,138 +1,289 @@
 import re
-import random
-import xml.etree.ElementTree as ET
-from . import BaseParser, sub_func
+from . import BaseParser, split_lines, join_lines
+from ..directives import compile_source
+from ..hooks import phase
+
+P_ADD_RE         = re.compile(r'^(?!#|\*|>|```|=>)(.+)$')
+HEADINGS_RE      = re.compile(r'^(#{1,6})\s+(.+)$') # spec says mandatory space chara
+LINKS_RE         = re.compile(r'^=>\s*(\w+:?/?/?[^\s]+)(\s+(.+$))?')
+PREFORMATTED_RE  = re.compile(r'^```(.+)$')
+ULIST_RE         = re.compile(r'^\*\s+(.+)$')
+LINKS_INSIDE     = re.compile(r'\(=>\s*(\w+:?/?/?[^\s]+)(\s+(.+?))?\)')
+BLOCKQUOTE_RE    = re.compile(r'^>\s+(.+)$')
+
+def escape_text(text):
+	'''
+	Escapes text to be put inside an element, the same way ElementTree
+	serializes text.
+	'''
+	if '&' in text:
+		text = text.replace('&', '&amp;')
+	if '<' in text:
+		text = text.replace('<', '&lt;')
+	if '>' in text:
+		text = text.replace('>', '&gt;')
+	return text
+
+def escape_attribute(text):
+	'''
+	Escapes text to be put inside an attribute, the same way ElementTree
+	serializes HTML attributes.
+	'''
+	if '&' in text:
+		text = text.replace('&', '&amp;')
+	if '>' in text:
+		text = text.replace('>', '&gt;')
+	if '"' in text:
+		text = text.replace('"', '&quot;')
+	return text
+
+def keep_markup(raw, escaped):
+	'''
+	Gives a piece of converted Gemtext with the HTML inside it kept, the
+	way the old converter did: by reading it with ElementTree and
+	writing it back. If it isn't well-formed, it is escaped instead.
+	
+	Args:
+	    raw (string): The piece converted without escaping its text.
+	    escaped (string): The same piece, escaped.
+	
+	Returns:
+	    The converted piece.
+	'''
+	# only needed for pages with HTML in them
+	import xml.etree.ElementTree as ET
+	
+	try:
+		etr = ET.fromstring('<_doc_>%s</_doc_>' % raw)
+	except ET.ParseError:
+		return escaped
+	return ET.tostring(etr, encoding='unicode', method='html')[len('<_doc_>'):-len('</_doc_>')]
+
+def gen_link(link, text=None, escape=True):
+	link_str = '<a href="%s">%s</a>'
+	if escape:
+		link = escape_attribute(link)
+	if text:
+		return link_str % (link, convert_inline(text, escape))
+	# no unique txt
+	return link_str % (link, convert_inline(link, escape))
+
+def convert_inline(text, escape=True):
+	'''
+	Escapes a piece of text and turns the links inside it, written as
+	``(=> url text)``, into HTML links.
+	
+	Args:
+	    text (string): The text.
+	    escape (bool, Optional): If False, the text is left as it is,
+	        see :func:`keep_markup`.
+	
+	Returns:
+	    The converted text.
+	'''
+	if escape:
+		quote = escape_text
+	else:
+		quote = lambda text: text
+	
+	if '(=>' not in text:
+		return quote(text)
+	
+	out = []
+	start = 0
+	for match in LINKS_INSIDE.finditer(text):
+		out.append(quote(text[start:match.start()]))
+		out.append(gen_link(match.group(1), match.group(3), escape))
+		start = match.end()
+	out.append(quote(text[start:]))
+	return ''.join(out)
 
 class GemParser(BaseParser):
 	'''
 	Gemtext parser. Comments are parsed the same way as Zim does
+	
+	Lines are converted in a single pass, looking at how each one begins
+	to find out what it is. Text is escaped as it is put out, except in
+	lines (and preformatted blocks) with a ``<`` or ``&`` in them: these
+	can have HTML in them, e.g. from an ``Include:`` command, which is
+	kept if it is well-formed (see :func:`keep_markup`).
 	'''
 	
 	FILETYPES = ["gmi", "gem"]
-
+	
 	RE_COMMENTS = re.compile(r'\[mdiocre:(.+?)\]')
 	
-	def convert_markup(self, markup):
+	STREAMING = True
+	
+	def convert_lines(self, lines, end=None):
+		'''
+		Converts Gemtext to HTML line by line.
+		
+		Args:
+		    lines (iterable): The lines of Gemtext, without their line
+		        endings.
+		    end (list, Optional): If set, the tags needed to close a
+		        list or a preformatted block left open at the end are
+		        added to it.
+		
+		Returns:
+		    A generator of the converted lines.
+		'''
+		list_mode = False
+		
+		# lines of the current preformatted block, held back until the
+		# block is closed, which is where its alt text is
+		pre_block = None
+		
 		# read line by line
-		MARKUP = markup.split('\n')
-		P_ADD_RE         = re.compile(r'^(?!#|\*|>|```|=>)(.+)$')
-		HEADINGS_RE      = re.compile(r'^(#{1,6})\s+(.+)$') # spec says mandatory space chara
-		LINKS_RE         = re.compile(r'^=>\s*(\w+:?/?/?[^\s]+)(\s+(.+$))?')
-		PREFORMATTED_RE  = re.compile(r'^```(.+)$')
-		ULIST_RE         = re.compile(r'^\*\s+(.+)$')
-		LINKS_INSIDE     = re.compile(r'\(=>\s*(\w+:?/?/?[^\s]+)(\s+(.+?))?\)') 
-		BLOCKQUOTE_RE    = re.compile(r'^>\s+(.+)$')
-		
-		output_markup = []
-		lists_mode = {
-			'ul': False,
-			'ol': False
-		}
-		pre_mode = False
-		cur_code_hash = ''
-		code_alts = {}
-		
-		def make_code_hash():
-			new_key = '__code__'
-			for i in random.randbytes(32):
-				new_key += hex(i)[2:]
-			return new_key
-		
-		for i in range(len(MARKUP)):
-			line = MARKUP[i]
+		for line in lines:
+			first = line[:1]
+			
+			if pre_block is not None: # preformatted text
+				if line.startswith('```') and len(line) > 3:
+					yield from self.convert_pre(pre_block, line[3:]).split('\n')
+					pre_block = None
+				else:
+					pre_block.append(line)
+				continue
 			
-			if not pre_mode: # standard text
-				# add paragraph tags
-				if re.search(P_ADD_RE, line):
-					line = '<p>' + line + '</p>'
-				
-				# add header tags
-				line = re.sub(HEADINGS_RE,
-					lambda a: "<h%d>%s</h%d>" % (len(a.group(1)), a.group(2), len(a.group(1))),
-					line
-				)
-				
-				# add blockquotes
-				line = re.sub(BLOCKQUOTE_RE,
-					lambda a: "<blockquote>%s</blockquote>" % (a.group(1)),
-					line
-				)
-				
-				is_list_or_link_set = (bool(re.match(ULIST_RE, line)) or bool(re.match(LINKS_RE, line)))
-				
-				# lists
-				if re.match(ULIST_RE, line):
-					if not lists_mode['ul']:
-						lists_mode['ul'] = True
-						output_markup.append('<ul>')
-					line = re.sub(ULIST_RE,
-						lambda a: "<li>%s</li>" % (a.group(1)),
-						line
-					)
-				
-				if not is_list_or_link_set:
-					if lists_mode['ul']:
-						lists_mode['ul'] = False
-						output_markup.append('</ul>')
-				
-				# links
-				def gen_link(result):
-					link_str = '<a href="%s">%s</a>'
-					if result.group(3):
-						return link_str % (result.group(1), result.group(3))
-					# no unique txt
-					return link_str % (result.group(1), result.group(1))
-				
+			# standard text
+			list_item = ULIST_RE.match(line) if first == '*' else None
+			link = LINKS_RE.match(line) if first == '=' else None
+			
+			if list_item is None and link is None:
+				if list_mode:
+					list_mode = False
+					yield '</ul>'
+			elif not list_mode:
+				list_mode = True
 				# links on its own is treated like lists
-				if re.match(LINKS_RE, line):
-					if not lists_mode['ul']:
-						lists_mode['ul'] = True
-						output_markup.append('<ul class="gemtext-links">')
-					line = "<li>%s</li>" % (re.sub(LINKS_RE, gen_link, line))
-				
-				line = re.sub(LINKS_INSIDE, gen_link, line)
-				
-				if re.match(PREFORMATTED_RE, line):
-					cur_code_hash = make_code_hash()
-					line = '<pre alt="%s"><code>' % (cur_code_hash)
-					pre_mode = True
-				
-				if False: # comment out this line to literally render blank lines as <br>
-					if len(line.strip()) == 0:
-						line = '<br>'
-			else: # preformatted text
-				code_end = re.match(PREFORMATTED_RE, line)
-				if code_end:
-					line = '</code></pre>'
-					pre_mode = False
-					if code_end.group(1):
-						code_alts[cur_code_hash] = code_end.group(1)
+				yield '<ul>' if link is None else '<ul class="gemtext-links">'
+			
+			if first == '`' and len(line) > 3 and line.startswith('```'):
+				pre_block = []
+				continue
+			
+			converted = self.convert_line(line, list_item, link)
+			if '<' in line or '&' in line:
+				converted = keep_markup(self.convert_line(line, list_item, link, escape=False), converted)
 			
-			output_markup.append(line)
-		output_str = '\n'.join(output_markup)
+			yield converted
+		
+		if pre_block is not None:
+			yield '<pre alt=""><code>'
+			for line in pre_block:
+				yield escape_text(line)
+			if end is not None:
+				end.append('</code></pre>')
+		elif list_mode and end is not None:
+			end.append('</ul>')
+	
+	def convert_line(self, line, list_item=None, link=None, escape=True):
+		'''
+		Converts a line of Gemtext that isn't in a preformatted block.
+		
+		Args:
+		    line (string): The line.
+		    list_item (re.Match, Optional): The line matched against
+		        ``ULIST_RE``, if it is a list item.
+		    link (re.Match, Optional): The line matched against
+		        ``LINKS_RE``, if it is a link.
+		    escape (bool, Optional): See :func:`convert_inline`.
+		
+		Returns:
+		    The converted line.
+		'''
+		first = line[:1]
+		
+		if list_item is not None:
+			return '<li>%s</li>' % (convert_inline(list_item.group(1), escape))
+		if link is not None:
+			return '<li>%s%s</li>' % (
+				gen_link(link.group(1), link.group(3), escape),
+				convert_inline(line[link.end():], escape)
+			)
+		if first == '#':
+			heading = HEADINGS_RE.match(line)
+			if heading:
+				level = len(heading.group(1))
+				return '<h%d>%s</h%d>' % (level, convert_inline(heading.group(2), escape), level)
+		elif first == '>':
+			quote = BLOCKQUOTE_RE.match(line)
+			if quote:
+				return '<blockquote>%s</blockquote>' % (convert_inline(quote.group(1), escape))
+		elif P_ADD_RE.match(line):
+			# add paragraph tags
+			return '<p>' + convert_inline(line, escape) + '</p>'
+		return convert_inline(line, escape)
+	
+	def convert_pre(self, lines, alt):
+		'''
+		Converts a preformatted block.
 		
-		# resolve code alt text
-		for key, value in code_alts.items():
-			output_str = output_str.replace(key, value)
+		Args:
+		    lines (list): The lines inside the block.
+		    alt (string): The alt text, from the closing fence.
 		
-		return output_str
+		Returns:
+		    The converted block.
+		'''
+		# attribute values have their tabs turned into spaces when they
+		# are read as XML, so they still are
+		escaped = '\n'.join(
+			['<pre alt="%s"><code>' % (escape_attribute(alt.replace('\t', ' ')))] +
+			[escape_text(line) for line in lines] +
+			['</code></pre>']
+		)
+		if '<' in alt or '&' in alt or any('<' in line or '&' in line for line in lines):
+			raw = '\n'.join(['<pre alt="%s"><code>' % (alt)] + lines + ['</code></pre>'])
+			return keep_markup(raw, escaped)
+		return escaped
+	
+	def content_lines(self, lines):
+		'''
+		Converts Gemtext to the lines of the ``content`` variable. The
+		first and last lines are left out, as they have always been
+		(they used to hold the root element used for escaping).
+		
+		Args:
+		    lines (iterable): The lines of Gemtext, without their line
+		        endings.
+		
+		Returns:
+		    A generator of the converted lines.
+		'''
+		end = []
+		converted = self.convert_lines(lines, end)
+		next(converted, None)
+		
+		last = None
+		for line in converted:
+			if last is not None:
+				yield last
+			last = line
+		
+		yield from end
+	
+	def convert_markup(self, markup):
+		end = []
+		lines = list(self.convert_lines(markup.split('\n'), end))
+		return '\n'.join(lines + end)
+	
+	def stream_content(self, lines, v):
+		return join_lines(self.content_lines(split_lines(self.render_lines(lines, v))))
 	
 	def to_variables(self, html, v, ignore_content=False):
-		def trf_sub_func(match):
-			return sub_func(match, v)
+		if ignore_content:
+			return self.to_metadata(html, v)
 		
 		# do substitution...
-		gmitxt = re.sub(self.RE_COMMENTS, trf_sub_func, html)
-		
-		html = self.convert_markup(gmitxt)
-		# escape all text
-		etr = ET.fromstring("<_doc_>%s</_doc_>" % html)
-		html = '\n'.join(
-			ET.tostring(etr, encoding='unicode', method='html')\
-			.split('\n')[1:-1]
-		)
+		with phase('directives'):
+			gmitxt = compile_source(html, self.RE_COMMENTS).render(v)
+		
+		with phase('convert'):
+			html = '\n'.join(self.content_lines(gmitxt.split('\n')))
+		
+		v.variables["content"] = html
 		
-		if not ignore_content:
-			v.variables["content"] = html
-			
 		return v
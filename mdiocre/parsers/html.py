@@ -1,5 +1,7 @@
 import re
-from . import BaseParser, sub_func
+from . import BaseParser
+from ..directives import compile_source
+from ..hooks import phase
 
 class HtmlParser(BaseParser):
 	'''
@@ -11,13 +13,19 @@ class HtmlParser(BaseParser):
 
 	RE_COMMENTS = re.compile(r'<!--:(.+?)-->')
 	
+	STREAMING = True
+	
+	def stream_content(self, lines, v):
+		# the content is the source with its commands replaced
+		return self.render_lines(lines, v)
+	
 	def to_variables(self, html, v, ignore_content=False):
-		def trf_sub_func(match):
-			return sub_func(match, v)
+		if ignore_content:
+			return self.to_metadata(html, v)
 		
-		html = re.sub(self.RE_COMMENTS, trf_sub_func, html)
+		with phase('directives'):
+			html = compile_source(html, self.RE_COMMENTS).render(v)
 		
-		if not ignore_content:
-			v.variables["content"] = html
+		v.variables["content"] = html
 			
 		return v
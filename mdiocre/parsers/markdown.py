@@ -1,7 +1,10 @@
 # fallback
 
 import re
-from . import BaseParser, sub_func
+import threading
+from . import BaseParser
+from ..directives import compile_source
+from ..hooks import phase
 from markdown import Markdown
 from mdx_gfm import GithubFlavoredMarkdownExtension
 
@@ -9,21 +12,61 @@ class MarkdownParser(BaseParser):
 	'''
 	In Markdown, MDiocre commands are HTML comments prefixed
 	with ``<!--:``.
+	
+	Setting up Python-Markdown takes longer than converting a small
+	page, so each thread keeps its own configured :class:`Markdown`
+	object and resets it between pages.
+	
+	Args:
+	    extensions (list, Optional): Markdown extensions to use, as
+	        extension names (e.g. ``"toc"``), classes or objects. Names
+	        and classes get a new extension object for every thread.
+	        Defaults to GitHub-Flavored Markdown.
+	    extension_configs (dict, Optional): Settings for the extensions
+	        given by name, see the Python-Markdown documentation.
 	'''
 	
 	FILETYPES = ["md"]
 	
 	RE_COMMENTS = re.compile(r'<!--:(.+?)-->')
 	
+	DEFAULT_EXTENSIONS = (GithubFlavoredMarkdownExtension,)
+	
+	def __init__(self, extensions=None, extension_configs=None):
+		if extensions is None:
+			extensions = self.DEFAULT_EXTENSIONS
+		self.extensions = list(extensions)
+		self.extension_configs = dict(extension_configs or {})
+		self.local = threading.local()
+	
+	def engine(self):
+		'''
+		Gets this thread's Markdown object, making it if needed.
+		
+		Returns:
+		    A :class:`markdown.Markdown` object, reset and ready to
+		    convert a new page.
+		'''
+		md = getattr(self.local, 'markdown', None)
+		if md is None:
+			md = Markdown(
+				extensions=[i() if isinstance(i, type) else i for i in self.extensions],
+				extension_configs=self.extension_configs
+			)
+			self.local.markdown = md
+			return md
+		return md.reset()
+	
 	def to_variables(self, markdown, v, ignore_content=False):
-		def conv_sub_func(match):
-			return sub_func(match, v)
+		if ignore_content:
+			return self.to_metadata(markdown, v)
 		
-		markdown = re.sub(self.RE_COMMENTS, conv_sub_func, markdown)
+		with phase('directives'):
+			markdown = compile_source(markdown, self.RE_COMMENTS).render(v)
 		
-		html = Markdown(extensions=[GithubFlavoredMarkdownExtension()]).convert(markdown)
+		with phase('convert'):
+			html = self.engine().convert(markdown)
 		
-		if not ignore_content:
-			v.variables["content"] = html
+		v.variables["content"] = html
 		
 		return v
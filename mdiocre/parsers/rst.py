@@ -1,8 +1,19 @@
 import re
+import copy
+import hashlib
+import threading
+import warnings
+from collections import OrderedDict
 from . import BaseParser
+from ..directives import compile_command, Get, SOURCE_CACHE_LIMIT
+from ..hooks import phase
 import docutils.core
+import docutils.io
+import docutils.utils
+import docutils.frontend as frontend
 import docutils.nodes as nodes
 import docutils.parsers.rst as rst
+import docutils.readers.standalone as standalone
 from docutils.writers import html4css1
 
 class CustomHTMLTranslator(html4css1.HTMLTranslator):
@@ -47,35 +58,202 @@ class CustomHTMLWriter(html4css1.Writer):
 		html4css1.Writer.__init__(self)
 		self.translator_class = CustomHTMLTranslator
 
+# what the mdiocre role does with the commands of the document being
+# converted in this thread, see RstParser.publish
+_role_state = threading.local()
+
+def mdiocre_role(role, rawtext, text, lineno, inliner, options={}, content=[]):
+	'''
+	The custom ``:mdiocre:`` RST role. It is registered only once, and
+	hands its commands to the parser converting the current document.
+	'''
+	return [nodes.Text(_role_state.handler(text))],[]
+
+rst.roles.register_local_role('mdiocre', mdiocre_role)
+
+def run_role_command(text, v):
+	'''
+	Runs the command of a ``:mdiocre:`` role.
+	
+	Args:
+	    text (string): The text of the role.
+	    v (VariableManager): target variable manager object
+	
+	Returns:
+	    The text to put in the document.
+	'''
+	command = compile_command(text.strip())
+	var_txt = command.run(v)
+	if not isinstance(command, Get):
+		# only getting a variable puts text in the document
+		var_txt = ''
+	return var_txt
+
 class RstParser(BaseParser):
 	'''
 	In ReStructuredText, MDiocre commands are its' own
 	RST role, "mdiocre".
+	
+	The docutils settings are worked out once, and every thread keeps
+	its own reader, parser and writer.
+	
+	Converted documents are cached by the hash of their source, along
+	with the commands of their roles and the text each one gave. When
+	the same source comes again (e.g. when only its template changed),
+	the commands are run again and the cached HTML is used if they give
+	the same text, without parsing the RST again.
+	
+	Args:
+	    cache_size (int, Optional): Number of converted documents to
+	        keep around.
 	'''
 	
 	FILETYPES = ["rst"]
 	
-	# this doesn't match the roles matcher
-	RE_COMMENTS = re.compile(r':mdiocre:`(.*?)`')
+	def __init__(self, cache_size=128):
+		self.cache_size = cache_size
+		self.cache = OrderedDict()
+		self.local = threading.local()
+		
+		# the same settings publish_parts would come up with
+		with warnings.catch_warnings():
+			warnings.filterwarnings('ignore', category=DeprecationWarning)
+			self.settings = frontend.OptionParser(
+				components=(rst.Parser, standalone.Reader, CustomHTMLWriter),
+				defaults={'traceback': True},
+				read_config_files=True
+			).get_default_values()
 	
-	def to_variables(self, markup, v, ignore_content=False):
-		# custom mdiocre rst role
-		def mdiocre_role(role, rawtext, text, lineno, inliner, options={}, content=[]):
-			command = text.strip()
-			var_txt = ''
+	def publish(self, markup, handler, write=True):
+		'''
+		Converts a RST document to HTML.
+		
+		Args:
+		    markup (string): The RST document.
+		    handler (func): Function called with the text of every
+		        ``:mdiocre:`` role, returning the text to put in its place.
+		    write (bool, Optional): If False, the document is only
+		        parsed, which is where the roles are run.
+		
+		Returns:
+		    The ``html_body`` part of the document, or None if `write`
+		    is False.
+		'''
+		local = self.local
+		if not hasattr(local, 'writer'):
+			local.parser = rst.Parser()
+			local.reader = standalone.Reader(parser=local.parser)
+			local.writer = CustomHTMLWriter()
+		
+		settings = copy.copy(self.settings)
+		settings.record_dependencies = docutils.utils.DependencyList()
+		
+		if not write:
+			source = docutils.io.StringInput(
+				source=markup, source_path=settings._source,
+				encoding=settings.input_encoding,
+				error_handler=settings.input_encoding_error_handler
+			)
+			_role_state.handler = handler
 			try:
-				# variable = value
-				v.assign(command)
-			except SyntaxError:
-				# if it isn't an assign statement,
-				# get the variable name instead
-				var_txt = v.get(command)
-			return [nodes.Text(var_txt)],[]
+				local.reader.read(source, local.parser, settings)
+			finally:
+				_role_state.handler = None
+			return None
+		
+		publisher = docutils.core.Publisher(
+			local.reader, local.parser, local.writer, settings=settings,
+			source_class=docutils.io.StringInput,
+			destination_class=docutils.io.StringOutput
+		)
+		publisher.set_source(markup, None)
+		publisher.set_destination(None, None)
+		
+		_role_state.handler = handler
+		try:
+			publisher.publish()
+		finally:
+			_role_state.handler = None
+		
+		return publisher.writer.parts['html_body']
+	
+	def cache_key(self, markup):
+		'''
+		Gets the key of a document in :attr:`cache`, or None if it is too
+		large to be cached.
+		'''
+		if len(markup) > SOURCE_CACHE_LIMIT:
+			return None
+		return hashlib.sha1(markup.encode('utf-8', 'surrogatepass')).digest()
+	
+	def to_metadata(self, markup, v):
+		'''
+		Runs the commands of the ``:mdiocre:`` roles the same way a
+		conversion would, without writing HTML: the document is parsed by
+		docutils, so roles it doesn't run (e.g. inside literal blocks and
+		comments) aren't run either. If the document was converted
+		before, the commands of its roles are run again without parsing.
+		
+		Args:
+		    markup (string): The RST document.
+		    v (VariableManager): The object to which the
+		        variables is processed and stored to.
+		
+		Returns:
+		    A :class:`VariableManager` object.
+		'''
+		key = self.cache_key(markup)
+		cached = self.cache.get(key) if key is not None else None
+		if cached is not None:
+			with phase('directives'):
+				for text in cached[0]:
+					run_role_command(text, v)
+			return v
 		
-		rst.roles.register_local_role('mdiocre', mdiocre_role)
+		def handler(text):
+			with phase('directives'):
+				return run_role_command(text, v)
+		
+		with phase('convert'):
+			self.publish(markup, handler, write=False)
+		
+		return v
+	
+	def to_variables(self, markup, v, ignore_content=False):
+		if ignore_content:
+			return self.to_metadata(markup, v)
+		
+		key = self.cache_key(markup)
+		cached = self.cache.get(key) if key is not None else None
+		if cached is not None:
+			roles, texts, html = cached
+			
+			# run the commands in the order docutils ran them
+			with phase('directives'):
+				new_texts = [run_role_command(i, v) for i in roles]
+			if new_texts == texts:
+				self.cache.move_to_end(key)
+				v.variables["content"] = html
+				return v
+			
+			# the document has to be converted again, but the
+			# commands must not be run twice
+			replay = iter(new_texts)
+			def handler(text):
+				return next(replay)
+		else:
+			roles = []
+			new_texts = []
+			def handler(text):
+				with phase('directives'):
+					var_txt = run_role_command(text, v)
+				roles.append(text)
+				new_texts.append(var_txt)
+				return var_txt
 		
 		# write html
-		html = docutils.core.publish_parts(markup, writer=CustomHTMLWriter())['html_body']
+		with phase('convert'):
+			html = self.publish(markup, handler)
 		
 		# TODO: Write a custom HTML writer for this
 		end_tag = '</div>'
@@ -83,7 +261,12 @@ class RstParser(BaseParser):
 		html = html[:len(end_tag)*-1-1]
 		html = html.strip()
 		
-		if not ignore_content:
-			v.variables["content"] = html
+		if key is not None:
+			self.cache[key] = (roles, new_texts, html)
+			self.cache.move_to_end(key)
+			while len(self.cache) > self.cache_size:
+				self.cache.popitem(last=False)
+		
+		v.variables["content"] = html
 		
 		return v
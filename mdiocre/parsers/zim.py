@@ -12,194 +12,256 @@ them, raw html needs to have a !!! line before and after them.
 '''
 from os import path as osp
 import re
-from . import BaseParser, sub_func
+from . import BaseParser, split_lines, join_lines
+from ..directives import compile_source
+from ..hooks import phase
+
+# what kind of line it is: a header line (which is left out), a pre
+# block delimiter, a raw HTML block delimiter or anything else
+LINE_RE = re.compile(r"^(?:(Content-Type|Wiki-Format|Creation-Date)|('''\s*$)|(!!!\s*$))")
+LINE_HEADER, LINE_PRE, LINE_HTML = 1, 2, 3
+
+P_ADD_RE = re.compile(r'^[^=\*\s]')
+
+# every piece of inline markup begins with one of these, so a line
+# only goes through the substitutions of the markup it has
+INLINE_RE = re.compile(r"\[\[|\{\{|''|\*\*|//|__|~~")
+
+LINK_RE = re.compile(r'\[\[(?!\[)((.*?)\|(.*?)|(.*?))\]\]')
+IMG_RE = re.compile(r'\{\{(.*?)\?(.*?)\}\}|\{\{(.*?)\}\}')
+URL_RE = re.compile(r'^\w+://')
+
+# (what it begins with, Zim RE, replacement), in the order they are done
+TAGS_AROUND = [
+	(start, re.compile(re_), r'<{0}>\g<1></{0}>'.format(tag))
+	for tag, start, re_ in (
+		('code'  , "''", r"''(?!')(.+?)''"),
+		('strong', '**', r'\*\*(?!\*)(.*?)\*\*'),
+		('em'    , '//', r"//(?!/)(.*?)(?<!:)//"),
+		('u'     , '__', r"__(?!_)(.*?)__"),
+		('del'   , '~~', r"~~(?!~)(.+?)~~"),
+	)
+]
+
+HEADERS_AROUND = [
+	(re.compile('{0} (.*?) {0}$'.format(markup)), r'<{0}>\g<1></{0}>'.format(tag))
+	for tag, markup in (
+		('h1', "======"),
+		('h2', "====="),
+		('h3', "===="),
+		('h4', "==="),
+		('h5', "=="),
+	)
+]
+
+def link_sub(match):
+	pipe_txt = match.groups()[2]
+	
+	link_out = '<a href="{}">{}</a>'
+	
+	if pipe_txt:
+		link = match.groups()[1]
+	else:
+		link = match.groups()[0]
+	
+	if not URL_RE.search(link.lower()):
+		if osp.splitext(link)[-1] == '':
+			link = link + '.html'
+		if link.startswith('+'):
+			link = link[1:]
+	#elif link.startswith(':'):
+	#	link = '../' + link[1:]
+	
+	if pipe_txt:
+		return link_out.format(
+			link,
+			pipe_txt
+		)
+	else:
+		return link_out.format(
+			link,
+			link
+		)
+
+def img_sub(match):
+	img_src = match.groups()[2]
+	
+	img_out = '<img src="{}" {} />'
+	
+	if img_src:
+		return img_out.format(
+			img_src,
+			''
+		)
+	else:
+		return img_out.format(
+			match.groups()[0],
+			match.groups()[1]
+		)
 
 class ZimParser(BaseParser):
 	'''
 	Zim wiki markup parser.
+	
+	Every line is looked at once: it is first classified with a single
+	regular expression, then a single scan finds out which kinds of
+	inline markup it has, and only those substitutions are done.
 	'''
 	
 	FILETYPES = ["zim", "zimtxt"]
 	
 	RE_COMMENTS = re.compile(r'\[mdiocre:(.+?)\]')
 	
+	STREAMING = True
+	
+	def convert_line(self, line):
+		'''
+		Converts a line outside of pre and raw HTML blocks, up to (but
+		not including) lists and basic markup.
+		
+		Args:
+		    line (string): A line of Zim markup.
+		
+		Returns:
+		    A tuple of the converted line and the set of inline markup
+		    beginnings it has left, see :data:`INLINE_RE`.
+		'''
+		# escape chars
+		line = line.replace('<', '&lt;')\
+			.replace('>', '&gt;')
+		
+		# special chars
+		line = line.replace('©', '&copy;')\
+			.replace('®', '&reg;')\
+			.replace('™', '&trade;')
+		
+		# add paragraph tags
+		if P_ADD_RE.search(line):
+			line = '<p>' + line
+			line += '</p>'
+		
+		inline = set(INLINE_RE.findall(line))
+		
+		if '[[' in inline or '{{' in inline:
+			# links
+			# no automatic url matching for now
+			line, links = LINK_RE.subn(link_sub, line)
+			
+			# images
+			line, images = IMG_RE.subn(img_sub, line)
+			
+			# links and images can bring in more markup, e.g. the // of
+			# an URL, so the line has to be looked at again
+			if links or images:
+				inline = set(INLINE_RE.findall(line))
+		
+		return line, inline
+	
 	def convert_markup(self, markup):
-		# read line by line
-		MARKUP = markup.split('\n')
-		
-		P_ADD_RE = re.compile(r'^[^=\*\s]')
-		
-		TAGS_AROUND = {
-		# Zim RE's
-			'code': "''(?!')(.+?)''",
-			'strong'  : '\*\*(?!\*)(.*?)\*\*',
-			'em'  : "//(?!/)(.*?)(?<!:)//",
-			'u'  : "__(?!_)(.*?)__",
-			'del': "~~(?!~)(.+?)~~"
-		}
-		
-		HEADERS_AROUND = {
-			'h1': "======",
-			'h2': "=====",
-			'h3': "====",
-			'h4': "===",
-			'h5': "=="
-		}
-		
-		LINK_RE = re.compile(r'\[\[(?!\[)((.*?)\|(.*?)|(.*?))\]\]')
-		IMG_RE = re.compile(r'\{\{(.*?)\?(.*?)\}\}|\{\{(.*?)\}\}')
-		PRE_RE = re.compile(r"^'''\s*$")
-		HTML_RE = re.compile(r"^!!!\s*$")
+		return '\n'.join(self.convert_lines(markup.split('\n')))
+	
+	def convert_lines(self, lines):
+		'''
+		Converts Zim markup line by line.
+		
+		Args:
+		    lines (iterable): The lines of Zim markup, without their
+		        line endings.
 		
+		Returns:
+		    A generator of the converted lines.
+		'''
 		pre_flag = False
 		html_flag = False
 		ul_flag = False
 		output_markup = []
 		
-		def link_sub(match):
-			pipe_txt = match.groups()[2]
-			
-			link_out = '<a href="{}">{}</a>'
-			
-			if pipe_txt:
-				link = match.groups()[1]
-			else:
-				link = match.groups()[0]
-		
-			if not re.search(r'^\w+://', link.lower()):
-				if osp.splitext(link)[-1] == '':
-					link = link + '.html'
-				if link.startswith('+'):
-					link = link[1:]
-			#elif link.startswith(':'):
-			#	link = '../' + link[1:]
-			
-			if pipe_txt:
-				return link_out.format(
-					link,
-					pipe_txt
-				)
-			else:
-				return link_out.format(
-					link,
-					link
-				)
+		# filter out empty lines, except inside a <pre> block. this
+		# goes by the lines put out, including those of raw HTML
+		pre_mode = False
+		def add(line):
+			nonlocal pre_mode
+			if line == '<pre>':
+				pre_mode = True
+			elif line == '</pre>':
+				pre_mode = False
+			if pre_mode or (line and not line.isspace()):
+				output_markup.append(line)
 		
-		def img_sub(match):
-			img_src = match.groups()[2]
+		# read line by line
+		for line in lines:
+			# hand out whatever the last line put out
+			if output_markup:
+				yield from output_markup
+				output_markup.clear()
 			
-			img_out = '<img src="{}" {} />'
+			kind = LINE_RE.match(line)
+			kind = kind.lastindex if kind else None
 			
-			if img_src:
-				return img_out.format(
-					img_src,
-					''
-				)
-			else:
-				return img_out.format(
-					match.groups()[0],
-					match.groups()[1]
-				)
-		
-		for i in range(len(MARKUP)):
-			line = MARKUP[i]
-			# don't parse header lines
-			if not re.search(r'^(Content-Type|Wiki-Format|Creation-Date)', line):
-				if re.match(PRE_RE, line):
-					pre_flag = not(pre_flag)
-					if pre_flag:
-						output_markup.append('<pre>')
-					else:
-						output_markup.append('</pre>')
-				elif re.match(HTML_RE, line):
-					html_flag = not(html_flag)
+			if kind == LINE_HEADER:
+				# don't parse header lines
+				continue
+			elif kind == LINE_PRE:
+				pre_flag = not(pre_flag)
+				if pre_flag:
+					add('<pre>')
 				else:
-					if pre_flag:
-						# don't process anything if we're in
-						# pre mode, except to replace HTML chars
-						# with escape chars
-						line = line.replace('<', '&lt;')\
-							.replace('>', '&gt;')
-					elif html_flag:
-						# absolutely don't process anything
-						pass
-					else:
-						# do processing
-						
-						# escape chars
-						line = line.replace('<', '&lt;')\
-							.replace('>', '&gt;')
-						
-						# special chars
-						line = line.replace('©', '&copy;')\
-							.replace('®', '&reg;')\
-							.replace('™', '&trade;')
-						
-						# add paragraph tags
-						if re.search(P_ADD_RE, line):
-							line = '<p>' + line
-							line += '</p>'
-						
-						# links
-						# no automatic url matching for now
-						line = re.sub(LINK_RE, link_sub, line)
-						
-						# images
-						line = re.sub(IMG_RE, img_sub, line)
-						
-						# unordered lists
-						if re.match("^\* ", line):
-							if not ul_flag:
-								ul_flag = True
-								output_markup.append('<ul>')
-							line = re.sub("^\* (.*?)$", '<li>\g<1></li>', line)
-						else:
-							if ul_flag:
-								ul_flag = False
-								output_markup.append('</ul>')
-						
-						
-						# basic markup
-						for tag, re_ in TAGS_AROUND.items():
-							line = re.sub(
-								re_,
-								'<{0}>\g<1></{0}>'.format(tag),
-								line
-								)
-						
-						# header markup
-						for tag, markup in HEADERS_AROUND.items():
-							line = re.sub(
-								'{0} (.*?) {0}$'.format(markup),
-								'<{0}>\g<1></{0}>'.format(tag),
-								line
-								)
-					output_markup.append(line)
-		
-		# lists are mutable in python
-		# filter out empty lines, except inside a <pre> block
-		pre_mode = [False]
-		def not_empty(line, pre_mode):
-			if line == '<pre>':
-				pre_mode[0] = True
-			elif line == '</pre>':
-				pre_mode[0] = False
-			if pre_mode[0]:
-				return True
+					add('</pre>')
+			elif kind == LINE_HTML:
+				html_flag = not(html_flag)
+			elif pre_flag:
+				# don't process anything if we're in
+				# pre mode, except to replace HTML chars
+				# with escape chars
+				add(line.replace('<', '&lt;').replace('>', '&gt;'))
+			elif html_flag:
+				# absolutely don't process anything
+				add(line)
 			else:
-				return not re.match(r'^\s*$', line)
+				# do processing
+				line, inline = self.convert_line(line)
+				
+				# unordered lists
+				if line.startswith('* '):
+					if not ul_flag:
+						ul_flag = True
+						add('<ul>')
+					line = '<li>' + line[2:] + '</li>'
+				else:
+					if ul_flag:
+						ul_flag = False
+						add('</ul>')
+				
+				# basic markup
+				if inline:
+					for start, re_, tag in TAGS_AROUND:
+						if start in inline:
+							line = re_.sub(tag, line)
+				
+				# header markup
+				if line.endswith('=='):
+					for re_, tag in HEADERS_AROUND:
+						line = re_.sub(tag, line)
+				
+				add(line)
 		
-		return '\n'.join(filter(lambda line: not_empty(line, pre_mode), output_markup))
+		yield from output_markup
+	
+	def stream_content(self, lines, v):
+		# lines are split again after the commands are run, as
+		# variables can have more than one line
+		return join_lines(self.convert_lines(split_lines(self.render_lines(lines, v))))
 	
 	def to_variables(self, zimtxt, v, ignore_content=False):
-		def conv_sub_func(match):
-			return sub_func(match, v)
+		if ignore_content:
+			return self.to_metadata(zimtxt, v)
 		
-		zimtxt = re.sub(self.RE_COMMENTS, conv_sub_func, zimtxt)
+		with phase('directives'):
+			zimtxt = compile_source(zimtxt, self.RE_COMMENTS).render(v)
 		
-		html = self.convert_markup(zimtxt)
+		with phase('convert'):
+			html = self.convert_markup(zimtxt)
 		
-		if not ignore_content:
-			v.variables["content"] = html
+		v.variables["content"] = html
 		
 		return v
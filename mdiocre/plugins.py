@@ -0,0 +1,381 @@
+import os
+import sys
+import ast
+import json
+import hashlib
+import logging
+import importlib
+import importlib.util
+import traceback
+from .__meta__ import __version__
+
+'''
+Finds the parsers MDiocre can use: its own, and those of plugins
+'''
+
+logger = logging.getLogger('mdiocre.plugins')
+
+# log levels
+log_error = logging.ERROR
+
+# plugins declare their parsers in this entry point group, e.g. in setup.py:
+#     entry_points={'mdiocre.parsers': ['fmt = mdiocre_fmt.parsers.fmt:FmtParser']}
+ENTRY_POINT_GROUP = 'mdiocre.parsers'
+
+# bump this when the cache's contents change
+CACHE_FORMAT = 2
+
+def cache_file():
+	'''
+	Gets the path of the file where the parsers found are cached. It is
+	in ``$XDG_CACHE_HOME/mdiocre``, or ``~/.cache/mdiocre``.
+
+	Returns:
+	    The path to the file.
+	'''
+	cache_dir = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+	return os.path.join(cache_dir, 'mdiocre', 'parsers.json')
+
+def fingerprint(paths):
+	'''
+	Sums up what the parsers found depend on: the Python and MDiocre
+	versions, and the modification time of some directories and of
+	MDiocre's parsers directory. Installing, upgrading or removing a
+	distribution changes the directory it is installed to, so the cache
+	is thrown away when that happens.
+
+	Args:
+	    paths (list): The directories, usually from ``sys.path``.
+
+	Returns:
+	    A string.
+	'''
+	h = hashlib.sha1()
+	h.update(sys.version.encode('utf-8'))
+	h.update(__version__.encode('utf-8'))
+	for path in list(paths) + [os.path.join(os.path.dirname(__file__), 'parsers')]:
+		try:
+			mtime = os.stat(path or '.').st_mtime_ns
+		except OSError:
+			mtime = None
+		h.update('{}\0{}\0'.format(path, mtime).encode('utf-8', 'surrogateescape'))
+	return h.hexdigest()
+
+def file_times(paths):
+	'''
+	Gets the modification times of some files, to tell later on whether
+	any of them changed (see :func:`parser_map`).
+
+	Args:
+	    paths (iterable): Paths to the files.
+
+	Returns:
+	    A dictionary of paths to modification times in nanoseconds, or
+	    None for the files that don't exist.
+	'''
+	times = {}
+	for path in paths:
+		try:
+			times[path] = os.stat(path).st_mtime_ns
+		except OSError:
+			times[path] = None
+	return times
+
+def module_file(spec):
+	'''
+	Finds the file of the module a parser class is in, without importing
+	it.
+
+	Args:
+	    spec (string): Where the class is, as ``module:ClassName``.
+
+	Returns:
+	    The path to the file, or None if it can't be found.
+	'''
+	try:
+		module_spec = importlib.util.find_spec(spec.partition(':')[0])
+	except (ImportError, ValueError):
+		return None
+	if module_spec is None or not module_spec.has_location:
+		return None
+	return module_spec.origin
+
+def distribution_files(entry_point):
+	'''
+	Finds the metadata files of the distribution that declares an entry
+	point, which change when it is installed again.
+
+	Args:
+	    entry_point (`importlib.metadata.EntryPoint`): The entry point.
+
+	Returns:
+	    A list of paths (``entry_points.txt`` and ``RECORD``), empty if
+	    they can't be found.
+	'''
+	# Python 3.9 and below don't tell which distribution it is
+	dist_path = getattr(getattr(entry_point, 'dist', None), '_path', None)
+	if dist_path is None:
+		return []
+	return [os.path.join(str(dist_path), 'entry_points.txt'), os.path.join(str(dist_path), 'RECORD')]
+
+def entry_points(group=ENTRY_POINT_GROUP):
+	'''
+	Gets the entry points in a group, from every distribution installed.
+
+	Args:
+	    group (string, Optional): The group.
+
+	Returns:
+	    A list of `importlib.metadata.EntryPoint` objects.
+	'''
+	from importlib import metadata
+
+	found = metadata.entry_points()
+	if hasattr(found, 'select'):
+		return list(found.select(group=group))
+	# Python 3.9 and below give a dictionary
+	return list(found.get(group, []))
+
+def load_parser(spec):
+	'''
+	Imports a parser class.
+
+	Args:
+	    spec (string): Where the class is, as ``module:ClassName``.
+
+	Returns:
+	    The class.
+
+	Raises:
+	    ValueError: if it isn't a :class:`mdiocre.parsers.BaseParser`.
+	'''
+	from .parsers import BaseParser
+
+	module_name, _, class_name = spec.partition(':')
+	parser_class = getattr(importlib.import_module(module_name), class_name)
+	if not (isinstance(parser_class, type) and issubclass(parser_class, BaseParser)):
+		raise ValueError('{} is invalid (does not inherit BaseParser)'.format(spec))
+	return parser_class
+
+def read_filetypes(spec):
+	'''
+	Reads the file types of a parser class from its module's source,
+	without importing it. This only works if the class itself sets
+	``FILETYPES`` to a list of strings.
+
+	Args:
+	    spec (string): Where the class is, as ``module:ClassName``.
+
+	Returns:
+	    A list of file types, or None if they can't be read this way.
+	'''
+	class_name = spec.partition(':')[2]
+	origin = module_file(spec)
+	if origin is None or not origin.endswith('.py'):
+		return None
+
+	try:
+		with open(origin, 'rb') as f:
+			tree = ast.parse(f.read(), origin)
+	except (OSError, SyntaxError, ValueError):
+		return None
+
+	for node in tree.body:
+		if not (isinstance(node, ast.ClassDef) and node.name == class_name):
+			continue
+		for item in node.body:
+			if isinstance(item, ast.Assign) and any(isinstance(t, ast.Name) and t.id == 'FILETYPES' for t in item.targets):
+				try:
+					filetypes = ast.literal_eval(item.value)
+				except ValueError:
+					return None
+				if isinstance(filetypes, (list, tuple)) and all(isinstance(i, str) for i in filetypes):
+					return list(filetypes)
+				return None
+	return None
+
+def _module_parsers(search_locations, package):
+	'''
+	Lists the parsers of a package's ``parsers`` directory, where every
+	``parsers/<fmt>.py`` module has a ``<Fmt>Parser`` class.
+	'''
+	# only needed when the cache is out of date, and slow to import
+	import pkgutil
+
+	return [
+		'{}.parsers.{}:{}Parser'.format(package, parser_file, parser_file.capitalize())
+		for finder, parser_file, ispkg in pkgutil.iter_modules(search_locations)
+	]
+
+def find_parsers(scan=False, files=None):
+	'''
+	Finds every parser: MDiocre's own, then those declared in the
+	``mdiocre.parsers`` entry point group. A parser found later takes
+	over the file types of one found earlier. Parsers are only imported
+	if their file types can't be read from their source, see
+	:func:`read_filetypes`.
+
+	Args:
+	    scan (bool, Optional): If True, also look for parsers the way
+	        older versions did: in the ``parsers`` package of every
+	        ``mdiocre_*`` module on ``sys.path``. This lists every module
+	        on ``sys.path``, so it is slow.
+	    files (set, Optional): If given, the files the parsers were found
+	        from are added to it: the modules of the parsers, and the
+	        metadata of the distributions declaring them.
+
+	Returns:
+	    A (parsers, complete) tuple, where parsers is a dictionary of
+	    file types to parsers (as ``module:ClassName``) and complete is
+	    False if some parser couldn't be loaded.
+	'''
+	specs = _module_parsers([os.path.join(os.path.dirname(__file__), 'parsers')], 'mdiocre')
+
+	for entry_point in entry_points():
+		specs.append(entry_point.value.replace(' ', ''))
+		if files is not None:
+			files.update(distribution_files(entry_point))
+
+	if scan:
+		import pkgutil
+		for finder, name, ispkg in pkgutil.iter_modules():
+			if name.startswith('mdiocre_'):
+				module_parser_spec = importlib.util.find_spec('{}.parsers'.format(name))
+				if module_parser_spec:
+					specs += _module_parsers(module_parser_spec.submodule_search_locations, name)
+
+	parsers = {}
+	complete = True
+	for spec in specs:
+		if files is not None:
+			origin = module_file(spec)
+			if origin is not None:
+				files.add(origin)
+
+		filetypes = read_filetypes(spec)
+		if filetypes is not None:
+			for filetype in filetypes:
+				parsers[filetype] = spec
+			continue
+
+		try:
+			parser_class = load_parser(spec)
+		except (ImportError, AttributeError) as e:
+			logger.log(log_error, "%s: can't load parser: %s", spec, e)
+			complete = False
+			continue
+		except ValueError as e:
+			logger.log(log_error, '%s', e)
+			complete = False
+			continue
+		except Exception:
+			logger.log(log_error, '%s: %s', spec, traceback.format_exc())
+			complete = False
+			continue
+
+		for filetype in parser_class.FILETYPES:
+			parsers[filetype] = spec
+
+	return parsers, complete
+
+def parser_map(scan=False, cache=None):
+	'''
+	Gets the parsers to use for each file type, see :func:`find_parsers`.
+	What is found is saved to a cache file, which is used for as long as
+	:func:`fingerprint` stays the same and none of the files the parsers
+	were found from changed (e.g. a parser's ``FILETYPES`` was edited,
+	or a plugin was installed again), so that plugins don't have to be
+	looked for every time.
+
+	Args:
+	    scan (bool, Optional): See :func:`find_parsers`.
+	    cache (string, Optional): Path to the cache file, defaults to
+	        :func:`cache_file`. False turns the cache off.
+
+	Returns:
+	    A dictionary of file types to parsers (as ``module:ClassName``).
+	'''
+	if cache is False:
+		return find_parsers(scan=scan)[0]
+	if cache is None:
+		cache = cache_file()
+
+	# the first entry of sys.path is the script's directory (or the
+	# working directory), where distributions aren't installed. it
+	# changes whenever something is written there, e.g. a build
+	paths = sys.path if scan else sys.path[1:]
+	key = {'format': CACHE_FORMAT, 'fingerprint': fingerprint(paths), 'scan': bool(scan)}
+
+	try:
+		with open(cache, 'r') as f:
+			cached = json.load(f)
+		if cached.get('key') == key and file_times(cached['files']) == cached['files']:
+			return cached['parsers']
+	except (OSError, ValueError, KeyError, AttributeError, TypeError):
+		pass
+
+	files = set()
+	parsers, complete = find_parsers(scan=scan, files=files)
+
+	# leave broken plugins to be looked at again next time
+	if complete:
+		try:
+			os.makedirs(os.path.dirname(cache), exist_ok=True)
+			temp_file = '{}.{}'.format(cache, os.getpid())
+			with open(temp_file, 'w') as f:
+				json.dump({'key': key, 'files': file_times(sorted(files)), 'parsers': parsers}, f)
+			os.replace(temp_file, cache)
+		except OSError:
+			pass
+
+	return parsers
+
+class ParserMap(dict):
+	'''
+	A dictionary of file types to parser classes, where a parser is only
+	imported the first time one of its file types is looked up. Parsers
+	can be put in it as classes, or as ``module:ClassName`` strings
+	(see :func:`load_parser`), which is what iterating over its values
+	gives for the ones not imported yet. Checking whether a file type is
+	in it doesn't import anything.
+
+	A parser that can't be imported is logged and taken out, with all of
+	its file types.
+	'''
+	def __getitem__(self, filetype):
+		parser = dict.__getitem__(self, filetype)
+		if not isinstance(parser, str):
+			return parser
+
+		spec = parser
+		try:
+			parser = load_parser(spec)
+		except Exception as e:
+			logger.log(log_error, "%s: can't load parser: %s", spec, e)
+			parser = None
+
+		for other, other_spec in list(dict.items(self)):
+			if other_spec == spec:
+				if parser is None:
+					dict.__delitem__(self, other)
+				else:
+					dict.__setitem__(self, other, parser)
+
+		if parser is None:
+			raise KeyError(filetype)
+		return parser
+
+	def get(self, filetype, default=None):
+		try:
+			return self[filetype]
+		except KeyError:
+			return default
+
+	def loaded(self):
+		'''
+		Lists the file types whose parser has been imported.
+
+		Returns:
+		    A list of file types.
+		'''
+		return [filetype for filetype, parser in dict.items(self) if not isinstance(parser, str)]
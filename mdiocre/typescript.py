@@ -0,0 +1,109 @@
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from .utils import declare
+from .hooks import phase
+
+'''
+Compiles TypeScript files with `tsc`, in the background
+'''
+
+def js_file(built_file):
+	'''
+	Gets the path of the JavaScript file compiled from a TypeScript file.
+
+	Args:
+	    built_file (string): Path to the TypeScript file in the build
+	        directory.
+
+	Returns:
+	    The same path, ending in ``.js``.
+	'''
+	built_name, built_ext = os.path.splitext(built_file)
+	return os.path.extsep.join([built_name, 'js'])
+
+def compile_typescript(source_file, built_file):
+	'''
+	Compiles a TypeScript file with `tsc`.
+
+	Args:
+	    source_file (string): Path to the TypeScript file.
+	    built_file (string): Path to the JavaScript file to write.
+
+	Returns:
+	    None if it compiled successfully. Otherwise, the exception:
+	    `FileNotFoundError` if `tsc` can't be found, or
+	    `subprocess.CalledProcessError` (with the output of `tsc`) if
+	    the compilation failed.
+	'''
+	try:
+		subprocess.check_output(
+			['tsc', '--strict', '--outFile', built_file, source_file],
+			stderr = subprocess.STDOUT
+		)
+	except (FileNotFoundError, subprocess.CalledProcessError) as e:
+		return e
+	return None
+
+class TypeScriptPool():
+	'''
+	Runs a bounded number of `tsc` processes at once, each from its own
+	thread, so that pages can be built while scripts compile.
+
+	Args:
+	    jobs (int, Optional): Number of `tsc` processes running at once.
+	'''
+	def __init__(self, jobs=4):
+		# type checking
+		declare(jobs, int)
+
+		self.jobs = max(jobs, 1)
+		self.executor = None
+		self.pending = []
+
+	def submit(self, source_file, built_file):
+		'''
+		Starts compiling a TypeScript file, see :func:`compile_typescript`.
+
+		Args:
+		    source_file (string): Path to the TypeScript file.
+		    built_file (string): Path to the JavaScript file to write.
+
+		Returns:
+		    None.
+		'''
+		if self.executor is None:
+			self.executor = ThreadPoolExecutor(max_workers=self.jobs)
+		future = self.executor.submit(self.compile, source_file, built_file)
+		self.pending.append((source_file, built_file, future))
+
+	def compile(self, source_file, built_file):
+		'''
+		Compiles a file, from one of the threads.
+		'''
+		with phase('tsc', os.path.abspath(source_file)):
+			return compile_typescript(source_file, built_file)
+
+	def wait(self):
+		'''
+		Waits for every file to be compiled.
+
+		Returns:
+		    A list of (source file, built file, error) tuples, in the
+		    order the files were submitted, where error is what
+		    :func:`compile_typescript` returned.
+		'''
+		pending, self.pending = self.pending, []
+		return [
+			(source_file, built_file, future.result())
+			for source_file, built_file, future in pending
+		]
+
+	def close(self):
+		'''
+		Waits for every file to be compiled, then stops the threads.
+		'''
+		self.wait()
+		if self.executor is not None:
+			self.executor.shutdown()
+			self.executor = None
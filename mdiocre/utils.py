@@ -1,3 +1,6 @@
+import os
+from collections import OrderedDict
+
 '''
 Common tools used by MDiocre. Internal use only
 '''
@@ -16,6 +19,23 @@ def declare(var_, type_):
 		raise TypeError('passed variable must be {} (is instead {})'.format('.'.join([type_.__module__, type_.__name__]), var_.__class__.__name__))
 		
 
+def read_chunks(file, size=1 << 16):
+	'''
+	Reads a file a piece at a time.
+	
+	Args:
+	    file (file object): The file to read.
+	    size (int, Optional): How much to read at a time.
+	
+	Returns:
+	    A generator of the pieces read.
+	'''
+	while True:
+		chunk = file.read(size)
+		if not chunk:
+			return
+		yield chunk
+
 def remove_inner_outer_quotes(string):
 	'''
 	Remove any quotes around the text, with additional checking
@@ -44,3 +64,65 @@ def remove_inner_outer_quotes(string):
 			raise SyntaxError("assignment <{}>: no matching beginning '".format(string))
 		string = string.strip("'")
 	return string
+
+
+class FileCache():
+	'''
+	A bounded cache of objects made out of files, e.g. compiled templates.
+	
+	Entries are keyed by the file's absolute path, and are only reused as
+	long as the file's modification time and size stay the same. When the
+	cache is full, the least recently used entry is thrown out.
+	
+	Args:
+	    loader (func): Function that takes an absolute path and returns
+	        the object to cache.
+	    maxsize (int, Optional): Maximum number of entries.
+	
+	Attributes:
+	    hits (int): Number of times an entry was reused.
+	    misses (int): Number of times the loader was called.
+	'''
+	def __init__(self, loader, maxsize=128):
+		self.loader = loader
+		self.maxsize = maxsize
+		self.entries = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+	
+	def get(self, path):
+		'''
+		Gets the object made out of a file, loading it if necessary.
+		
+		Args:
+		    path (string): Path to the file.
+		
+		Returns:
+		    Whatever the loader returns. Raises `FileNotFoundError` if
+		    the file doesn't exist.
+		'''
+		path = os.path.abspath(path)
+		st = os.stat(path)
+		key = (st.st_mtime_ns, st.st_size)
+		
+		entry = self.entries.get(path)
+		if entry is not None and entry[0] == key:
+			self.hits += 1
+			self.entries.move_to_end(path)
+			return entry[1]
+		
+		self.misses += 1
+		obj = self.loader(path)
+		self.entries[path] = (key, obj)
+		self.entries.move_to_end(path)
+		while len(self.entries) > self.maxsize:
+			self.entries.popitem(last=False)
+		return obj
+	
+	def clear(self):
+		'''
+		Throws out every entry and resets the counters.
+		'''
+		self.entries.clear()
+		self.hits = 0
+		self.misses = 0
@@ -0,0 +1,379 @@
+import os
+import re
+import logging
+from .utils import declare
+
+'''
+Walks source directories, leaving out what shouldn't be built
+'''
+
+logger = logging.getLogger('mdiocre.walker')
+
+# files listing what to leave out, see IgnoreRules
+IGNORE_FILE = '.mdiocreignore'
+
+# left out of every walk, unless a .mdiocreignore file says otherwise
+# (e.g. with "!node_modules/")
+DEFAULT_IGNORES = (
+	'.git/', '.hg/', '.svn/',
+	'node_modules/', '__pycache__/',
+	IGNORE_FILE,
+	# editor swap, backup and lock files. a line starting with # is a
+	# comment, so Emacs' #autosave# files need a backslash
+	'*.swp', '*.swo', '*.swx', '*~', '.#*', '\\#*#',
+	'.DS_Store', 'Thumbs.db',
+)
+
+def translate(pattern):
+	'''
+	Turns a gitignore-style pattern into a regular expression.
+
+	The pattern works the same as in a ``.gitignore`` file: ``*`` and
+	``?`` match anything but a slash, ``**`` matches any number of
+	directories, ``[...]`` matches one of the characters inside. A
+	pattern with a slash anywhere but at its end is matched from the
+	directory of the file it is in; otherwise, it is matched against
+	the name of the file or directory, at any depth. A trailing slash
+	only matches directories, and a leading ``!`` brings back something
+	left out by a pattern before it.
+
+	Args:
+	    pattern (string): A line of a ``.mdiocreignore`` file.
+
+	Returns:
+	    A (compiled regex, negated, directories only, anchored) tuple,
+	    or None if the line is blank or a comment. If anchored, the
+	    regex matches paths relative to the directory of the file the
+	    pattern is in, with forward slashes. Otherwise, it matches names.
+	'''
+	declare(pattern, str)
+
+	pattern = pattern.rstrip('\n\r')
+	# trailing spaces are ignored, unless escaped
+	while pattern.endswith(' ') and not pattern.endswith('\\ '):
+		pattern = pattern[:-1]
+	if not pattern or pattern.startswith('#'):
+		return None
+
+	negated = pattern.startswith('!')
+	if negated:
+		pattern = pattern[1:]
+	elif pattern.startswith('\\'):
+		# "\#file" and "\!file"
+		pattern = pattern[1:]
+
+	dir_only = pattern.endswith('/')
+	pattern = pattern.rstrip('/')
+	anchored = '/' in pattern
+	pattern = pattern.lstrip('/')
+	if not pattern:
+		return None
+
+	regex = []
+	i = 0
+	while i < len(pattern):
+		c = pattern[i]
+		if pattern.startswith('**/', i):
+			regex.append('(?:.*/)?')
+			i += 3
+			continue
+		if pattern.startswith('**', i):
+			regex.append('.*')
+			i += 2
+			continue
+		if c == '*':
+			regex.append('[^/]*')
+		elif c == '?':
+			regex.append('[^/]')
+		elif c == '[':
+			end = pattern.find(']', i + 2)
+			if end < 0:
+				regex.append(re.escape(c))
+			else:
+				chars = pattern[i + 1:end]
+				if chars.startswith('!'):
+					chars = '^' + chars[1:]
+				regex.append('[{}]'.format(chars.replace('\\', '\\\\')))
+				i = end
+		elif c == '\\' and i + 1 < len(pattern):
+			i += 1
+			regex.append(re.escape(pattern[i]))
+		else:
+			regex.append(re.escape(c))
+		i += 1
+
+	return re.compile('{}$'.format(''.join(regex))), negated, dir_only, anchored
+
+class IgnoreRules():
+	'''
+	A list of gitignore-style patterns (see :func:`translate`), each
+	from some directory. The last pattern matching a path decides
+	whether it is left out.
+
+	Args:
+	    patterns (iterable, Optional): Patterns that apply everywhere.
+	'''
+	def __init__(self, patterns=()):
+		self.rules = []
+		self.groups = None
+		self.add(patterns)
+
+	def add(self, patterns, base=''):
+		'''
+		Adds patterns.
+
+		Args:
+		    patterns (iterable): The patterns, e.g. lines of a file.
+		    base (string, Optional): The directory they are from,
+		        relative to the root and with forward slashes. They
+		        only apply inside of it.
+
+		Returns:
+		    None.
+		'''
+		prefix = base.strip('/') + '/' if base.strip('/') else ''
+		for pattern in patterns:
+			rule = translate(pattern)
+			if rule is not None:
+				self.rules.append((prefix,) + rule)
+		self.groups = None
+
+	def read(self, path, base=''):
+		'''
+		Adds the patterns of a ``.mdiocreignore`` file, if it exists.
+
+		Args:
+		    path (string): Path to the file.
+		    base (string, Optional): See :meth:`add`.
+
+		Returns:
+		    True if the file was read.
+		'''
+		try:
+			with open(path, 'r', encoding='utf-8') as f:
+				self.add(f.readlines(), base)
+		except OSError:
+			return False
+		return True
+
+	def copy(self):
+		'''
+		Makes a copy, so that patterns of a directory can be added
+		without them applying to the ones next to it.
+		'''
+		other = IgnoreRules()
+		other.rules = list(self.rules)
+		return other
+
+	def group(self):
+		'''
+		Joins every run of rules with the same directory and kind into
+		one regex, so that a path is matched against a few of them
+		instead of every rule.
+		'''
+		groups = []
+		for prefix, regex, negated, dir_only, anchored in self.rules:
+			if groups and groups[-1][0] == (prefix, negated, dir_only, anchored):
+				groups[-1][1].append(regex.pattern)
+			else:
+				groups.append(((prefix, negated, dir_only, anchored), [regex.pattern]))
+		self.groups = [
+			(prefix, re.compile('|'.join('(?:{})'.format(i) for i in patterns)), negated, dir_only, anchored)
+			for (prefix, negated, dir_only, anchored), patterns in groups
+		]
+
+	def match(self, path, is_dir=False):
+		'''
+		Tells whether a path is left out.
+
+		Args:
+		    path (string): The path, relative to the root and with
+		        forward slashes.
+		    is_dir (bool, Optional): Whether it is a directory.
+
+		Returns:
+		    True if it is left out.
+		'''
+		if self.groups is None:
+			self.group()
+
+		name = path.rpartition('/')[2]
+		ignored = False
+		for prefix, regex, negated, dir_only, anchored in self.groups:
+			if ignored != negated or (dir_only and not is_dir):
+				continue
+			if prefix and not path.startswith(prefix):
+				continue
+			if regex.match(path[len(prefix):] if anchored else name):
+				ignored = not negated
+		return ignored
+
+class SourceTree():
+	'''
+	A directory to walk, leaving out what :data:`DEFAULT_IGNORES` and
+	the ``.mdiocreignore`` files in it say to. A ``.mdiocreignore`` file
+	applies to the directory it is in and everything inside it.
+
+	Args:
+	    root (string): The directory.
+	    ignore (bool, Optional): If False, nothing is left out.
+	'''
+	def __init__(self, root, ignore=True):
+		# type checking
+		declare(root, str)
+
+		self.root = os.path.abspath(root)
+		self.ignore = ignore
+		# directory (relative to the root) -> the rules that apply in it
+		self.directories = {}
+
+	def relative(self, path):
+		'''
+		Gets the path of a file relative to the root, with forward
+		slashes, or None if it isn't inside it.
+		'''
+		path = os.path.abspath(path)
+		if path == self.root:
+			return ''
+		if not path.startswith(self.root + os.path.sep):
+			return None
+		return path[len(self.root) + 1:].replace(os.path.sep, '/')
+
+	def rules(self, directory):
+		'''
+		Gets the rules that apply inside a directory.
+
+		Args:
+		    directory (string): The directory, relative to the root
+		        (see :meth:`relative`).
+
+		Returns:
+		    An :class:`IgnoreRules` object.
+		'''
+		rules = self.directories.get(directory)
+		if rules is not None:
+			return rules
+
+		if directory:
+			rules = self.rules(directory.rpartition('/')[0]).copy()
+		else:
+			rules = IgnoreRules(DEFAULT_IGNORES if self.ignore else ())
+
+		if self.ignore:
+			rules.read(os.path.join(self.root, directory, IGNORE_FILE), directory)
+		self.directories[directory] = rules
+		return rules
+
+	def is_ignored(self, path):
+		'''
+		Tells whether a file is left out, either by itself or because a
+		directory it is in is.
+
+		Args:
+		    path (string): Path to the file or directory.
+
+		Returns:
+		    True if it is left out, or if it isn't inside the root.
+		'''
+		relative = self.relative(path)
+		if relative is None:
+			return True
+		if not self.ignore or not relative:
+			return False
+
+		parts = relative.split('/')
+		for i in range(len(parts)):
+			inside = '/'.join(parts[:i])
+			current = '/'.join(parts[:i + 1])
+			is_dir = i < len(parts) - 1 or os.path.isdir(path)
+			if self.rules(inside).match(current, is_dir):
+				return True
+		return False
+
+	def walk(self, top=None, follow_links=True):
+		'''
+		Walks a directory like `os.walk`, top-down, but gives
+		`os.DirEntry` objects instead of names, so that what they
+		already know (e.g. from `os.DirEntry.stat`) isn't looked up
+		again. Directories can be taken out of `folders` to skip them.
+
+		A directory that is inside itself through a symbolic link is
+		only walked once.
+
+		Args:
+		    top (string, Optional): The directory to walk, inside the
+		        root. Defaults to the root.
+		    follow_links (bool, Optional): Whether to walk into symbolic
+		        links to directories.
+
+		Returns:
+		    A generator of (path, folders, files) tuples.
+		'''
+		top = self.root if top is None else os.path.abspath(top)
+		relative = self.relative(top)
+		if relative is None:
+			raise ValueError('{} is not inside {}'.format(top, self.root))
+
+		try:
+			st = os.stat(top)
+		except OSError as e:
+			logger.warning('cannot walk %s: %s', top, e)
+			return
+
+		yield from self._walk(top, relative, follow_links, {(st.st_dev, st.st_ino)})
+
+	def _walk(self, path, relative, follow_links, ancestors):
+		try:
+			with os.scandir(path) as it:
+				entries = list(it)
+		except OSError as e:
+			logger.warning('cannot walk %s: %s', path, e)
+			return
+
+		rules = self.rules(relative)
+		prefix = relative + '/' if relative else ''
+
+		folders = []
+		files = []
+		for entry in entries:
+			try:
+				is_dir = entry.is_dir()
+			except OSError:
+				is_dir = False
+			if rules.rules and rules.match(prefix + entry.name, is_dir):
+				continue
+			if is_dir:
+				folders.append(entry)
+			else:
+				files.append(entry)
+
+		yield path, folders, files
+
+		for entry in folders:
+			if not follow_links and entry.is_symlink():
+				continue
+			try:
+				st = entry.stat()
+			except OSError:
+				continue
+			key = (st.st_dev, st.st_ino)
+			if key in ancestors:
+				logger.warning('%s leads back to a directory it is in, skipping.', entry.path)
+				continue
+			ancestors.add(key)
+			yield from self._walk(entry.path, prefix + entry.name, follow_links, ancestors)
+			ancestors.discard(key)
+
+def walk(top, ignore=True, follow_links=True):
+	'''
+	Walks a directory, see :meth:`SourceTree.walk`.
+
+	Args:
+	    top (string): The directory.
+	    ignore (bool, Optional): See :class:`SourceTree`.
+	    follow_links (bool, Optional): See :meth:`SourceTree.walk`.
+
+	Returns:
+	    A generator of (path, folders, files) tuples.
+	'''
+	return SourceTree(top, ignore=ignore).walk(follow_links=follow_links)
@@ -0,0 +1,374 @@
+import os
+import sys
+import time
+import select
+import struct
+import logging
+import ctypes
+import ctypes.util
+from .utils import declare
+from .walker import walk
+
+'''
+Watches source directories for changes, used by :meth:`mdiocre.wizard.Wizard.watch`
+'''
+
+logger = logging.getLogger('mdiocre.watcher')
+
+class Watcher():
+	'''
+	Base class of the watchers. A watcher is told which directories and
+	files to look at with :meth:`watch`, then :meth:`wait` tells what
+	changed since the last call.
+
+	Args:
+	    delay (float, Optional): How long to wait for things to settle
+	        after a change, in seconds, so that saving many files at once
+	        only gives one set of changes.
+	'''
+	def __init__(self, delay=0.1):
+		self.delay = delay
+		self.directories = set()
+		self.files = set()
+
+	def watch(self, directories=(), files=()):
+		'''
+		Sets what is watched, replacing what was watched before.
+
+		Args:
+		    directories (iterable): Directories to watch, along with
+		        everything inside them.
+		    files (iterable): Single files to watch, e.g. templates
+		        outside of the watched directories.
+
+		Returns:
+		    None.
+		'''
+		self.directories = set(os.path.abspath(i) for i in directories)
+		self.files = set(os.path.abspath(i) for i in files)
+
+	def is_watched(self, path):
+		'''
+		Tells whether a path is inside what is being watched.
+		'''
+		if path in self.files:
+			return True
+		for directory in self.directories:
+			if path == directory or path.startswith(directory + os.path.sep):
+				return True
+		return False
+
+	def wait(self, timeout=None):
+		'''
+		Waits for something to change.
+
+		Args:
+		    timeout (float, Optional): How long to wait, in seconds.
+		        If None, waits for as long as it takes.
+
+		Returns:
+		    A set of the absolute paths that changed, which is empty if
+		    nothing did before `timeout`. A directory in the set means
+		    anything inside it may have changed.
+		'''
+		raise NotImplementedError
+
+	def close(self):
+		'''
+		Stops watching.
+		'''
+		pass
+
+class PollingWatcher(Watcher):
+	'''
+	Finds out what changed by looking at the modification time and size
+	of every watched file, over and over again. This works everywhere,
+	but takes longer the more files there are.
+
+	Args:
+	    delay (float, Optional): See :class:`Watcher`.
+	    interval (float, Optional): Time between every look, in seconds.
+	'''
+	def __init__(self, delay=0.1, interval=1.0):
+		Watcher.__init__(self, delay=delay)
+		self.interval = interval
+		self.snapshot = {}
+
+	def watch(self, directories=(), files=()):
+		old_directories, old_files = self.directories, self.files
+		Watcher.watch(self, directories=directories, files=files)
+
+		# what was already watched keeps the snapshot taken at the end of
+		# wait(), so that changes made since (e.g. during a rebuild) are
+		# still found; only what's new is looked at
+		self.snapshot = {path: key for path, key in self.snapshot.items() if self.is_watched(path)}
+		self.snapshot.update(self.scan(
+			directories=self.directories - old_directories,
+			files=self.files - old_files
+		))
+
+	def scan(self, directories=None, files=None):
+		'''
+		Looks at every watched file.
+
+		Args:
+		    directories (iterable, Optional): Only look inside these
+		        directories, instead of every watched one.
+		    files (iterable, Optional): Only look at these single files,
+		        instead of every watched one.
+
+		Returns:
+		    A dictionary of paths to (modification time, size).
+		'''
+		if directories is None:
+			directories = self.directories
+		if files is None:
+			files = self.files
+
+		snapshot = {}
+		for path in files:
+			try:
+				st = os.stat(path)
+			except OSError:
+				continue
+			snapshot[path] = (st.st_mtime_ns, st.st_size)
+		for directory in directories:
+			for path, folders, entries in walk(directory):
+				for entry in entries:
+					try:
+						st = entry.stat()
+					except OSError:
+						continue
+					snapshot[entry.path] = (st.st_mtime_ns, st.st_size)
+		return snapshot
+
+	def diff(self, snapshot):
+		'''
+		Compares a new snapshot with the current one.
+
+		Returns:
+		    A set of the paths that were added, changed or removed.
+		'''
+		changed = set()
+		for path, key in snapshot.items():
+			if self.snapshot.get(path) != key:
+				changed.add(path)
+		changed.update(path for path in self.snapshot if path not in snapshot)
+		return changed
+
+	def wait(self, timeout=None):
+		deadline = None if timeout is None else time.monotonic() + timeout
+		while True:
+			snapshot = self.scan()
+			changed = self.diff(snapshot)
+			if changed:
+				break
+			if deadline is not None and time.monotonic() >= deadline:
+				return set()
+			time.sleep(self.interval)
+
+		# keep looking until nothing changes anymore
+		while True:
+			self.snapshot = snapshot
+			time.sleep(self.delay)
+			snapshot = self.scan()
+			more = self.diff(snapshot)
+			if not more:
+				return changed
+			changed.update(more)
+
+# inotify(7) constants
+IN_MODIFY      = 0x00000002
+IN_ATTRIB      = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM  = 0x00000040
+IN_MOVED_TO    = 0x00000080
+IN_CREATE      = 0x00000100
+IN_DELETE      = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF   = 0x00000800
+IN_Q_OVERFLOW  = 0x00004000
+IN_IGNORED     = 0x00008000
+IN_ONLYDIR     = 0x01000000
+IN_ISDIR       = 0x40000000
+
+IN_CLOEXEC     = 0o2000000
+IN_NONBLOCK    = 0o4000
+
+# files are only looked at once they're done being written
+WATCH_MASK = (IN_CLOSE_WRITE | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+
+EVENT = struct.Struct('iIII')
+
+def load_libc():
+	'''
+	Finds the inotify functions of the C library.
+
+	Returns:
+	    The library, or None if inotify isn't available.
+	'''
+	if not sys.platform.startswith('linux'):
+		return None
+	try:
+		libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+		libc.inotify_init1.argtypes = [ctypes.c_int]
+		libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+		libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+	except (OSError, AttributeError):
+		return None
+	return libc
+
+class InotifyWatcher(Watcher):
+	'''
+	Gets told about changes by Linux, with inotify(7). Only the changes
+	are looked at, so this takes the same time however many files there
+	are.
+
+	Every watched directory (and the directories inside it) gets its
+	own watch; single files are watched through their directory.
+
+	Args:
+	    delay (float, Optional): See :class:`Watcher`.
+	    libc (ctypes.CDLL, Optional): The C library, see :func:`load_libc`.
+	'''
+	def __init__(self, delay=0.1, libc=None):
+		Watcher.__init__(self, delay=delay)
+		self.libc = libc or load_libc()
+		if self.libc is None:
+			raise OSError('inotify is not available')
+
+		self.fd = self.libc.inotify_init1(IN_CLOEXEC | IN_NONBLOCK)
+		if self.fd < 0:
+			errno = ctypes.get_errno()
+			raise OSError(errno, os.strerror(errno))
+
+		# watch descriptor -> directory, and the other way around
+		self.wds = {}
+		self.paths = {}
+
+	def add_watch(self, directory):
+		'''
+		Watches a single directory, without what's inside it.
+
+		Returns:
+		    True if the directory is now watched.
+		'''
+		if directory in self.paths:
+			return True
+		wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK | IN_ONLYDIR)
+		if wd < 0:
+			errno = ctypes.get_errno()
+			logger.warning('cannot watch {}: {}'.format(directory, os.strerror(errno)))
+			return False
+		self.wds[wd] = directory
+		self.paths[directory] = wd
+		return True
+
+	def add_tree(self, directory):
+		'''
+		Watches a directory and every directory inside it.
+		'''
+		for path, folders, files in walk(directory):
+			if not self.add_watch(path):
+				folders.clear()
+
+	def watch(self, directories=(), files=()):
+		Watcher.watch(self, directories=directories, files=files)
+
+		wanted = set()
+		for directory in self.directories:
+			self.add_tree(directory)
+			wanted.update(i for i in self.paths if self.is_watched(i))
+		for path in self.files:
+			parent = os.path.dirname(path)
+			if self.add_watch(parent):
+				wanted.add(parent)
+
+		for directory in list(self.paths):
+			if directory not in wanted:
+				self.libc.inotify_rm_watch(self.fd, self.paths.pop(directory))
+
+	def read_events(self):
+		'''
+		Reads the events that are waiting.
+
+		Returns:
+		    A set of the paths that changed.
+		'''
+		changed = set()
+		while True:
+			try:
+				data = os.read(self.fd, 1 << 16)
+			except BlockingIOError:
+				return changed
+
+			offset = 0
+			while offset < len(data):
+				wd, mask, cookie, length = EVENT.unpack_from(data, offset)
+				offset += EVENT.size
+				name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+				offset += length
+
+				if mask & IN_Q_OVERFLOW:
+					# events were lost, so anything could have changed
+					logger.warning('too many changes at once, looking at everything again.')
+					changed.update(self.directories)
+					changed.update(self.files)
+					continue
+
+				directory = self.wds.get(wd)
+				if directory is None:
+					continue
+
+				if mask & IN_IGNORED:
+					# the directory itself is gone
+					del self.wds[wd]
+					self.paths.pop(directory, None)
+					continue
+
+				path = os.path.join(directory, name) if name else directory
+				if not self.is_watched(path):
+					continue
+
+				if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+					self.add_tree(path)
+				changed.add(path)
+
+	def wait(self, timeout=None):
+		readable, _, _ = select.select([self.fd], [], [], timeout)
+		if not readable:
+			return set()
+
+		changed = self.read_events()
+
+		# keep reading until nothing happens for a while
+		while select.select([self.fd], [], [], self.delay)[0]:
+			changed.update(self.read_events())
+		return changed
+
+	def close(self):
+		if self.fd >= 0:
+			os.close(self.fd)
+			self.fd = -1
+
+def make_watcher(delay=0.1, polling=False):
+	'''
+	Makes the best watcher for this system: an :class:`InotifyWatcher`
+	on Linux, or a :class:`PollingWatcher` otherwise.
+
+	Args:
+	    delay (float, Optional): See :class:`Watcher`.
+	    polling (bool, Optional): If True, always use a
+	        :class:`PollingWatcher`.
+
+	Returns:
+	    A :class:`Watcher` object.
+	'''
+	declare(polling, bool)
+	if not polling:
+		try:
+			return InotifyWatcher(delay=delay)
+		except OSError as e:
+			logger.info('inotify is not available ({}), looking for changes every second instead.'.format(e))
+	return PollingWatcher(delay=delay)
@@ -1,14 +1,15 @@
 import shutil
 import os
-import re
 import logging
 import traceback
-import subprocess
-import pkgutil
-import importlib
-from .utils import declare
-from .core import MDiocre
+import time
+from .utils import declare, read_chunks, FileCache
+from .core import MDiocre, VariableManager, Template, ParserRegistry
 from .parsers import BaseParser
+from .manifest import BuildManifest
+from .walker import SourceTree, IGNORE_FILE
+from .hooks import phase, emit, add_hook, HOOKS, EventCollector
+from .plugins import parser_map, ParserMap
 
 '''
 Automatic page generation tools that require manipulating the file system
@@ -24,11 +25,95 @@ log_serious = log_warning + 5
 log_error   = logging.ERROR
 
 class Wizard():
+	'''
+	Builds sites out of source directories.
+	
+	Args:
+	    jobs (int, Optional): Number of processes used by
+	        :meth:`generate_from_directory`. If more than 1, files are
+	        built in parallel by a pool of worker processes.
+	    tasks_per_worker (int, Optional): Number of files a worker
+	        process builds before it is replaced with a fresh one. This
+	        keeps whatever is leaked by ``Using:`` scripts contained.
+	    template_cache_size (int, Optional): Number of compiled templates
+	        to keep around, see :attr:`templates`.
+	    parser_options (dict, Optional): Settings for the parsers, keyed
+	        by parser name, see :class:`mdiocre.core.ParserRegistry`.
+	    stream_threshold (int, Optional): Size in bytes from which source
+	        files are streamed instead of being read whole, if their
+	        parser can do it (see :meth:`process_page_stream`). None
+	        turns streaming off.
+	    asset_threads (int, Optional): Number of threads copying the
+	        files that aren't converted, see :attr:`assets`.
+	    hardlink_assets (bool, Optional): If True, files that aren't
+	        converted are hard linked into the build directory when
+	        possible, instead of being copied.
+	    tsc_jobs (int, Optional): Number of `tsc` processes compiling
+	        TypeScript files at once, see :attr:`typescript`.
+	    scan_plugins (bool, Optional): If True, plugins are also looked
+	        for in every ``mdiocre_*`` module, not only in the
+	        ``mdiocre.parsers`` entry point group. This is slow, see
+	        :func:`mdiocre.plugins.find_parsers`.
+	    site_index (bool, Optional): If True, the variables of every
+	        page built by :meth:`generate_from_directory` are kept in a
+	        :class:`mdiocre.index.SiteIndex` inside the build directory.
+	
+	Attributes:
+	    templates (:class:`mdiocre.utils.FileCache`): Compiled
+	        :class:`mdiocre.core.Template` objects, keyed by the
+	        template file's path and modification time.
+	    parsers (:class:`mdiocre.core.ParserRegistry`): The parser
+	        objects used by this Wizard, see :meth:`get_parser`.
+	    assets (:class:`mdiocre.assets.AssetSync`): Copies the files
+	        that aren't converted during :meth:`generate_from_directory`.
+	    typescript (:class:`mdiocre.typescript.TypeScriptPool`): Compiles
+	        TypeScript files during :meth:`generate_from_directory`,
+	        while the pages are being built.
+	'''
 	# TODO: move this list to core.py, have all the converters register to core
-	converters = {}
+	converters = ParserMap()
 
-	def __init__(self):
+	def __init__(self, jobs=1, tasks_per_worker=100, template_cache_size=64, parser_options=None, stream_threshold=32 << 20, asset_threads=4, hardlink_assets=False, tsc_jobs=4, scan_plugins=False, site_index=True):
+		# type checking
+		declare(jobs, int)
+		declare(tasks_per_worker, int)
+		declare(template_cache_size, int)
+		if parser_options is not None:
+			declare(parser_options, dict)
+		if stream_threshold is not None:
+			declare(stream_threshold, int)
+		
 		self.m = MDiocre()
+		self.jobs = max(jobs, 1)
+		self.tasks_per_worker = tasks_per_worker
+		self.templates = FileCache(Template.from_file, maxsize=template_cache_size)
+		self.parser_options = parser_options or {}
+		self.parsers = ParserRegistry(self.parser_options)
+		self.stream_threshold = stream_threshold
+		self.asset_threads = asset_threads
+		self.hardlink_assets = hardlink_assets
+		self.tsc_jobs = tsc_jobs
+		self.scan_plugins = scan_plugins
+		self.site_index = site_index
+		
+		# made when they are first needed, so that the modules they use
+		# (threads, subprocesses...) aren't imported along with MDiocre
+		self._assets = None
+		self._typescript = None
+	
+	@property
+	def assets(self):
+		if self._assets is None:
+			from .assets import AssetSync
+			self._assets = AssetSync(threads=self.asset_threads, hardlink=self.hardlink_assets)
+		return self._assets
+	
+	@property
+	def typescript(self):
+		if self._typescript is None:
+			from .typescript import TypeScriptPool
+			self._typescript = TypeScriptPool(jobs=self.tsc_jobs)
+		return self._typescript
 	
 	def reregister_converters(self):
 		'''
@@ -40,12 +125,14 @@ class Wizard():
 		Returns:
 		    None.
 		'''
-		self.converters = {}
-		register_converters(self)
+		self.converters = ParserMap()
+		self.register_converters()
 	
 	def register_converters(self):
 		'''
-		Registers all available parsers.
+		Registers all available parsers: MDiocre's own, and those of
+		plugins, see :func:`mdiocre.plugins.parser_map`. Parsers are
+		imported when a file that needs them is first seen.
 		
 		Args:
 		    None.
@@ -56,50 +143,25 @@ class Wizard():
 		if len(self.converters) != 0:
 			return
 		
-		def find_parsers(converter_list, search_locations, module_name):
-			global logger
-			for finder_, parser_file, ispkg in pkgutil.iter_modules(search_locations):
-				# "import mdiocre_mymodule.parsers.(fmt)*"
-				module = importlib.import_module(
-					".parsers.{}".format(parser_file),
-					module_name
-				)
-				try:
-					# is FmtParser in <fmt> module?
-					parser_class = getattr(
-						module, '{}Parser'.format(parser_file.capitalize())
-					)
-					# is FmtParser
-					if not issubclass(parser_class, BaseParser):
-						raise ValueError('{}Parser is invalid (does not inherit BaseParser)'.format(parser_file.capitalize()))
-					for filetype in parser_class.FILETYPES:
-						converter_list[filetype] = parser_class
-				except AttributeError as e:
-					logger.log(log_error,
-						"{}: can't find a {}Parser class inside parser module: {}".format(
-							module_name,parser_file.capitalize(), parser_file
-						)
-					)
-				except ValueError as e:
-					logger.log(log_error,
-						"{}: {}".format(module_name, e)
-					)
-				except Exception as e:
-					logger.log(log_error,
-						"{}: {}".format(
-							module_name, traceback.format_exc()
-						)
-					)
+		self.converters.update(parser_map(scan=self.scan_plugins))
+	
+	def get_parser(self, extension):
+		'''
+		Gets the parser object for a file extension. Every file with
+		the same parser gets the same object.
 		
-		# first, load parsers from internal stuff
-		find_parsers(self.converters, [os.path.join(os.path.dirname(__file__), "parsers")], "mdiocre")
+		Args:
+		    extension (string): The file extension, without the dot and
+		        in lowercase.
 		
-		# then, find parsers from every plugin
-		for finder, name, ispkg in pkgutil.iter_modules():
-			if name.startswith("mdiocre_"):
-				module_parser_spec = importlib.util.find_spec("{}.parsers".format(name))
-				if module_parser_spec:
-					find_parsers(self.converters, module_parser_spec.submodule_search_locations, name)
+		Returns:
+		    A :class:`mdiocre.parsers.BaseParser` object, or None if no
+		    registered parser handles the extension.
+		'''
+		parser_class = self.converters.get(extension)
+		if parser_class is None:
+			return None
+		return self.parsers.get(parser_class)
 	
 	def vars_directly_from_file(self, source_file):
 		'''
@@ -126,17 +188,16 @@ class Wizard():
 		
 		source_dir, source_filename = os.path.split(source_file)
 		
-		if source_ext in self.converters:
-			self.m.switch_parser(self.converters[source_ext])
-			
+		parser = self.get_parser(source_ext)
+		if parser is not None:
 			with open(source_file, 'r') as orig:
 				orig_string = orig.read()
 			
-			return self.m.process(orig_string)
+			return self.m.process(orig_string, parser=parser)
 		
 		return None
 		
-	def is_mdiocre_string(self, md_string):
+	def is_mdiocre_string(self, md_string, parser=None):
 		'''
 		Determines whether or not this is valid MDiocre-formatted
 		markdown.
@@ -146,6 +207,8 @@ class Wizard():
 		
 		Args:
 		    md_string(string): The markdown-formatted text to validate.
+		    parser (:class:`mdiocre.parsers.BaseParser`, Optional): The
+		        parser to use, instead of the current one of :attr:`m`.
 		
 		Returns:
 		    True if it is a valid string, False otherwise.
@@ -154,11 +217,11 @@ class Wizard():
 		# type checking
 		declare(md_string, str)
 		
-		variables = self.m.process(md_string, ignore_content=True)
+		variables = self.m.process(md_string, ignore_content=True, parser=parser)
 		
 		return (variables.get('mdiocre-template') != '')
 	
-	def generate_from_string(self, md_string, root):
+	def generate_from_string(self, md_string, root, parser=None):
 		'''
 		Given a MDiocre string and a "root" path, convert it to a proper
 		HTML document.
@@ -174,18 +237,40 @@ class Wizard():
 		Args:
 		    md_string(string): The markdown-formatted text to convert.
 		    root(string): The 'root' path.
+		    parser (:class:`mdiocre.parsers.BaseParser`, Optional): The
+		        parser to use, instead of the current one of :attr:`m`.
 		
 		Returns:
 		    A rendered HTML string. If the ``md_string`` is invalid or if
 		    it cannot find the template file, it will return an empty string.
 		'''
+		return self.process_page(md_string, root, parser=parser)[0]
+	
+	def process_page(self, md_string, root, parser=None):
+		'''
+		Does the work of :meth:`generate_from_string`, but also tells
+		what went into the page.
+		
+		Args:
+		    md_string(string): The markdown-formatted text to convert.
+		    root(string): The 'root' path.
+		    parser (:class:`mdiocre.parsers.BaseParser`, Optional): The
+		        parser to use, instead of the current one of :attr:`m`.
+		
+		Returns:
+		    A tuple of the rendered HTML string (see :meth:`generate_from_string`),
+		    the page's VariableManager object and the absolute path to the
+		    template file (or None if it isn't a valid MDiocre string).
+		'''
 		# type checking
 		declare(md_string, str)
 		declare(root, str)
 		
-		if self.is_mdiocre_string(md_string):
-			variables = self.m.process(md_string)
-			
+		# the page is only converted once: the result is simply not
+		# used if it turns out not to be a MDiocre string
+		variables = self.m.process(md_string, parser=parser)
+		
+		if variables.get('mdiocre-template') != '':
 			template_file = os.path.abspath(
 						os.path.sep.join([
 							root,
@@ -193,21 +278,109 @@ class Wizard():
 						])
 					)
 			
-			if os.path.exists(template_file):
-				with open(template_file, 'r') as tf:
-					template = tf.read()
-					return self.m.render(template, variables)
-			else:
-				return ''
+			try:
+				with phase('load-template'):
+					template = self.templates.get(template_file)
+			except FileNotFoundError:
+				return '', variables, template_file
+			return self.m.render(template, variables), variables, template_file
 		else:
 			# return an empty string from the get-go if it isn't
 			# a valid mdiocre file
-			return ''
+			return '', variables, None
+	
+	def process_page_stream(self, source_file, root, parser):
+		'''
+		Does the same as :meth:`process_page` for a source file, without
+		holding the whole file or the converted page in memory.
+		
+		The file is read twice: once to run its commands, which tells
+		which template to use, then once more while the page is being
+		written, converting it as it goes. This only works for parsers
+		that have :attr:`mdiocre.parsers.BaseParser.STREAMING` set, and
+		templates that only put the content in as is (see
+		:meth:`mdiocre.core.Template.streams_content`); otherwise, the
+		file is processed with :meth:`process_page`.
+		
+		Args:
+		    source_file (string): Path to the source file.
+		    root(string): The 'root' path.
+		    parser (:class:`mdiocre.parsers.BaseParser`): The parser to use.
+		
+		Returns:
+		    A tuple of a function that writes the rendered page using the
+		    function given to it (or None if it isn't a valid MDiocre
+		    file), the page's VariableManager object and the absolute
+		    path to the template file (or None).
+		'''
+		# type checking
+		declare(source_file, str)
+		declare(root, str)
+		declare(parser, BaseParser)
+		
+		variables = VariableManager()
+		with open(source_file, 'r') as source:
+			parser.to_variables_stream(read_chunks(source), variables, ignore_content=True)
+		
+		if variables.get('mdiocre-template') == '':
+			return None, variables, None
+		
+		template_file = os.path.abspath(
+					os.path.sep.join([
+						root,
+						variables.get('mdiocre-template')
+					])
+				)
+		
+		try:
+			with phase('load-template'):
+				template = self.templates.get(template_file)
+		except FileNotFoundError:
+			return None, variables, template_file
+		
+		if not template.streams_content():
+			with open(source_file, 'r') as source:
+				conv, variables, template_file = self.process_page(source.read(), root, parser=parser)
+			return (lambda write: write(conv)) if conv != '' else None, variables, template_file
+		
+		def content(write):
+			# the commands are run again on a fresh set of variables,
+			# the same way they were the first time
+			page_variables = VariableManager()
+			page_variables.variables['mdiocre-gen-timestamp'] = variables.get('mdiocre-gen-timestamp')
+			with open(source_file, 'r') as source:
+				for piece in parser.stream_content(read_chunks(source), page_variables):
+					write(piece)
+		
+		def render(write):
+			template.write(variables, write, content=content)
+		
+		return render, variables, template_file
 	
 	def generate_from_path(self, source_file, built_file, root='', to_html=False, level=0):
 		'''
 		If the file is a MDiocre file, generate an HTML page from a
 		source file to a built file. Otherwise, simply copy the file.
+		
+		Args:
+		    source_file (string): Path to the source file.
+		    built_file (string): Path to the file to write.
+		    root (string, Optional): The 'root' path, see :meth:`generate_from_string`.
+		    to_html (bool, Optional): If True, converted pages are written
+		        with the ``.html`` extension.
+		    level (int, Optional): Indentation level of the log messages.
+		
+		Returns:
+		    A dictionary describing what was built, with the keys:
+		    "source" (absolute path to the source file),
+		    "outputs" (list of absolute paths of the files written),
+		    "dependencies" (list of absolute paths of the files read to
+		    produce the outputs, other than the source),
+		    "template" (absolute path to the template, or None),
+		    "variables" (the page's variables, with values that can be
+		    stored in a :class:`mdiocre.index.SiteIndex`, or None if it
+		    wasn't converted to a page) and
+		    "error" (True if the file could not be built properly).
 		'''
 		# type checking
 		declare(source_file, str)
@@ -226,16 +399,42 @@ class Wizard():
 		
 		has_file_originally = os.path.exists(built_file)
 		
+		result = {
+			'source': os.path.abspath(source_file),
+			'outputs': [],
+			'dependencies': [],
+			'template': None,
+			'variables': None,
+			'error': False,
+		}
+		
 		if source_ext in self.converters:
 			try:
-				self.m.switch_parser(self.converters[source_ext])
-				with open(source_file, 'r') as orig:
-					orig_string = orig.read()
+				parser = self.get_parser(source_ext)
+				
+				if parser.STREAMING and self.stream_threshold is not None \
+						and os.path.getsize(source_file) >= self.stream_threshold:
+					logger.log(log_info + level, 'streaming %s', source_filename)
+					with phase('page', result['source']):
+						render, variables, template_file = self.process_page_stream(source_file, root, parser)
+				else:
+					with phase('read', result['source']):
+						with open(source_file, 'r') as orig:
+							orig_string = orig.read()
+					
+					with phase('page', result['source']):
+						conv, variables, template_file = self.process_page(orig_string, root, parser=parser)
+					render = (lambda write: write(conv)) if conv != '' else None
 				
-				conv = self.generate_from_string(orig_string, root)
-				logger.log(log_info + level, '{}\'s base dir: {}'.format(source_filename, root))
+				result['template'] = template_file
+				if template_file is not None:
+					result['dependencies'].append(template_file)
+				result['dependencies'] += [
+					i for i in variables.dependencies if i != template_file
+				]
+				logger.log(log_info + level, '%s\'s base dir: %s', source_filename, root)
 				
-				if conv != '':
+				if render is not None:
 					if to_html:
 						built_name, built_ext = os.path.splitext(built_file)
 						built_file = os.path.extsep.join([built_name, 'html'])
@@ -245,65 +444,103 @@ class Wizard():
 						
 						built_dir, built_filename = os.path.split(built_file)
 					# if properly converted, write the file
-					logger.log(log_ok + level, '{} is a MDiocre file, writing {}.'.format(source_filename, built_filename))
-					with open(built_file, 'w') as rendered:
-						rendered.write(conv)
+					logger.log(log_ok + level, '%s is a MDiocre file, writing %s.', source_filename, built_filename)
+					with phase('write', result['source']) as timed:
+						with open(built_file, 'w') as rendered:
+							render(rendered.write)
+						if timed:
+							timed.note(bytes=os.path.getsize(built_file))
+					from .index import index_value
+					result['variables'] = {
+						name: index_value(value) for name, value in variables.variables.items()
+					}
 				else:
 					# if not, don't convert - just perform a copy
-					logger.log(log_warning + level, '{} is NOT a MDiocre file, copying instead.'.format(source_filename, built_filename))
+					logger.log(log_warning + level, '%s is NOT a MDiocre file, copying instead.', source_filename)
 					shutil.copyfile(
 						source_file,
 						built_file
 						)
-			except Exception as e:
-				logger.log(log_error + level, "{}: an error occured, copying file instead...".format(source_filename))
-				logger.log(log_error + level + 1, "{}".format(traceback.format_exc()))
+			except Exception:
+				logger.log(log_error + level, "%s: an error occured, copying file instead...", source_filename)
+				logger.log(log_error + level + 1, "%s", traceback.format_exc())
 				shutil.copyfile(
 					source_file,
 					built_file
 					)
+				result['error'] = True
 		else:
 			if source_ext in ['ts']: # is typescript file?
-				built_name, built_ext = os.path.splitext(built_file)
-				built_file = os.path.extsep.join([built_name, 'js'])
-				
 				# try to compile it with `tsc`
-				logger.log(log_info + level, 'compiling {} with tsc'.format(source_filename))
-				
-				try:
-					ts2js_result = subprocess.check_output(
-						['tsc', '--strict', '--outFile', built_file, source_file],
-						stderr = subprocess.STDOUT
-					)
-				
-				except FileNotFoundError as e:
-					logger.log(log_error + level, "can't find tsc on your system, copying instead")
-					built_file = os.path.extsep.join([built_name, 'ts'])
-					shutil.copyfile(
-						source_file,
-						built_file
-						)
-				
-				except subprocess.CalledProcessError as e:
-					logger.log(log_error + level, "compilation failed with code {}".format(e.returncode))
-					logger.log(log_error + level + 1, "{}".format(e.output.decode("utf-8")))
-					
-					# delete the compiled file just in case tsc compiles it anyway
-					if os.path.isfile(built_file):
-						os.remove(built_file)
+				logger.log(log_info + level, 'compiling %s with tsc', source_filename)
 				
-				else:
-					logger.log(log_ok + level, '{} compiled successfully.'.format(built_filename))
+				from .typescript import compile_typescript, js_file
+				with phase('tsc', result['source']):
+					error = compile_typescript(source_file, js_file(built_file))
+				built_file, result['error'] = self.finish_typescript(source_file, built_file, error, level=level)
 			else:
-				logger.log(log_info + level, 'copying {}'.format(source_filename))
-				shutil.copyfile(
-					source_file,
-					built_file
-					)
+				from .assets import sync_file
+				with phase('copy', result['source']):
+					copied = sync_file(source_file, built_file, hardlink=self.hardlink_assets)
+				if copied is None:
+					logger.log(log_info + level, '%s is already in place.', built_filename)
+					has_file_originally = False
+				else:
+					logger.log(log_info + level, 'copying %s', source_filename)
 		
 		if has_file_originally:
-			logger.log(log_serious + level,'overwriting {}!'.format(built_filename))
+			logger.log(log_serious + level, 'overwriting %s!', built_filename)
+		
+		if os.path.isfile(built_file):
+			result['outputs'].append(os.path.abspath(built_file))
+		
+		return result
 
+	def finish_typescript(self, source_file, built_file, error, level=0):
+		'''
+		Deals with the outcome of compiling a TypeScript file: if `tsc`
+		can't be found, the file is copied instead, and if it failed,
+		whatever it wrote is deleted.
+		
+		Args:
+		    source_file (string): Path to the TypeScript file.
+		    built_file (string): Path to the TypeScript file in the
+		        build directory.
+		    error (Exception): What :func:`mdiocre.typescript.compile_typescript`
+		        returned.
+		    level (int, Optional): Indentation level of the log messages.
+		
+		Returns:
+		    A tuple of the path to the file that should have been written
+		    and True if compilation failed.
+		'''
+		import subprocess
+		from .typescript import js_file
+		
+		source_filename = os.path.basename(source_file)
+		
+		if isinstance(error, FileNotFoundError):
+			logger.log(log_error + level, "can't find tsc on your system, copying instead")
+			shutil.copyfile(
+				source_file,
+				built_file
+				)
+			return built_file, False
+		
+		built_file = js_file(built_file)
+		
+		if isinstance(error, subprocess.CalledProcessError):
+			logger.log(log_error + level, "compilation failed with code %d", error.returncode)
+			logger.log(log_error + level + 1, "%s", error.output.decode("utf-8"))
+			
+			# delete the compiled file just in case tsc compiles it anyway
+			if os.path.isfile(built_file):
+				os.remove(built_file)
+			return built_file, True
+		
+		logger.log(log_ok + level, '%s compiled successfully.', source_filename)
+		return built_file, False
+	
 	def generate_from_directory(self, args, callback=None):
 		'''
 		Generates pages based on the directory it is supplied through
@@ -320,7 +557,10 @@ class Wizard():
 		Args:
 		    args (dict): A dictionary containing arguments for this
 		        function. It must have the following keys:
-		        ``source_dir`` and ``build_dir``.
+		        ``source_dir`` and ``build_dir``. If it has the
+		        ``rebuild`` key set to True, every file is rebuilt
+		        regardless of the build manifest (see below). The
+		        ``jobs`` key, if set, overrides the Wizard's `jobs` setting.
 		    callback (func): A function to call every file completion.
 		        Its arguments are a dictionary containing the keys
 		        "original_file", "target_file", "root".
@@ -329,6 +569,16 @@ class Wizard():
 		    True, if every file is successfully processed. Otherwise,
 		    return False. Additionally, it will also create or modify
 		    files on the filesystem.
+		
+		Builds are incremental: a :class:`mdiocre.manifest.BuildManifest`
+		is kept inside ``build_dir``, and files whose source, template,
+		included files and scripts haven't changed since the last build
+		are skipped. Outputs of source files that no longer exist are
+		deleted.
+		
+		Files left out by ``.mdiocreignore`` files or by
+		:data:`mdiocre.walker.DEFAULT_IGNORES` (e.g. ``.git`` and editor
+		swap files) aren't built, see :class:`mdiocre.walker.SourceTree`.
 		'''
 		# type checking
 		declare(args, dict)
@@ -336,15 +586,33 @@ class Wizard():
 		source_dir = os.path.abspath(args['source_dir'])
 		build_dir = os.path.abspath(args['build_dir'])
 		
+		jobs = args.get('jobs') or self.jobs
+		
+		from .index import SiteIndex
+		
+		manifest = BuildManifest(build_dir, options=self.parser_options)
+		# the site index is opened once the build directory is made, see
+		# below, as opening it makes the directory
+		index = None
+		index_file = os.path.join(build_dir, SiteIndex.FILE_NAME)
+		# the manifest is always loaded, even to rebuild everything, so
+		# that outputs of sources removed since are still cleaned up
+		if manifest.load() and args.get('rebuild', False):
+			manifest.mark_stale()
+		seen_sources = set()
+		
 		sd_rel = os.path.relpath(source_dir)
 		bd_rel = os.path.relpath(build_dir)
 		
 		source_parent, source_folder = os.path.split(source_dir)
 		
-		logger.info('begin processing {} -> {}.'.format(sd_rel, bd_rel))
+		logger.info('begin processing %s -> %s.', sd_rel, bd_rel)
 		
-		# process files from the source directory
-		for path, folders, files in (os.walk(source_dir, followlinks=True)):
+		# walk the source directory first, so that the files can be
+		# handed out to worker processes. directories are made right
+		# away, but the messages are kept so they are logged in order
+		plan = []
+		for path, folders, files in SourceTree(source_dir).walk():
 			parent_path, path_folder = os.path.split(path)
 			
 			if parent_path == source_parent:
@@ -369,25 +637,491 @@ class Wizard():
 			elif bd_rel == tp_rel:
 				pass
 			else:
-				logger.log(log_info + 1, '{} -> {}.'.format(sp_rel, tp_rel))
+				plan.append((log_info + 1, '%s -> %s.', (sp_rel, tp_rel)))
 			
 			try:
 				os.makedirs(target_path)
 			except FileExistsError:
-				logger.log(log_warning + 2, 'directory "{}" exists -- making anyway!'.format(os.path.relpath(target_path)))
+				plan.append((log_warning + 2, 'directory "%s" exists -- making anyway!', (os.path.relpath(target_path),)))
 				os.makedirs(target_path, exist_ok=True)
 			
+			if index is None and self.site_index:
+				index = SiteIndex(build_dir)
+				if args.get('rebuild', False):
+					index.clear()
+			
+			for entry in files:
+				original_file = entry.path
+				target_file = os.path.sep.join([target_path, entry.name])
+				
+				if original_file == manifest.path or original_file.startswith(index_file):
+					continue
+				seen_sources.add(original_file)
+				
+				plan.append((original_file, target_file, self.is_up_to_date(original_file, manifest, index, dir_entry=entry)))
+		
+		success = self.build_plan(plan, manifest, source_dir, jobs=jobs, callback=callback, index=index)
+		
+		# clean up after files that were removed from the source directory
+		for source_file in list(manifest.sources):
+			if source_file not in seen_sources:
+				logger.log(log_info + 1, '%s was removed.', os.path.relpath(source_file))
+				self.remove_outputs(manifest.forget(source_file), level=2)
+				if index is not None:
+					index.forget(source_file)
+		
+		manifest.save()
+		if index is not None:
+			index.close()
+		logger.info('done processing %s.', sd_rel)
+		
+		return success
+	
+	def generate_from_changes(self, args, changes, manifest, callback=None):
+		'''
+		Rebuilds only what is affected by some changed files, after a
+		:meth:`generate_from_directory` run with the same `args`.
+		
+		The files that changed inside ``source_dir`` are rebuilt (or
+		their outputs deleted, if they were removed), along with every
+		source file that depends on any of the changes, according to
+		the build manifest.
+		
+		Args:
+		    args (dict): See :meth:`generate_from_directory`.
+		    changes (iterable): Absolute paths of the files that changed.
+		        A directory means anything inside it may have changed.
+		    manifest (:class:`mdiocre.manifest.BuildManifest`): The build
+		        manifest, kept from one call to the next.
+		    callback (func, Optional): See :meth:`generate_from_directory`.
+		
+		Returns:
+		    True, if every file is successfully processed.
+		'''
+		# type checking
+		declare(args, dict)
+		declare(manifest, BuildManifest)
+		
+		source_dir = os.path.abspath(args['source_dir'])
+		build_dir = os.path.abspath(args['build_dir'])
+		prefix = source_dir + os.path.sep
+		
+		jobs = args.get('jobs') or self.jobs
+		
+		changes = set(os.path.abspath(i) for i in changes)
+		changes.discard(manifest.path)
+		manifest.invalidate(changes)
+		
+		from .index import SiteIndex
+		
+		tree = SourceTree(source_dir)
+		index = SiteIndex(build_dir) if self.site_index else None
+		
+		affected = set()
+		for path in changes:
+			affected.update(manifest.dependents(path))
+			if not path.startswith(prefix) and path != source_dir:
+				continue
+			if os.path.basename(path) == IGNORE_FILE:
+				# what is left out in that directory may have changed
+				path = os.path.dirname(path)
+			if os.path.isdir(path):
+				if path == source_dir or not tree.is_ignored(path):
+					for folder, folders, files in tree.walk(path):
+						affected.update(i.path for i in files)
+			else:
+				affected.add(path)
+			# everything that used to be inside a removed directory
+			affected.update(i for i in manifest.sources if i.startswith(path + os.path.sep))
+		affected.discard(manifest.path)
+		affected = set(i for i in affected if not i.startswith(os.path.join(build_dir, SiteIndex.FILE_NAME)))
+		
+		plan = []
+		for source_file in sorted(affected):
+			if not os.path.isfile(source_file) or tree.is_ignored(source_file):
+				if source_file in manifest.sources:
+					logger.log(log_info + 1, '%s was removed.', os.path.relpath(source_file))
+					self.remove_outputs(manifest.forget(source_file), level=2)
+				if index is not None:
+					index.forget(source_file)
+				continue
+			
+			target_file = os.path.join(build_dir, os.path.relpath(source_file, source_dir))
+			os.makedirs(os.path.dirname(target_file), exist_ok=True)
+			
+			plan.append((source_file, target_file, self.is_up_to_date(source_file, manifest, index)))
+		
+		success = self.build_plan(plan, manifest, source_dir, jobs=jobs, callback=callback, index=index)
+		
+		manifest.save()
+		if index is not None:
+			index.close()
+		return success
+	
+	def watch(self, args, watcher=None, callback=None):
+		'''
+		Builds a site like :meth:`generate_from_directory`, then keeps
+		watching the source directory, rebuilding what is affected by
+		every change (see :meth:`generate_from_changes`). This Wizard's
+		parsers and caches are kept between builds.
+		
+		Templates, included files and scripts outside of the source
+		directory are watched as well.
+		
+		Args:
+		    args (dict): See :meth:`generate_from_directory`.
+		    watcher (:class:`mdiocre.watcher.Watcher`, Optional): What
+		        to watch the files with. Defaults to the one given by
+		        :func:`mdiocre.watcher.make_watcher`.
+		    callback (func, Optional): See :meth:`generate_from_directory`.
+		
+		Returns:
+		    Never, until interrupted (e.g. with Ctrl+C).
+		'''
+		# type checking
+		declare(args, dict)
+		
+		if watcher is None:
+			from .watcher import make_watcher
+			watcher = make_watcher()
+		
+		source_dir = os.path.abspath(args['source_dir'])
+		build_dir = os.path.abspath(args['build_dir'])
+		
+		self.generate_from_directory(args, callback=callback)
+		
+		# the rest are incremental builds
+		args = dict(args, rebuild=False)
+		manifest = BuildManifest(build_dir, options=self.parser_options)
+		manifest.load()
+		
+		try:
+			while True:
+				watcher.watch(directories=[source_dir], files=self.outside_dependencies(manifest, source_dir))
+				logger.info('watching %s for changes...', os.path.relpath(source_dir))
+				
+				changes = set()
+				while not changes:
+					changes = watcher.wait()
+				
+				# the build directory could be inside the source directory
+				changes = set(i for i in changes if not (i == build_dir or i.startswith(build_dir + os.path.sep)))
+				if not changes:
+					continue
+				
+				logger.info('%s changed, rebuilding.', ', '.join(sorted(os.path.relpath(i) for i in changes)))
+				self.generate_from_changes(args, changes, manifest, callback=callback)
+		finally:
+			watcher.close()
+	
+	def outside_dependencies(self, manifest, source_dir):
+		'''
+		Lists the files that pages depend on, but which are not in the
+		source directory, e.g. a shared template.
+		
+		Args:
+		    manifest (:class:`mdiocre.manifest.BuildManifest`): The build
+		        manifest.
+		    source_dir (string): The source directory.
+		
+		Returns:
+		    A set of absolute paths.
+		'''
+		prefix = os.path.abspath(source_dir) + os.path.sep
+		found = set()
+		for entry in manifest.sources.values():
+			found.update(i for i in entry['dependencies'] if not i.startswith(prefix))
+		return found
+	
+	def build_plan(self, plan, manifest, source_dir, jobs=1, callback=None, index=None):
+		'''
+		Builds the files that are out of date, as planned by
+		:meth:`generate_from_directory` or :meth:`generate_from_changes`,
+		and records them in the build manifest and the site index.
+		
+		Args:
+		    plan (list): Steps to go through in order. Each one is either
+		        a (log level, message, message arguments) tuple to log,
+		        or a (source file, target file, up to date) tuple.
+		    manifest (:class:`mdiocre.manifest.BuildManifest`): The
+		        build manifest.
+		    source_dir (string): The 'root' path.
+		    jobs (int, Optional): Number of processes to use.
+		    callback (func, Optional): See :meth:`generate_from_directory`.
+		    index (:class:`mdiocre.index.SiteIndex`, Optional): The site
+		        index.
+		
+		Returns:
+		    True, if every file is successfully processed.
+		'''
+		success = True
+		
+		# files that are only copied are left to the asset threads and
+		# TypeScript files to tsc processes, the rest are built here or
+		# by worker processes
+		stale_files = [
+			(i[0], i[1], source_dir) for i in plan
+			if not isinstance(i[0], int) and not i[2] and self.is_page(i[0])
+		]
+		
+		if jobs > 1 and len(stale_files) > 1:
+			import multiprocessing
+			extensions = set(os.path.splitext(i[0])[1][1:].lower() for i in stale_files)
+			pool = multiprocessing.Pool(
+				processes=jobs,
+				initializer=_init_worker,
+				initargs=(self.converters, sorted(extensions), self.parser_options, self.stream_threshold, bool(HOOKS), logging.getLogger('mdiocre').getEffectiveLevel()),
+				maxtasksperchild=self.tasks_per_worker
+			)
+			results = pool.imap(_build_in_worker, stale_files)
+		else:
+			pool = None
+			results = (self.build_file(*i) for i in stale_files)
+		
+		start_time = time.perf_counter()
+		serial_time = 0
+		
+		try:
 			# do the conversion
-			for f in files:
-				original_file = os.path.sep.join([path, f])
-				target_file = os.path.sep.join([target_path, f])
+			for step in plan:
+				if isinstance(step[0], int):
+					level, message, message_args = step
+					logger.log(level, message, *message_args)
+					continue
 				
-				original_name, original_ext = os.path.splitext(original_file)
-				# lop off the dot and make it all lowercase
-				original_ext = original_ext[1:].lower()
+				original_file, target_file, up_to_date = step
 				
-				self.generate_from_path(original_file, target_file, root=source_dir, to_html=True, level=2)
+				if up_to_date:
+					logger.log(log_info + 2, '%s is up to date.', os.path.basename(original_file))
+				elif self.is_typescript(original_file):
+					from .typescript import js_file
+					self.typescript.submit(original_file, js_file(target_file))
+				elif not self.is_page(original_file):
+					self.assets.submit(original_file, target_file)
+				else:
+					result = next(results)
+					
+					# logs from worker processes are replayed here, so that
+					# they come out in the same order as a serial build
+					for record in result['logs']:
+						logging.getLogger(record['name']).handle(logging.makeLogRecord(record))
+					for event in result['events']:
+						emit(event)
+					
+					serial_time += result['time']
+					success = success and not result['error']
+					
+					stale_outputs = manifest.record(
+						original_file, result['outputs'],
+						dependencies=result['dependencies'],
+						template=result['template'],
+						failed=result['error']
+					)
+					self.remove_outputs(stale_outputs, level=2)
+					
+					if index is not None:
+						index.record(
+							original_file, os.path.relpath(original_file, source_dir),
+							result['outputs'][0] if result['outputs'] else None,
+							result['variables'] if result['outputs'] else None,
+							source_hash=manifest.sources[original_file]['hash']
+						)
 				
 				if type(callback).__name__ == 'function':
 					callback({"original_file": original_file,"target_file":target_file,"root":source_dir})
-		logger.info('done processing {}.'.format(sd_rel))
+		finally:
+			if pool is not None:
+				pool.terminate()
+				pool.join()
+		
+		if pool is not None:
+			wall_time = time.perf_counter() - start_time
+			logger.info('built %d files with %d jobs in %.2fs (an estimated %.2fs serially, %.1fx speedup).',
+				len(stale_files), jobs, wall_time, serial_time, serial_time / max(wall_time, 1e-9)
+			)
+		
+		for original_file, target_file, error in self.typescript.wait():
+			target_file = os.path.splitext(target_file)[0] + os.path.splitext(original_file)[1]
+			
+			logger.log(log_info + 2, 'compiling %s with tsc', os.path.basename(original_file))
+			target_file, failed = self.finish_typescript(original_file, target_file, error, level=2)
+			success = success and not failed
+			
+			stale_outputs = manifest.record(
+				original_file,
+				[os.path.abspath(target_file)] if os.path.isfile(target_file) else [],
+				failed=failed
+			)
+			self.remove_outputs(stale_outputs, level=2)
+		
+		for original_file, target_file, copied in self.assets.wait():
+			source_filename = os.path.basename(original_file)
+			if isinstance(copied, Exception):
+				logger.log(log_error + 2, '%s: cannot copy: %s', source_filename, copied)
+				success = False
+			elif copied is None:
+				logger.log(log_info + 2, '%s is already in place.', source_filename)
+			else:
+				logger.log(log_info + 2, 'copied %s (%s).', source_filename, copied)
+			
+			stale_outputs = manifest.record(
+				original_file,
+				[os.path.abspath(target_file)] if os.path.isfile(target_file) else [],
+				failed=isinstance(copied, Exception)
+			)
+			self.remove_outputs(stale_outputs, level=2)
+		
+		return success
+	
+	def is_up_to_date(self, source_file, manifest, index=None, dir_entry=None):
+		'''
+		Tells whether a source file can be left as it was built last time.
+		
+		Args:
+		    source_file (string): Absolute path to the source file.
+		    manifest (:class:`mdiocre.manifest.BuildManifest`): The
+		        build manifest.
+		    index (:class:`mdiocre.index.SiteIndex`, Optional): The site
+		        index. Pages that aren't in it as they are now (e.g. they
+		        were built with it turned off) aren't up to date.
+		    dir_entry (os.DirEntry, Optional): See
+		        :meth:`mdiocre.manifest.BuildManifest.hash`.
+		
+		Returns:
+		    True if the file is up to date.
+		'''
+		if not manifest.is_up_to_date(source_file, dir_entry=dir_entry):
+			return False
+		if index is not None and self.is_page(source_file):
+			return index.is_up_to_date(source_file, manifest.sources[source_file]['hash'])
+		return True
+	
+	def is_page(self, source_file):
+		'''
+		Tells whether a file is converted to a page by
+		:meth:`generate_from_path`, i.e. it has the extension of one of
+		the :attr:`converters`.
+		
+		Args:
+		    source_file (string): Path to the source file.
+		
+		Returns:
+		    True if the file is converted.
+		'''
+		return os.path.splitext(source_file)[1][1:].lower() in self.converters
+	
+	def is_typescript(self, source_file):
+		'''
+		Tells whether a file is compiled with `tsc` by
+		:meth:`generate_from_path`.
+		
+		Args:
+		    source_file (string): Path to the source file.
+		
+		Returns:
+		    True if the file is a TypeScript file.
+		'''
+		return not self.is_page(source_file) and os.path.splitext(source_file)[1][1:].lower() in ['ts']
+	
+	def build_file(self, source_file, built_file, root):
+		'''
+		Builds a single file from a directory, as done by
+		:meth:`generate_from_directory`.
+		
+		Args:
+		    source_file (string): Path to the source file.
+		    built_file (string): Path to the file to write.
+		    root (string): The 'root' path.
+		
+		Returns:
+		    The same dictionary as :meth:`generate_from_path`, with
+		    three extra keys: "logs" (list of log records that should be
+		    handled by the caller, always empty here), "events" (list
+		    of events that should be handed to the hooks, see
+		    :mod:`mdiocre.hooks`, always empty here) and "time" (time
+		    taken to build the file, in seconds).
+		'''
+		start_time = time.perf_counter()
+		with phase('build', os.path.abspath(source_file)):
+			result = self.generate_from_path(source_file, built_file, root=root, to_html=True, level=2)
+		result['time'] = time.perf_counter() - start_time
+		result['logs'] = []
+		result['events'] = []
+		return result
+	
+	def remove_outputs(self, outputs, level=0):
+		'''
+		Deletes files produced by an earlier build.
+		
+		Args:
+		    outputs (list): Paths of the files to delete.
+		    level (int, Optional): Indentation level of the log messages.
+		
+		Returns:
+		    None.
+		'''
+		for output in outputs:
+			if os.path.isfile(output):
+				logger.log(log_serious + level, 'deleting %s.', os.path.relpath(output))
+				os.remove(output)
+
+# the worker process' own wizard, see _init_worker
+_worker_wizard = None
+
+class _RecordCollector(logging.Handler):
+	'''
+	Keeps log records around so that they can be sent back from worker
+	processes.
+	'''
+	def __init__(self):
+		logging.Handler.__init__(self)
+		self.records = []
+	
+	def emit(self, record):
+		# make it picklable, the same way QueueHandler does
+		message = record.getMessage()
+		record = dict(record.__dict__)
+		record.update(msg=message, args=None, exc_info=None, exc_text=None)
+		self.records.append(record)
+
+def _init_worker(converters, extensions, parser_options, stream_threshold, profile, log_level):
+	'''
+	Sets up a worker process for :meth:`Wizard.generate_from_directory`.
+	The parsers of the files in `extensions` are instantiated once so
+	that the worker is warmed up before it gets any files. If `profile` is True, the events of every
+	file are collected and sent back. Only records of at least
+	`log_level` are made, the same as in the main process.
+	'''
+	global _worker_wizard
+	
+	_worker_wizard = Wizard(parser_options=parser_options, stream_threshold=stream_threshold)
+	_worker_wizard.converters = converters
+	for extension in extensions:
+		_worker_wizard.get_parser(extension)
+	
+	# collect logs instead of printing them
+	base_logger = logging.getLogger('mdiocre')
+	base_logger.handlers = [_RecordCollector()]
+	base_logger.propagate = False
+	base_logger.setLevel(log_level)
+	
+	# hooks registered in the main process aren't here
+	del HOOKS[:]
+	if profile:
+		add_hook(EventCollector())
+
+def _build_in_worker(task):
+	'''
+	Builds a file inside a worker process.
+	'''
+	collector = logging.getLogger('mdiocre').handlers[0]
+	collector.records = []
+	
+	events = HOOKS[0].events if HOOKS else []
+	del events[:]
+	
+	result = _worker_wizard.build_file(*task)
+	result['logs'] = collector.records
+	result['events'] = list(events)
+	
+	return result
@@ -7,13 +7,15 @@ import sys
 # point this to the folder where mdiocre.py is located
 sys.path.append(os.path.abspath('..'))
 
-from mdiocre.core import MDiocre
-from mdiocre.wizard import Wizard
+from posts import find_posts
 from feedgen import feed
 import datetime
 
-# directory where the blog files are
-BLOG_DIR = "source/blog"
+# directory where the site was built to, with its site index
+BUILD_DIR = "build"
+
+# directory where the blog files are, inside the source directory
+BLOG_DIR = "blog"
 WEBSITE_NAME = "My Website"
 WEBSITE_AUTHOR = "Joe Bloggs"
 WEBSITE_LANG = "en"
@@ -37,31 +39,20 @@ if __name__ == '__main__':
 	fg.link(href=WEBSITE_LINK)
 	fg.link(href=RSS_LINK, rel='self', type='application/rss+xml')
 
-	# set up MDiocre and file list
-	m = MDiocre()
-	blog_files = [i for i in os.listdir(BLOG_DIR) \
-		      if \
-		      (i.lower().endswith('.md') or i.lower().endswith('.rst'))
-		      and not os.path.splitext(i.lower())[0].startswith('index')]
+	# the variables of every post, content included, were saved when
+	# the site was built, so there's no need to convert them again
+	posts = find_posts(BUILD_DIR, BLOG_DIR)
 
 	# make entry for each file
-	for f in blog_files:
-		file_path = os.path.join(BLOG_DIR, f)
-		file_name, file_ext = os.path.splitext(f)
-		
-		# find suitable converter
-		file_ext = file_ext[1:].lower()
-		m.switch_parser(Wizard.converters[file_ext])
-		
-		# read file
-		with open(file_path, 'r') as content:
-			content_vars = m.process(content.read())
+	for post in posts:
+		file_name = os.path.splitext(os.path.basename(post['path']))[0]
+		content_vars = post['variables']
 		
 		# prepare feed entry
 		fe = fg.add_entry()
 		
 		# set title, defined by e.g. <!--:title = "My First Blog Post" -->
-		if content_vars.get('title') != '':
+		if content_vars.get('title'):
 			blog_title = content_vars.get('title')
 		else:
 			blog_title = file_name
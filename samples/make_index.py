@@ -7,12 +7,14 @@ import sys
 # point this to the folder where mdiocre.py is located
 sys.path.append(os.path.abspath('..'))
 
-import datetime
 from mdiocre.core import MDiocre
-from mdiocre.wizard import Wizard
+from posts import find_posts
 
-# directory where the blog files are
-BLOG_DIR = "source/blog"
+# directory where the site was built to, with its site index
+BUILD_DIR = "build"
+
+# directory where the blog files are, inside the source directory
+BLOG_DIR = "blog"
 
 # where the generated files will be
 OUT_DIR = "index"
@@ -24,36 +26,26 @@ PAGINATE_EVERY = 5
 INDEX_TEMPLATE = "source/blog/template.html"
 
 if __name__ == '__main__':
-	# set up MDiocre and file list
+	# set up MDiocre
 	m = MDiocre()
-	blog_files = [i for i in os.listdir(BLOG_DIR) \
-		      if \
-		      (i.lower().endswith('.md') or i.lower().endswith('.rst'))
-		      and not os.path.splitext(i.lower())[0].startswith('index')]
 	
 	blog_entries = []
 	
+	# the variables of every post were saved when the site was built,
+	# so there's no need to read them again. dates are written as
+	# YYYY-MM-DD, so they sort the same as text. set reverse to False
+	# if you want to sort by oldest
+	posts = find_posts(BUILD_DIR, BLOG_DIR, sort_by='date', reverse=True)
+	
 	# make entry for each file
-	for f in blog_files:
-		file_path = os.path.join(BLOG_DIR, f)
-		file_name, file_ext = os.path.splitext(f)
-		
-		# find suitable converter
-		file_ext = file_ext[1:].lower()
-		m.switch_parser(Wizard.converters[file_ext])
+	for post in posts:
+		file_name = os.path.splitext(os.path.basename(post['path']))[0]
 		
-		# read file
-		with open(file_path, 'r') as content:
-			content_vars = m.process(content.read(), ignore_content=True)
-		
-		date  = content_vars.variables['date']
-		title = content_vars.variables['title']
+		date  = post['variables']['date']
+		title = post['variables']['title']
 		
 		blog_entries.append((date, title, file_name))
 	
-	blog_entries.sort(key=lambda entry: datetime.datetime.strptime(entry[0], "%Y-%m-%d"))
-	blog_entries.reverse() # comment this out if you want to sort by oldest
-	
 	# split sorted blog entries
 	blog_split = [blog_entries[x:x+PAGINATE_EVERY] for x in range(0, len(blog_entries), PAGINATE_EVERY)]
 	
@@ -12,10 +12,13 @@ sys.path.append(os.path.abspath('..'))
 
 import datetime
 from mdiocre.core import MDiocre
-from mdiocre.wizard import Wizard
+from posts import find_posts
 
-# directory where the blog files are
-BLOG_DIR = "source/blog"
+# directory where the site was built to, with its site index
+BUILD_DIR = "build"
+
+# directory where the blog files are, inside the source directory
+BLOG_DIR = "blog"
 
 # where the generated files will be
 OUT_DIR = "tags"
@@ -27,31 +30,22 @@ TAG_PREFIX = "tag_"
 TAGS_TEMPLATE = "source/blog/template.html"
 
 if __name__ == '__main__':
-	# set up MDiocre and file list
+	# set up MDiocre
 	m = MDiocre()
-	blog_files = [i for i in os.listdir(BLOG_DIR) \
-		      if \
-		      (i.lower().endswith('.md') or i.lower().endswith('.rst'))
-		      and not os.path.splitext(i.lower())[0].startswith('index')]
+	
+	# the variables of every post were saved when the site was built,
+	# so there's no need to read them again
+	posts = find_posts(BUILD_DIR, BLOG_DIR)
 	
 	tags = {}
 	
 	# make entry for each file
-	for f in blog_files:
-		file_path = os.path.join(BLOG_DIR, f)
-		file_name, file_ext = os.path.splitext(f)
-		
-		# find suitable converter
-		file_ext = file_ext[1:].lower()
-		m.switch_parser(Wizard.converters[file_ext])
-		
-		# read file
-		with open(file_path, 'r') as content:
-			content_vars = m.process(content.read(), ignore_content=True)
+	for post in posts:
+		file_name = os.path.splitext(os.path.basename(post['path']))[0]
 		
-		date  = content_vars.variables['date']
-		title = content_vars.variables['title']
-		page_tags = content_vars.get('tags').strip()
+		date  = post['variables']['date']
+		title = post['variables']['title']
+		page_tags = str(post['variables'].get('tags') or '').strip()
 		
 		if page_tags == '':
 			page_tag_list = ['unsorted']
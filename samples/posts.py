@@ -0,0 +1,49 @@
+'''
+Finds the blog posts of a built site, for the other sample scripts
+'''
+
+import os
+import sys
+from mdiocre.index import SiteIndex
+
+def is_post(page, blog_dir):
+	'''
+	Tells whether a page from the site index is a blog post: a Markdown
+	or reStructuredText file right inside the blog directory, that isn't
+	an index.
+	'''
+	name = page['path'][len(blog_dir) + 1:].lower()
+	return (name.endswith('.md') or name.endswith('.rst')) \
+	       and '/' not in name \
+	       and not os.path.splitext(name)[0].startswith('index')
+
+def find_posts(build_dir, blog_dir, sort_by=None, reverse=False):
+	'''
+	Gets the blog posts from the site index kept by the last build, so
+	that they don't have to be read and converted again. Exits with a
+	message if the site hasn't been built yet.
+
+	Args:
+	    build_dir (string): Directory where the site was built to.
+	    blog_dir (string): Directory where the blog files are, inside
+	        the source directory.
+	    sort_by (string, Optional): Variable to sort the posts by.
+	    reverse (bool, Optional): If True, sort from the largest value
+	        to the smallest.
+
+	Returns:
+	    A list of dictionaries describing the posts, see
+	    :class:`mdiocre.index.SiteIndex`.
+	'''
+	try:
+		index = SiteIndex(build_dir, readonly=True)
+	except (FileNotFoundError, ValueError) as e:
+		sys.exit('{} -- build the site with MDiocre first.'.format(e))
+
+	with index:
+		if sort_by is None:
+			pages = index.pages(prefix=blog_dir + '/')
+		else:
+			pages = index.sort_by(sort_by, reverse=reverse, prefix=blog_dir + '/')
+
+	return [page for page in pages if is_post(page, blog_dir)]